@@ -0,0 +1,106 @@
+import hashlib
+import json
+import threading
+from datetime import datetime
+
+from sqlalchemy import func
+
+from db_models import db, Frame, Video, AnalysisCacheEntry
+
+class AnalysisCache:
+    """Reuses video analyses for uploads whose content was analysed before.
+
+    Entries are keyed by the upload's SHA-256 together with every setting
+    that changes the result (model, confidence, classes, frame interval,
+    minimum objects, storage profile) and point at the Video holding the
+    frames. A hit links the new upload to those results instead of running
+    YOLO again. Entries go when retention purges the frames they point at,
+    and an entry whose frames were evicted early is dropped on lookup. A hit
+    renews the entry (last_hit) and the results video (Video.last_used), so
+    retention keeps linked results for a full period from the latest upload
+    that uses them; the frames keep their original detection times.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self._lock = threading.Lock()
+        self.metrics = {"lookups": 0, "hits": 0, "misses": 0, "stale": 0, "stored": 0, "purged": 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config['ANALYSIS_CACHE']
+        app.extensions['analysis_cache'] = self
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.metrics[key] += amount
+
+    @staticmethod
+    def cache_key(content_hash, params):
+        payload = json.dumps({"content": content_hash, **params}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def lookup(self, content_hash, params):
+        """The cache entry for this content and these settings, or None. Must run inside an app context."""
+        if not self.enabled or not content_hash:
+            return None
+        self._count("lookups")
+        entry = db.session.get(AnalysisCacheEntry, self.cache_key(content_hash, params))
+        if entry is None:
+            self._count("misses")
+            return None
+        # Quota eviction may have removed some of the frames before retention got to the entry
+        if Frame.query.filter_by(video_id=entry.video_id).count() != entry.frame_count:
+            db.session.delete(entry)
+            db.session.commit()
+            self._count("stale")
+            self._count("misses")
+            return None
+        now = datetime.now()
+        entry.hits += 1
+        entry.last_hit = now
+        Video.query.filter_by(id=entry.video_id).update({'last_used': now}, synchronize_session=False)
+        db.session.commit()
+        self._count("hits")
+        return entry
+
+    def contains(self, content_hash, params):
+        """Whether an entry exists for this content and these settings, without counting or renewing it"""
+        if not self.enabled or not content_hash:
+            return False
+        return db.session.get(AnalysisCacheEntry, self.cache_key(content_hash, params)) is not None
+
+    def store(self, content_hash, params, video_id):
+        """Remember video_id as holding the analysis of this content with these settings"""
+        if not self.enabled or not content_hash:
+            return None
+        key = self.cache_key(content_hash, params)
+        entry = db.session.get(AnalysisCacheEntry, key) or AnalysisCacheEntry(cache_key=key)
+        entry.content_hash = content_hash
+        entry.video_id = video_id
+        entry.params = json.dumps(params, sort_keys=True)
+        entry.frame_count = Frame.query.filter_by(video_id=video_id).count()
+        entry.created_at = datetime.now()
+        db.session.add(entry)
+        db.session.commit()
+        self._count("stored")
+        return entry
+
+    def purge(self, cutoff):
+        """Drop entries neither created nor hit since cutoff, whose frames retention deletes in the same pass"""
+        deleted = AnalysisCacheEntry.query.filter(
+            func.coalesce(AnalysisCacheEntry.last_hit, AnalysisCacheEntry.created_at) < cutoff
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        self._count("purged", deleted)
+        return deleted
+
+    def stats(self):
+        with self._lock:
+            metrics = dict(self.metrics)
+        metrics["hit_rate"] = round(metrics["hits"] / metrics["lookups"], 3) if metrics["lookups"] else None
+        metrics["enabled"] = self.enabled
+        return metrics
+
+analysis_cache = AnalysisCache()
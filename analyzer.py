@@ -5,8 +5,17 @@ import time
 import warnings
 import json
 import logging
+import sys
+from collections import deque
 from datetime import datetime
-from threading import Lock
+import threading
+from threading import Lock, Condition
+from frame_ring import FrameRing
+from image_writer import image_writer, WriteTracker
+from storage_profiles import StorageProfile
+from frame_shards import shard_folder
+from clips import ClipRecorder
+from camera_supervisor import CameraSupervisor, CONNECTING, LIVE, DEGRADED, STOPPED
 
 # --- Module-level logger setup ---
 logger = logging.getLogger("analyzer")
@@ -17,6 +26,19 @@ if not logger.hasHandlers():
     logger.addHandler(handler)
 logger.setLevel(logging.INFO)
 
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None if unknown"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
 # Centralized config import
 try:
     from flask import current_app
@@ -101,37 +123,72 @@ class Analyzer:
             return False
 
     def process_detections(self, frame, detections):
-        """Process detection results and annotate the frame with detailed information."""
+        """Process detection results and annotate a copy of the frame with detailed information."""
         annotated_frame = frame.copy()
-        detection_results = {}
-        h, w = frame.shape[:2]
-        cv2.rectangle(annotated_frame, (0, 0), (w, 30), (0, 0, 0), -1)
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
-        processing_info = f"Timestamp: {timestamp} | Objects: {len(detections)}"
-        cv2.putText(annotated_frame, processing_info, (10, 20), 
+        self.draw_detections(annotated_frame, detections)
+        return annotated_frame, self.detection_summary(detections)
+
+    @staticmethod
+    def detection_summary(detections):
+        """Confidences per detected class, e.g. {"person": [0.91, 0.67]}."""
+        summary = {}
+        for name, confidence in zip(detections['name'], detections['confidence']):
+            summary.setdefault(name, []).append(float(confidence))
+        return summary
+
+    @staticmethod
+    def draw_detections(annotated_frame, detections):
+        """Draw the timestamp banner, boxes, labels and class summary onto the image in place."""
+        Analyzer.draw_overlay(annotated_frame, Analyzer.detection_payload(detections))
+
+    @staticmethod
+    def draw_overlay(image, objects, timestamp=None, scale=1.0):
+        """Draw the detection overlay for detection_payload()-style objects onto image in place.
+
+        timestamp defaults to now. Boxes are in captured-frame pixels and are
+        multiplied by scale for an image stored smaller than that; objects
+        without a box only count towards the banner and summary.
+        """
+        h, w = image.shape[:2]
+        cv2.rectangle(image, (0, 0), (w, 30), (0, 0, 0), -1)
+        timestamp = (timestamp or datetime.now()).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+        processing_info = f"Timestamp: {timestamp} | Objects: {len(objects)}"
+        cv2.putText(image, processing_info, (10, 20), 
                     cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
         class_counts = {}
-        for _, det in detections.iterrows():
-            obj_name = det['name']
+        for obj in objects:
+            obj_name = obj["name"]
             class_counts[obj_name] = class_counts.get(obj_name, 0) + 1
-            if obj_name not in detection_results:
-                detection_results[obj_name] = []
-            detection_results[obj_name].append(float(det['confidence']))
-            xmin, ymin, xmax, ymax = int(det['xmin']), int(det['ymin']), int(det['xmax']), int(det['ymax'])
-            label = f"{obj_name} {det['confidence']:.2f}"
-            cv2.rectangle(annotated_frame, (xmin, ymin), (xmax, ymax), (0, 255, 0), 2)
-            cv2.putText(annotated_frame, label, (xmin, ymin - 10), 
+            if obj["box"] is None:
+                continue
+            xmin, ymin, xmax, ymax = (int(v) for v in obj["box"])
+            label = f"{obj_name} {obj['confidence']:.2f}"
+            size_info = f"W:{xmax - xmin} H:{ymax - ymin}"
+            xmin, ymin, xmax, ymax = (int(v * scale) for v in (xmin, ymin, xmax, ymax))
+            cv2.rectangle(image, (xmin, ymin), (xmax, ymax), (0, 255, 0), 2)
+            cv2.putText(image, label, (xmin, ymin - 10), 
                         cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-            obj_width = xmax - xmin
-            obj_height = ymax - ymin
-            size_info = f"W:{obj_width} H:{obj_height}"
-            cv2.putText(annotated_frame, size_info, (xmin, ymax + 15), 
+            cv2.putText(image, size_info, (xmin, ymax + 15), 
                         cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 0, 0), 1)
         summary_text = " | ".join([f"{cls}: {count}" for cls, count in class_counts.items()])
-        cv2.rectangle(annotated_frame, (0, h-30), (w, h), (0, 0, 0), -1)
-        cv2.putText(annotated_frame, summary_text, (10, h-10), 
+        cv2.rectangle(image, (0, h-30), (w, h), (0, 0, 0), -1)
+        cv2.putText(image, summary_text, (10, h-10), 
                     cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-        return annotated_frame, detection_results
+
+    @staticmethod
+    def detection_payload(detections):
+        """Convert a detections DataFrame into plain dicts with name, confidence and box."""
+        return [
+            {
+                "name": name,
+                "confidence": float(confidence),
+                "box": (int(xmin), int(ymin), int(xmax), int(ymax)),
+            }
+            for name, confidence, xmin, ymin, xmax, ymax in zip(
+                detections['name'], detections['confidence'],
+                detections['xmin'], detections['ymin'], detections['xmax'], detections['ymax']
+            )
+        ]
 
     def filter_detections(self, detections):
         """Filter detections based on include/exclude classes."""
@@ -166,13 +223,14 @@ class Analyzer:
 class VideoAnalyzer(Analyzer):
     """Analyze pre-recorded videos for object detection."""
     def __init__(self, video_path, output_folder=None, yolo_model_path=None,
-                 confidence=None, include_classes=None, exclude_classes=None):
+                 confidence=None, include_classes=None, exclude_classes=None, storage_profile=None):
         if yolo_model_path is None:
             yolo_model_path = get_config('YOLO_MODEL_PATH')
         if output_folder is None:
             output_folder = get_config('OUTPUT_FOLDER')
         super().__init__(output_folder, yolo_model_path, confidence, include_classes, exclude_classes)
         self.video_path = video_path
+        self.storage_profile = storage_profile or StorageProfile()
 
     def extract_frames(self, frame_interval=5):
         if not os.path.exists(self.video_path):
@@ -200,51 +258,94 @@ class VideoAnalyzer(Analyzer):
 
     def detect_activity_with_yolo(self, frames, min_objects=1):
         logger.debug(f"Starting detect_activity_with_yolo with {len(frames)} frames, min_objects={min_objects}")
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        analysis_folder = os.path.join(self.output_folder, f"activity_{timestamp}")
+        run = self.begin_activity()
+        if run is None:
+            return None
+        self.detect_activity_batch(run, frames, min_objects, total=len(frames))
+        return self.finish_activity(run)
+
+    def begin_activity(self):
+        """Create the output folder and load the model for one analysis; returns the run state or None"""
+        started = datetime.now()
+        timestamp = started.strftime("%Y%m%d_%H%M%S")
+        # Microseconds keep analyses started in the same second (e.g. concurrent uploads) apart
+        analysis_folder = os.path.join(self.output_folder, f"activity_{timestamp}_{started.strftime('%f')}")
         activity_frames_folder = os.path.join(analysis_folder, "activity_frames")
         os.makedirs(activity_frames_folder, exist_ok=True)
         if not self._load_model():
             logger.debug("Failed to load model, aborting detection")
             return None
         logger.debug(f"Model loaded successfully with confidence={self.confidence}")
-        frames_with_activity = 0
-        activity_summary = {}
-        activity_details = {}
-        failed_frames = 0
-        for i, frame in enumerate(frames):
+        return {
+            "timestamp": timestamp,
+            "folder": analysis_folder,
+            "frames_folder": activity_frames_folder,
+            "frames": 0,
+            "frames_with_activity": 0,
+            "failed_frames": 0,
+            "stopped": False,
+            "summary": {},
+            "details": {},
+            "writes": WriteTracker(),  # this run's frames in the shared writer pool
+        }
+
+    def detect_activity_batch(self, run, frames, min_objects=1, total=None):
+        """Detect objects in the next frames of a run and save those with at least min_objects.
+
+        Frames are numbered on from the previous batch. Returns {frame name:
+        detections} for this batch's activity frames; their images are queued
+        on the image writer. total is the expected frame count, for progress.
+        """
+        found = {}
+        for frame in frames:
+            if run["stopped"]:
+                break
+            i = run["frames"]
+            run["frames"] += 1
             try:
-                print(f"\rProcessing frame {i+1}/{len(frames)} ({(i+1)/len(frames)*100:.1f}%)", end="")
+                progress = f"{i+1}/{total} ({(i+1)/total*100:.1f}%)" if total else f"{i+1}"
+                logger.debug(f"Processing frame {progress}")
                 frame_start = time.time()
                 results, detections = self.detect_objects(frame)
                 detection_time = time.time() - frame_start
                 if results is not None:
                     classes_found = detections['name'].unique().tolist() if len(detections) > 0 else []
-                    print(f"\nFrame {i+1}: {len(detections)} objects {classes_found} in {detection_time:.3f}s")
+                    logger.debug(f"Frame {i+1}: {len(detections)} objects {classes_found} in {detection_time:.3f}s")
                 if len(detections) < min_objects:
                     continue
-                frames_with_activity += 1
-                frame_filename = os.path.join(activity_frames_folder, f"activity_{i:06d}.jpg")
-                annotated_frame, frame_detections = self.process_detections(frame, detections)
+                run["frames_with_activity"] += 1
+                frame_name = f"activity_{i:06d}{self.storage_profile.extension}"
+                frame_filename = os.path.join(run["frames_folder"], frame_name)
+                # Extracted frames are not used again, so annotate in place instead of copying
+                frame_detections = self.detection_summary(detections)
+                self.draw_detections(frame, detections)
                 for obj_name, confidences in frame_detections.items():
-                    activity_summary[obj_name] = activity_summary.get(obj_name, 0) + len(confidences)
-                activity_details[f"activity_{i:06d}.jpg"] = frame_detections
-                cv2.imwrite(frame_filename, annotated_frame)
+                    run["summary"][obj_name] = run["summary"].get(obj_name, 0) + len(confidences)
+                run["details"][frame_name] = frame_detections
+                found[frame_name] = frame_detections
+                image_writer.submit(frame_filename, frame, copy=False, block=True, profile=self.storage_profile,
+                                    tracker=run["writes"])
             except Exception as e:
-                failed_frames += 1
+                run["failed_frames"] += 1
                 logger.error(f"Error processing frame {i}: {str(e)}")
-                if failed_frames >= 10:
+                if run["failed_frames"] >= 10:
                     logger.error("Stopping due to too many failures")
+                    run["stopped"] = True
                     break
-            if (i + 1) % 20 == 0 or i == len(frames) - 1:
-                logger.info(f"Analyzed {i + 1}/{len(frames)} frames, found {frames_with_activity} with activity")
-        if frames_with_activity == 0:
+            if (i + 1) % 20 == 0 or i + 1 == total:
+                logger.info(f"Analyzed {i + 1}/{total or '?'} frames, found {run['frames_with_activity']} with activity")
+        return found
+
+    def finish_activity(self, run):
+        """Wait for the run's images and write its summary; returns (folder, details), or the folder if nothing was found"""
+        image_writer.flush(run["writes"])
+        if run["frames_with_activity"] == 0:
             logger.info("No activity detected")
-            return analysis_folder
-        self._save_analysis_summary(analysis_folder, timestamp, frames_with_activity, 
-                                   len(frames), failed_frames, activity_summary, activity_details)
-        logger.info(f"Activity detection complete. Found {frames_with_activity} frames with activity")
-        return analysis_folder, activity_details
+            return run["folder"]
+        self._save_analysis_summary(run["folder"], run["timestamp"], run["frames_with_activity"],
+                                   run["frames"], run["failed_frames"], run["summary"], run["details"])
+        logger.info(f"Activity detection complete. Found {run['frames_with_activity']} frames with activity")
+        return run["folder"], run["details"]
 
     def _save_analysis_summary(self, folder, timestamp, frames_with_activity, 
                               total_frames, failed_frames, activity_summary, activity_details):
@@ -287,9 +388,12 @@ class VideoAnalyzer(Analyzer):
 class RealtimeAnalyzer(Analyzer):
     """Real-time camera feed analyzer for object detection."""
 
+    # Skip drawing overlays nobody will see when no frame was read for this long
+    VIEWER_TIMEOUT = 10.0
+
     def __init__(self, model_path=None, save_folder=None, 
                  confidence=None, save_interval=None, include_classes=None, exclude_classes=None,
-                 frame_rate=None):
+                 frame_rate=None, storage_profile=None):
         if model_path is None:
             model_path = get_config('YOLO_MODEL_PATH')
         if save_folder is None:
@@ -311,39 +415,77 @@ class RealtimeAnalyzer(Analyzer):
         self.last_error_time = 0
         self.error_cooldown = 5
         self.current_frame = None
+        # Versioned frame slot: consumers wait on _frame_cond for frame_seq to advance
+        self._frame_cond = Condition()
+        self.frame_seq = 0
+        self.frame_time = None
+        # Published frames live in a preallocated ring, created on the first frame
+        self.frame_ring = None
+        self.frame_ring_slots = get_config('FRAME_RING_SLOTS', 4)
+        self.frame_ring_shared = get_config('FRAME_RING_SHARED', True)
+        self._last_read = 0.0
+        # Full-frame buffers allocated and overlays skipped, for get_metrics()
+        self.frame_allocs = 0
+        self.annotations_skipped = 0
+        # 'raw' saves frames without the overlay (rendered on request from the DB boxes)
+        self.frame_storage_mode = get_config('FRAME_STORAGE_MODE', 'annotated')
+        self.storage_profile = storage_profile or StorageProfile()
+        # Called with the saved-frame dict once its image file is durable on disk
+        self.on_frame_saved = None
+        # Pre-roll ring and event clip encoder; on_clip_saved gets each finished clip's dict
+        self.clip_recorder = None
+        if get_config('CLIP_RECORDING', True):
+            self.clip_recorder = ClipRecorder(
+                self.output_folder,
+                pre_seconds=get_config('CLIP_PRE_SECONDS', 5.0),
+                post_seconds=get_config('CLIP_POST_SECONDS', 5.0),
+                max_seconds=get_config('CLIP_MAX_SECONDS', 120.0),
+                fps=get_config('CLIP_FPS', 5.0),
+                max_dim=get_config('CLIP_MAX_DIM', 960),
+                fourcc=get_config('CLIP_FOURCC', 'avc1'),
+            )
+            self.clip_recorder.on_clip = self._clip_saved
+        self.on_clip_saved = None
+        # Recent capture times and the last detection time, for get_metrics()
+        self._capture_times = deque(maxlen=30)
+        self.detection_latency = None
         self._should_stop = False
+        # Connection state and reconnect pacing; all waits in the capture loop are on its stop event
+        self.supervisor = CameraSupervisor(
+            backoff_base=get_config('CAMERA_BACKOFF_BASE_SECONDS', 0.5),
+            backoff_max=get_config('CAMERA_BACKOFF_MAX_SECONDS', 30.0),
+        )
+        self.connect_attempts = get_config('CAMERA_CONNECT_ATTEMPTS', 3)
+        self._loop_thread = None
+        self._gave_up = False
         self.frame_rate = frame_rate
         self._load_model()
 
-    def try_open_camera(self, camera_index, max_attempts=3, backend=None):
+    def try_open_camera(self, camera_index, backend=None):
+        """Open the camera and read a test frame; returns the capture, or None. Never waits."""
         backend_name = f"Backend {backend}" if backend is not None else "Default Backend"
         logger.info(f"Attempting to open camera {camera_index} with {backend_name}...")
-        for attempt in range(max_attempts):
-            logger.info(f"  Attempt {attempt + 1}/{max_attempts}...")
-            cap = None
-            try:
-                if backend is not None:
-                    cap = cv2.VideoCapture(camera_index, backend)
-                    self.current_backend = backend
-                else:
-                    cap = cv2.VideoCapture(camera_index)
-                    self.current_backend = None
-                if cap and cap.isOpened():
-                    logger.info(f"    Camera {camera_index} opened. Checking frame read...")
-                    ret, test_frame = cap.read()
-                    if ret:
-                        logger.info(f"    ✅ Successfully read test frame from camera {camera_index}")
-                        return cap
-                    else:
-                        logger.warning(f"    ⚠️ Opened camera {camera_index}, but failed to read frame")
-                        if cap: cap.release()
-                else:
-                    logger.warning(f"    ❌ Failed to open camera {camera_index} on attempt {attempt + 1}")
-            except Exception as e:
-                logger.error(f"    ❌ Exception opening camera {camera_index}: {str(e)}")
-                if cap: cap.release()
-            time.sleep(1)
-        logger.error(f"❌ Failed to open camera {camera_index} after {max_attempts} attempts")
+        cap = None
+        try:
+            if backend is not None:
+                cap = cv2.VideoCapture(camera_index, backend)
+                self.current_backend = backend
+            else:
+                cap = cv2.VideoCapture(camera_index)
+                self.current_backend = None
+            if cap and cap.isOpened():
+                logger.info(f"    Camera {camera_index} opened. Checking frame read...")
+                ret, test_frame = cap.read()
+                if ret:
+                    logger.info(f"    ✅ Successfully read test frame from camera {camera_index}")
+                    return cap
+                logger.warning(f"    ⚠️ Opened camera {camera_index}, but failed to read frame")
+            else:
+                logger.warning(f"    ❌ Failed to open camera {camera_index}")
+        except Exception as e:
+            logger.error(f"    ❌ Exception opening camera {camera_index}: {str(e)}")
+        if cap:
+            cap.release()
         return None
 
     def list_cameras(self, max_devices=5):
@@ -364,33 +506,38 @@ class RealtimeAnalyzer(Analyzer):
         return available_cameras
 
     def select_camera(self, camera_index=None):
+        """Open the requested camera (or the first one found) once per backend.
+
+        Does not retry or wait: the capture loop retries through the
+        supervisor's backoff, which also gives a just-released device time
+        to settle.
+        """
         logger.info(f"🔄 Selecting camera. Requested index: {camera_index}")
-        available_cameras = self.list_cameras()
-        if camera_index is not None:
-            try:
-                self.camera_index = int(camera_index)
-            except (ValueError, TypeError):
+        try:
+            self.camera_index = int(camera_index)
+        except (ValueError, TypeError):
+            if camera_index is not None:
                 logger.error(f"❌ Invalid camera index provided: {camera_index}. Falling back.")
-                self.camera_index = available_cameras[0] if available_cameras else 0
-        elif available_cameras:
-            self.camera_index = available_cameras[0]
-            logger.info(f"ℹ️ No specific camera requested, selecting first available: {self.camera_index}")
-        else:
-            self.camera_index = 0
-            logger.warning("⚠️ No cameras detected, attempting index 0 by default")
-        if self.cap:
-            logger.info(f"Releasing existing camera capture...")
-            self.cap.release()
-            self.cap = None
-            time.sleep(2)  # <-- Longer delay for RPi4
+            # Probing every device is slow, so only done when there is no usable index
+            available_cameras = self.list_cameras()
+            if available_cameras:
+                self.camera_index = available_cameras[0]
+                logger.info(f"ℹ️ No specific camera requested, selecting first available: {self.camera_index}")
+            else:
+                self.camera_index = 0
+                logger.warning("⚠️ No cameras detected, attempting index 0 by default")
+        self.supervisor.camera_index = self.camera_index
+        self._release_camera()
         # Use only V4L2 and Default backend on RPi/Linux
         backends = [
             (cv2.CAP_V4L2, "V4L2"),
             (None, "Default"),
         ]
         for backend, name in backends:
+            if self._should_stop:
+                break
             logger.info(f"Trying to open camera {self.camera_index} with {name} backend...")
-            self.cap = self.try_open_camera(self.camera_index, backend=backend, max_attempts=3)
+            self.cap = self.try_open_camera(self.camera_index, backend=backend)
             if self.cap:
                 return True
         logger.error(f"❌❌ Failed to open camera {self.camera_index} with any backend")
@@ -398,73 +545,221 @@ class RealtimeAnalyzer(Analyzer):
         return False
 
     def reconnect_camera(self):
+        """Release the camera and open it again once; the capture loop backs off if this fails"""
         logger.warning(f"⚠️ Camera {self.camera_index} disconnected. Attempting reconnect...")
-        if self.cap:
-            self.cap.release()
-            self.cap = None
-            time.sleep(2)  # <-- Delay for RPi4
         if self.select_camera(self.camera_index):
             logger.info(f"✅ Reconnected to camera {self.camera_index}")
             return True
-        else:
-            logger.error(f"❌ Failed to reconnect camera {self.camera_index}")
-            return False
+        logger.error(f"❌ Failed to reconnect camera {self.camera_index}")
+        return False
+
+    def _release_camera(self):
+        cap, self.cap = self.cap, None
+        if cap is None:
+            return
+        try:
+            if cap.isOpened():
+                logger.info(f"Releasing camera {self.camera_index}...")
+                cap.release()
+        except Exception as e:
+            logger.error(f"Exception during cap.release(): {e}")
 
     def get_current_frame(self):
         return self.current_frame
 
-    def start(self, camera_index=0, show_video=True):
-        self._should_stop = False
-        logger.info(f"Attempting to start analyzer with camera index: {camera_index}")
-        if not self.select_camera(camera_index):
+    def _clip_saved(self, clip):
+        if self.on_clip_saved is not None:
+            self.on_clip_saved(clip)
+
+    def publish_frame(self, frame, annotate=None):
+        """Make frame the current frame under a new sequence number and wake waiting consumers.
+
+        frame is copied once into the next frame-ring slot and current_frame
+        becomes a view of that slot. annotate, if given, draws an overlay onto
+        the slot in place, so annotating costs no extra buffer. Returns the
+        published frame. Only the capture loop publishes, so the copy and the
+        overlay happen outside _frame_cond; ring readers are covered by the
+        slot's seqlock and the lock is held just to swap in the new frame.
+        """
+        seq = self.frame_seq + 1
+        now = time.time()
+        ring = self._ring_for(frame)
+        if ring is not None:
+            frame = ring.write(frame, seq, now, annotate)
+        elif annotate is not None:
+            frame = frame.copy()
+            self.frame_allocs += 1
+            annotate(frame)
+        with self._frame_cond:
+            self.current_frame = frame
+            self.frame_seq = seq
+            self.frame_time = now
+            self._frame_cond.notify_all()
+        return frame
+
+    def _ring_for(self, frame):
+        """The frame ring, (re)created to fit frame; None when disabled or unavailable"""
+        if not self.frame_ring_slots or self._should_stop or frame.dtype != 'uint8':
+            return None
+        if self.frame_ring is not None:
+            if self.frame_ring.fits(frame):
+                return self.frame_ring
+            self.frame_ring.close()  # resolution went up
+            self.frame_ring = None
+        prefix = f"cam{self.camera_index}"
+        try:
+            self.frame_ring = FrameRing.create(frame.shape, self.frame_ring_slots, prefix, self.frame_ring_shared)
+        except OSError as e:
+            logger.warning(f"Shared memory unavailable for camera {self.camera_index}, keeping frames in process: {e}")
+            self.frame_ring_shared = False
+            self.frame_ring = FrameRing.create(frame.shape, self.frame_ring_slots, prefix, shared=False)
+        self.frame_allocs += 1
+        return self.frame_ring
+
+    def frame_still_valid(self, seq):
+        """False once the frame published as seq has been overwritten in the ring.
+
+        Consumers check this after they are done with a frame view and drop
+        whatever they produced from it if it returns False.
+        """
+        ring = self.frame_ring
+        return ring is None or ring.holds(seq)
+
+    def has_viewers(self):
+        """True if a frame was read within VIEWER_TIMEOUT, here or from another process through the ring."""
+        last_read = self._last_read
+        ring = self.frame_ring
+        if ring is not None:
+            last_read = max(last_read, ring.last_read or 0)
+        return time.time() - last_read < self.VIEWER_TIMEOUT
+
+    def get_frame_info(self):
+        """Return (seq, capture_time, frame) for the current frame."""
+        self._last_read = time.time()
+        with self._frame_cond:
+            return self.frame_seq, self.frame_time, self.current_frame
+
+    def wait_for_frame(self, after_seq=0, timeout=None):
+        """Block until a frame newer than after_seq is published.
+
+        Returns (seq, capture_time, frame), None on timeout, or STOPPED when
+        the analyzer stops before a newer frame arrives, so consumers end
+        instead of polling an instance that will publish nothing more.
+        """
+        self._last_read = time.time()
+        with self._frame_cond:
+            self._frame_cond.wait_for(
+                lambda: self.frame_seq > after_seq or self._should_stop, timeout
+            )
+            if self.frame_seq <= after_seq or self.current_frame is None:
+                return STOPPED if self._should_stop else None
+            return self.frame_seq, self.frame_time, self.current_frame
+
+    def get_metrics(self):
+        """Capture fps over the recent frames and the latest detection latency."""
+        times = list(self._capture_times)
+        span = times[-1] - times[0] if len(times) > 1 else 0
+        return {
+            "fps": round((len(times) - 1) / span, 2) if span > 0 else 0.0,
+            "latency_ms": round(self.detection_latency * 1000, 1) if self.detection_latency is not None else None,
+            "frame_count": self.frame_count,
+            "frame_allocs": self.frame_allocs,
+            "annotations_skipped": self.annotations_skipped,
+            "peak_rss_mb": peak_rss_mb(),
+            "clips": self.clip_recorder.stats() if self.clip_recorder is not None else None,
+            "camera_state": self.supervisor.state,
+            "reconnect_failures": self.supervisor.failures,
+        }
+
+    def _connect(self, camera_index):
+        """One connection attempt from the capture loop; False when the loop should end"""
+        supervisor = self.supervisor
+        supervisor.transition(CONNECTING)
+        if self.select_camera(camera_index):
+            supervisor.connected()
+            if self.clip_recorder is not None:
+                self.clip_recorder.camera_index = self.camera_index
+            return True
+        if self._should_stop:
+            return False
+        if not supervisor.ever_live and supervisor.failures + 1 >= self.connect_attempts:
+            # A camera that never came up is most likely absent; one that was live keeps retrying
             logger.error(f"Failed to select/open camera {camera_index}. Analyzer cannot start.")
+            supervisor.failures += 1
+            supervisor.transition(STOPPED, f"Could not open camera {camera_index} after {supervisor.failures} attempts")
+            self._gave_up = True
             return False
-        logger.info(f"📹 Starting real-time detection loop for camera {self.camera_index}...")
+        return supervisor.backoff(f"Could not open camera {camera_index}")
+
+    def start(self, camera_index=0, show_video=True, start_delay=0):
+        """Run the capture loop until stop(); returns False if it gave up on a camera that never opened.
+
+        start_delay staggers camera starts without blocking the caller's thread. A stop()
+        that arrived before start() (e.g. right after the analyzer was registered) is kept:
+        start() then returns at once. reset() clears it for another run.
+        """
+        self._loop_thread = threading.current_thread()
+        if self._should_stop:
+            logger.info(f"Analyzer for camera {camera_index} was stopped before it started")
+            self._loop_thread = None
+            self.stop()
+            return True
+        self._gave_up = False
+        supervisor = self.supervisor
+        supervisor.camera_index = camera_index
+        logger.info(f"Attempting to start analyzer with camera index: {camera_index}")
+        if start_delay > 0:
+            supervisor.transition(CONNECTING, f"Staggered start, waiting {start_delay:.1f}s")
+            supervisor.wait(start_delay)
         logger.info(f"📹 Using frame rate of {self.frame_rate}s sleep between frames")
         self.frame_count = 0
         self.current_frame = None
         fail_count = 0
-        while not self._should_stop:
-            try:
-                if not self.cap or not self.cap.isOpened():
+        try:
+            while not self._should_stop:
+                try:
+                    if not self.cap or not self.cap.isOpened():
+                        if not self._connect(camera_index):
+                            break
+                        logger.info(f"📹 Starting real-time detection loop for camera {self.camera_index}...")
+                        fail_count = 0
+                        continue
+                    ret, frame = self.cap.read()
                     if self._should_stop:
                         break
-                    if not self.reconnect_camera():
-                        break
-                    time.sleep(1)
-                    continue
-                ret, frame = self.cap.read()
-                if self._should_stop:
-                    break
-                if not ret or frame is None:
-                    fail_count += 1
-                    logger.warning(f"⚠️ Failed to read frame from camera {self.camera_index}. Retrying... (fail_count={fail_count})")
-                    if self.cap:
-                        logger.warning(f"Camera {self.camera_index} isOpened: {self.cap.isOpened()}")
-                    else:
-                        logger.warning(f"Camera {self.camera_index} cap object is None!")
-                    if fail_count > 10:
-                        logger.warning(f"Too many failed reads, attempting to reconnect camera {self.camera_index}")
-                        self.reconnect_camera()
+                    if not ret or frame is None:
+                        fail_count += 1
+                        logger.warning(f"⚠️ Failed to read frame from camera {self.camera_index}. Retrying... (fail_count={fail_count})")
+                        supervisor.transition(DEGRADED, "Failed to read frames")
+                        if fail_count > 10:
+                            logger.warning(f"Too many failed reads, attempting to reconnect camera {self.camera_index}")
+                            self._release_camera()  # the next iteration reconnects, backing off if needed
+                            fail_count = 0
+                            continue
+                        supervisor.wait(0.1)
+                        continue
+                    if fail_count:
                         fail_count = 0
-                    time.sleep(0.1)
-                    continue
-                else:
-                    fail_count = 0
-                self.current_frame = frame.copy()
-                self.frame_count += 1
-                if self.frame_count % self.save_interval == 0:
-                    self.process_frame(frame)
-                if show_video:
-                    cv2.imshow(f'Live Feed (Cam {self.camera_index} - press q to quit)', self.current_frame)
-                    if cv2.waitKey(10) & 0xFF == ord('q'):
-                        break
-                time.sleep(self.frame_rate)
-            except Exception as e:
-                logger.exception(f"⚠️ Unhandled exception in analysis loop: {e}")
-                time.sleep(1)
-        self.stop()
-        return True
+                        supervisor.transition(LIVE, "Frames resumed")
+                    self.publish_frame(frame)
+                    self._capture_times.append(time.time())
+                    if self.clip_recorder is not None:
+                        self.clip_recorder.add(frame, self._capture_times[-1])
+                    self.frame_count += 1
+                    if self.frame_count % self.save_interval == 0:
+                        self.process_frame(frame)
+                    if show_video:
+                        cv2.imshow(f'Live Feed (Cam {self.camera_index} - press q to quit)', self.current_frame)
+                        if cv2.waitKey(10) & 0xFF == ord('q'):
+                            break
+                    supervisor.wait(self.frame_rate)
+                except Exception as e:
+                    logger.exception(f"⚠️ Unhandled exception in analysis loop: {e}")
+                    supervisor.wait(1)
+        finally:
+            self._loop_thread = None
+            self.stop()
+        return not self._gave_up
 
     def process_frame(self, frame):
         start_time = time.time()
@@ -472,15 +767,17 @@ class RealtimeAnalyzer(Analyzer):
         frame_size = f"{w}x{h}"
         results, detections = self.detect_objects(frame)
         detection_time = time.time() - start_time
+        self.detection_latency = detection_time
         if results is None or len(detections) == 0:
             processing_info = f"No objects detected | Frame: {self.frame_count} | Size: {frame_size} | Time: {detection_time:.3f}s"
             logger.info(processing_info)
-            info_frame = frame.copy()
-            cv2.putText(info_frame, processing_info, (10, 30), 
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-            self.current_frame = info_frame
-            return results, detections
-        annotated_frame, detection_dict = self.process_detections(frame, detections)
+            if self.has_viewers():
+                self.publish_frame(frame, annotate=lambda image: cv2.putText(
+                    image, processing_info, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2))
+            else:
+                self.annotations_skipped += 1
+            return results, detections, None
+        detection_dict = self.detection_summary(detections)
         detection_classes = list(detection_dict.keys())
         total_objects = sum(len(confidences) for confidences in detection_dict.values())
         class_counts = {cls: len(confidences) for cls, confidences in detection_dict.items()}
@@ -490,39 +787,77 @@ class RealtimeAnalyzer(Analyzer):
         print(f"Detected {total_objects} objects across {len(detection_classes)} classes:")
         for cls in detection_classes:
             print(f"  - {cls}: {class_counts[cls]} objects (avg conf: {avg_confidences[cls]:.2f})")
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
-        camera_folder = os.path.join(self.output_folder, f"camera_{self.camera_index}")
-        os.makedirs(camera_folder, exist_ok=True)
-        save_path = os.path.join(camera_folder, f"frame_{timestamp}.jpg")
-        try:
-            cv2.imwrite(save_path, annotated_frame)
-            logger.debug(f"Saved frame to {save_path}")
-        except Exception as e:
-            logger.error(f"Error saving frame to {save_path}: {str(e)}")
-        self.current_frame = annotated_frame
-        return results, detections
+        captured_at = datetime.now()
+        if self.clip_recorder is not None:
+            self.clip_recorder.trigger(class_counts, captured_at.timestamp())
+        timestamp = captured_at.strftime('%Y%m%d_%H%M%S_%f')
+        # The writer creates the hourly shard folder on first use
+        save_path = os.path.join(shard_folder(self.output_folder, self.camera_index, captured_at),
+                                 f"frame_{timestamp}{self.storage_profile.extension}")
+        saved = {
+            "path": save_path,
+            "camera_index": self.camera_index,
+            "frame_number": self.frame_count,
+            "timestamp": captured_at,
+            "class_counts": class_counts,
+            "objects": self.detection_payload(detections),
+            "scale": self.storage_profile.scale_for(frame.shape),
+            "thumbnail_path": self.storage_profile.thumbnail_path(save_path),
+        }
+
+        def annotate(image):
+            self.draw_detections(image, detections)
+        if self.frame_storage_mode == 'raw':
+            # Only the live view needs the overlay now, and only if someone is watching
+            if self.has_viewers():
+                self.publish_frame(frame, annotate=annotate)
+            else:
+                self.annotations_skipped += 1
+            image = frame
+            saved["raw"] = True
+        else:
+            # Drawn straight into the next ring slot; only this thread writes the ring, so the
+            # slot stays intact until the writer has copied it below
+            image = self.publish_frame(frame, annotate=annotate)
+
+        def on_durable(path, file_size):
+            logger.debug(f"Saved frame to {path}")
+            if self.on_frame_saved is not None:
+                self.on_frame_saved(dict(saved, file_size=file_size))
+        # Encoding and disk I/O happen on the writer pool; returns the queued frame, or None if dropped
+        if not image_writer.submit(save_path, image, on_durable=on_durable, profile=self.storage_profile):
+            saved = None
+        return results, detections, saved
 
     def stop(self):
+        """Stop the capture loop. Returns at once; the loop releases the camera as it exits."""
         self._should_stop = True
-        if hasattr(self, 'cap') and self.cap is not None:
-            try:
-                if self.cap.isOpened():
-                    logger.info(f"Releasing camera {self.camera_index} in stop()...")
-                    self.cap.release()
-                else:
-                    logger.info(f"Camera {self.camera_index} cap exists but is not opened.")
-            except Exception as e:
-                logger.error(f"Exception during cap.release(): {e}")
-            self.cap = None
-            time.sleep(2)  # <-- Delay for RPi4
+        self.supervisor.stop()
+        with self._frame_cond:
+            self._frame_cond.notify_all()
+        loop_thread = self._loop_thread
+        if loop_thread is not None and loop_thread is not threading.current_thread():
+            return
+        # Called by the loop itself on its way out, or when no loop is running
+        if self.clip_recorder is not None:
+            self.clip_recorder.close()
+        with self._frame_cond:
+            if self.frame_ring is not None:
+                self.frame_ring.close()
+                self.frame_ring = None
+        self._release_camera()
         try:
             cv2.destroyAllWindows()
         except Exception:
             pass
+        if self.supervisor.state != STOPPED:
+            self.supervisor.transition(STOPPED, "Analyzer stopped")
         logger.info("Analyzer stopped")
 
     def reset(self):
         logger.info(f"🔄 Resetting analyzer state for camera {self.camera_index}...")
+        self._should_stop = False
+        self.supervisor.reset()
         self.frame_count = 0
         self.current_frame = None
         self.last_error_time = 0
@@ -0,0 +1,543 @@
+"""Analyzer daemon: cameras and the model in their own process.
+
+In ANALYZER_MODE=daemon the camera threads, the detection model and the
+background maintenance (retention, quota eviction, idle-camera checks) run
+in a process started with ``flask --app app analyzer-daemon``. Web workers
+talk to it over a local multiprocessing.connection socket:
+
+* AnalyzerDaemon serves RPCs on top of the ordinary analyzer_state
+  functions in the daemon process.
+* AnalyzerClient is a small pooled RPC client.
+* RemoteAnalyzerState is installed as analyzer_state.remote in the web
+  process. start/stop calls become RPCs, and a sync thread mirrors daemon
+  status into analyzer_state's dicts as RemoteAnalyzer/RemoteThread proxies,
+  so views and streaming keep reading them unchanged.
+* On the same host, frames are not sent over the socket: RemoteAnalyzer
+  attaches to the camera's shared-memory FrameRing and reads views of it,
+  using RPCs only to wait for new sequence numbers.
+
+multiprocessing.connection unpickles every message, so the authkey is what
+stands between the socket and code execution. It never defaults to a known
+value: on a Unix socket the daemon generates one per run and writes it to
+``<socket>.key`` (mode 0600) for web workers of the same user to read; a
+TCP address needs an explicit ANALYZER_DAEMON_AUTHKEY.
+"""
+import os
+import queue
+import secrets
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+
+import analyzer_state
+from camera_supervisor import STOPPED
+from events import event_bus
+from frame_ring import FrameRing
+from retention import retention_engine
+from storage import storage_manager
+
+# Known placeholder secrets that must never protect a listening socket
+WEAK_AUTHKEYS = {'', 'your-secret-key-goes-here'}
+
+class AnalyzerUnavailable(RuntimeError):
+    """The analyzer daemon cannot be reached"""
+
+def parse_address(address):
+    """'host:port' -> (host, port) for TCP; anything else is a Unix socket path"""
+    if not address.startswith('/') and ':' in address:
+        host, port = address.rsplit(':', 1)
+        return (host, int(port))
+    return address
+
+def key_file(address):
+    """Where the daemon publishes its generated authkey for a Unix socket address"""
+    return f"{address}.key"
+
+def configured_authkey(address, authkey):
+    """The explicit ANALYZER_DAEMON_AUTHKEY as bytes, or None to use the generated key file.
+
+    Raises ValueError for a TCP address without a proper key, or for a key
+    that is one of the public placeholders.
+    """
+    if authkey in WEAK_AUTHKEYS:
+        if isinstance(address, tuple):
+            raise ValueError("ANALYZER_DAEMON_AUTHKEY must be set to a secret value to use a host:port "
+                             "analyzer daemon address")
+        if authkey:
+            raise ValueError("ANALYZER_DAEMON_AUTHKEY must not be the placeholder secret")
+        return None
+    return authkey.encode()
+
+def write_key_file(address):
+    """Generate a fresh authkey and write it, readable only by this user, next to the socket"""
+    path = key_file(address)
+    if os.path.lexists(path):
+        os.remove(path)
+    key = secrets.token_hex(32)
+    # O_EXCL: never follow a link someone else planted at the path
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(key)
+    return key.encode()
+
+def read_key_file(address):
+    try:
+        with open(key_file(address)) as f:
+            return f.read().strip().encode()
+    except OSError as e:
+        raise AnalyzerUnavailable(f"Cannot read the analyzer daemon key {key_file(address)}: {e}")
+
+# --- Daemon side ---
+
+class AnalyzerDaemon:
+    """Serves analyzer_state over a multiprocessing.connection listener, one thread per client connection"""
+
+    def __init__(self, app, address, authkey):
+        self.app = app
+        self.address = parse_address(address)
+        self.authkey = configured_authkey(self.address, authkey)
+        self.methods = {
+            'status': self.status,
+            'ensure_started': self.ensure_started,
+            'wait_startup': self.wait_startup,
+            'start': lambda idx: analyzer_state.start_analyzer_thread(camera_index=idx, show_video=False),
+            'stop': analyzer_state.stop_analyzer_thread,
+            'start_all': analyzer_state.start_all_camera_analyzers,
+            'stop_all': analyzer_state.stop_all_analyzers,
+            'allow_start': analyzer_state.allow_analyzers_start,
+            'touch': self.touch,
+            'check_inactive': self.check_inactive,
+            'frame_info': self.frame_info,
+            'wait_for_frame': self.wait_for_frame,
+            'wait_for_seq': self.wait_for_seq,
+            'events': self.events,
+            'camera_history': analyzer_state.get_camera_history,
+            'storage.record_frame': storage_manager.record_frame,
+            'storage.record_upload': storage_manager.record_upload,
+            'storage.usage': storage_manager.usage,
+            'retention.metrics': retention_engine.get_metrics,
+            'retention.trigger': retention_engine.trigger,
+        }
+
+    def serve_forever(self):
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.remove(self.address)  # stale socket from a previous run
+        authkey = self.authkey or write_key_file(self.address)
+        with Listener(self.address, authkey=authkey) as listener:
+            self.app.logger.info(f"Analyzer daemon listening on {self.address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    self.app.logger.warning(f"Rejected analyzer daemon connection: {e}")
+                    continue
+                threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        with conn:
+            while True:
+                try:
+                    method, args, kwargs = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    handler = self.methods[method]
+                    with self.app.app_context():
+                        reply = (True, handler(*args, **kwargs))
+                except Exception as e:
+                    self.app.logger.error(f"Error in analyzer daemon call {method}: {e}")
+                    reply = (False, f"{type(e).__name__}: {e}")
+                try:
+                    conn.send(reply)
+                except (EOFError, OSError):
+                    return
+
+    def status(self):
+        cameras = {}
+        with analyzer_state.analyzer_lock:
+            for idx, thread in analyzer_state.analyzer_threads.items():
+                instance = analyzer_state.analyzer_instances.get(idx)
+                cameras[idx] = {
+                    "alive": thread.is_alive(),
+                    "running": bool(analyzer_state.analyzer_running.get(idx)),
+                    "instance": id(instance) if instance is not None else None,
+                    "metrics": instance.get_metrics() if instance is not None else None,
+                    "ring": getattr(getattr(instance, "frame_ring", None), "name", None),
+                }
+            states = {idx: history[-1]["state"] for idx, history in analyzer_state.camera_history.items() if history}
+        return {"globally_stopped": analyzer_state.analyzers_globally_stopped, "cameras": cameras,
+                "camera_states": states}
+
+    def ensure_started(self, camera_index):
+        startup = analyzer_state.ensure_analyzer_started(camera_index)
+        return None if startup is None else (startup.state(), startup.error)
+
+    def wait_startup(self, camera_index, timeout):
+        startup = analyzer_state.analyzer_startups.get(camera_index)
+        if startup is None:
+            return "failed", "Analyzer was never started"
+        startup.wait(timeout)
+        return startup.state(), startup.error
+
+    def touch(self, access_times):
+        for idx, accessed_at in access_times.items():
+            if accessed_at > analyzer_state.camera_last_access.get(idx, 0):
+                analyzer_state.camera_last_access[idx] = accessed_at
+
+    def check_inactive(self, access_times):
+        """Stop idle cameras now, counting the web process's latest access times"""
+        self.touch(access_times)
+        analyzer_state.check_inactive_cameras()
+
+    @staticmethod
+    def _instance(camera_index):
+        with analyzer_state.analyzer_lock:
+            return analyzer_state.analyzer_instances.get(camera_index)
+
+    def frame_info(self, camera_index, have_seq=0):
+        """Current (seq, time, frame); the frame is omitted if the caller already has that seq"""
+        instance = self._instance(camera_index)
+        if instance is None:
+            return None
+        seq, frame_time, frame = instance.get_frame_info()
+        return seq, frame_time, (None if seq == have_seq else frame)
+
+    def wait_for_frame(self, camera_index, after_seq=0, timeout=None):
+        instance = self._instance(camera_index)
+        if instance is None:
+            return None
+        return instance.wait_for_frame(after_seq, timeout)
+
+    def wait_for_seq(self, camera_index, after_seq=0, timeout=None):
+        """wait_for_frame without the pixels, for clients that read frames from the ring"""
+        item = self.wait_for_frame(camera_index, after_seq, timeout)
+        return item if item is None or item == STOPPED else (item[0], item[1], None)
+
+    def events(self, after_id, timeout):
+        if after_id == 0 or after_id > event_bus.last_id:
+            # New relay, or one holding ids from an earlier daemon run: start from now
+            return event_bus.last_id, []
+        events = event_bus.wait_for_events(after_id, timeout)
+        if events is None:
+            return event_bus.last_id, []
+        return (events[-1][0] if events else after_id), events
+
+# --- Web side ---
+
+class AnalyzerClient:
+    """Thread-safe RPC client; keeps a small pool of open connections"""
+
+    def __init__(self, address, authkey, pool_size=8):
+        self.address = parse_address(address)
+        self.authkey = configured_authkey(self.address, authkey)
+        self.pool_size = pool_size
+        self._pool = queue.LifoQueue()
+
+    def call(self, method, *args, **kwargs):
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            try:
+                # The generated key changes with every daemon run, so read it per new connection
+                conn = Client(self.address, authkey=self.authkey or read_key_file(self.address))
+            except (OSError, AuthenticationError) as e:
+                raise AnalyzerUnavailable(f"Analyzer daemon unreachable at {self.address}: {e}")
+        try:
+            conn.send((method, args, kwargs))
+            ok, result = conn.recv()
+        except (EOFError, OSError) as e:
+            conn.close()
+            raise AnalyzerUnavailable(f"Lost connection to analyzer daemon: {e}")
+        if self._pool.qsize() < self.pool_size:
+            self._pool.put(conn)
+        else:
+            conn.close()
+        if not ok:
+            raise RuntimeError(result)
+        return result
+
+class RemoteThread:
+    """Stands in for a daemon-side analyzer thread in analyzer_state.analyzer_threads"""
+
+    def __init__(self, alive):
+        self.alive = alive
+
+    def is_alive(self):
+        return self.alive
+
+class RemoteAnalyzer:
+    """Web-side proxy for one daemon-side RealtimeAnalyzer.
+
+    Mirrors the frame-slot API (get_frame_info, wait_for_frame) used by the
+    stream, mosaic and thumbnail code. Frames are read zero-copy from the
+    daemon's frame ring when it can be attached; otherwise they are fetched
+    over RPC, one fetch per camera in flight at a time with the last frame
+    cached, so any number of local consumers cost one transfer per new frame.
+    """
+
+    def __init__(self, client, camera_index):
+        self.client = client
+        self.camera_index = camera_index
+        self._cond = threading.Condition()
+        self._fetching = False
+        self.frame_seq = 0
+        self.frame_time = None
+        self.current_frame = None
+        self.metrics = {}
+        self.ring_name = None
+        self._ring = None
+        self._ring_failed = None
+
+    @property
+    def frame_count(self):
+        return self.metrics.get("frame_count", 0)
+
+    def get_metrics(self):
+        return dict(self.metrics)
+
+    def get_current_frame(self):
+        return self.get_frame_info()[2]
+
+    def _store(self, item):
+        if item is not None and item[0] >= self.frame_seq:
+            seq, frame_time, frame = item
+            if frame is not None or seq == self.frame_seq:
+                self.frame_seq, self.frame_time = seq, frame_time
+                if frame is not None:
+                    self.current_frame = frame
+
+    def _fetch(self, method, *args):
+        """Run one fetch RPC unless another thread is already doing so; returns STOPPED if the analyzer stopped"""
+        with self._cond:
+            if self._fetching:
+                self._cond.wait(1.0)
+                return None
+            self._fetching = True
+        try:
+            item = self.client.call(method, self.camera_index, *args)
+        except AnalyzerUnavailable:
+            item = None
+        finally:
+            with self._cond:
+                self._fetching = False
+                self._cond.notify_all()
+        if item == STOPPED:
+            return STOPPED
+        with self._cond:
+            self._store(item)
+        return None
+
+    def _frame_ring(self):
+        """The daemon's frame ring for this camera, attached on first use; None means use RPC frames"""
+        with self._cond:
+            name = self.ring_name
+            if name is None or name == self._ring_failed:
+                return None
+            if self._ring is None or self._ring.name != name:
+                try:
+                    ring = FrameRing.attach(name)
+                except (OSError, ValueError):
+                    # Not on the daemon's host, or the ring was just replaced
+                    self._ring_failed = name
+                    return None
+                if self._ring is not None:
+                    self._ring.close()
+                self._ring = ring
+            return self._ring
+
+    def frame_still_valid(self, seq):
+        ring = self._ring
+        return ring is None or ring.holds(seq)
+
+    def get_frame_info(self):
+        ring = self._frame_ring()
+        item = ring.read() if ring is not None else None
+        if item is not None:
+            return item
+        self._fetch('frame_info', self.frame_seq)
+        with self._cond:
+            return self.frame_seq, self.frame_time, self.current_frame
+
+    def wait_for_frame(self, after_seq=0, timeout=None):
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            ring = self._frame_ring()
+            if ring is not None:
+                item = ring.read()
+                if item is not None and item[0] > after_seq:
+                    return item
+            else:
+                with self._cond:
+                    if self.frame_seq > after_seq and self.current_frame is not None:
+                        return self.frame_seq, self.frame_time, self.current_frame
+            remaining = deadline - time.monotonic() if deadline is not None else 5.0
+            if remaining <= 0:
+                return None
+            if ring is not None:
+                fetched = self._fetch('wait_for_seq', max(after_seq, ring.latest_seq), min(remaining, 5.0))
+            else:
+                fetched = self._fetch('wait_for_frame', max(after_seq, self.frame_seq), min(remaining, 5.0))
+            if fetched == STOPPED:
+                return STOPPED
+
+class RemoteStartup:
+    """AnalyzerStartup look-alike backed by the daemon's startup handle"""
+
+    def __init__(self, client, camera_index, state, error=None):
+        self.client = client
+        self.camera_index = camera_index
+        self._state = state
+        self.error = error
+
+    @property
+    def done(self):
+        return self._state != "starting"
+
+    @property
+    def ok(self):
+        return self._state == "ready"
+
+    def state(self):
+        return self._state
+
+    def wait(self, timeout=None):
+        if not self.done:
+            try:
+                self._state, self.error = self.client.call('wait_startup', self.camera_index, timeout)
+            except AnalyzerUnavailable as e:
+                self._state, self.error = "failed", str(e)
+        return self.ok
+
+class RemoteAnalyzerState:
+    """analyzer_state.remote in the web process: RPCs plus a mirror of daemon status"""
+
+    def __init__(self, client, sync_interval=1.0):
+        self.client = client
+        self.sync_interval = sync_interval
+        self._wake = threading.Event()
+        self._started = False
+        self._start_lock = threading.Lock()
+        self.connected = False
+        self.camera_states = {}  # supervisor state per camera, mirrored from the daemon
+
+    def start_sync(self):
+        """Start the status mirror and event relay threads (idempotent)"""
+        with self._start_lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._sync_loop, daemon=True).start()
+        threading.Thread(target=self._relay_events, daemon=True).start()
+
+    def sync(self):
+        """Pull daemon status into analyzer_state's dicts and push local access times"""
+        self.client.call('touch', dict(analyzer_state.camera_last_access))
+        status = self.client.call('status')
+        analyzer_state.analyzers_globally_stopped = status["globally_stopped"]
+        self.camera_states = status.get("camera_states", {})
+        with analyzer_state.analyzer_lock:
+            for idx, camera in status["cameras"].items():
+                analyzer_state.analyzer_threads[idx] = RemoteThread(camera["alive"])
+                analyzer_state.analyzer_running[idx] = camera["running"]
+                proxy = analyzer_state.analyzer_instances.get(idx)
+                if camera["instance"] is None:
+                    analyzer_state.analyzer_instances[idx] = None
+                    continue
+                if proxy is None or getattr(proxy, "remote_id", None) != camera["instance"]:
+                    # A new daemon-side instance restarts frame numbering, so it gets a new proxy
+                    proxy = RemoteAnalyzer(self.client, idx)
+                    proxy.remote_id = camera["instance"]
+                    analyzer_state.analyzer_instances[idx] = proxy
+                proxy.metrics = camera["metrics"] or {}
+                proxy.ring_name = camera.get("ring")
+
+    def _sync_loop(self):
+        while True:
+            try:
+                self.sync()
+                self.connected = True
+            except AnalyzerUnavailable as e:
+                if self.connected:
+                    analyzer_state.app.logger.error(str(e))
+                self.connected = False
+                with analyzer_state.analyzer_lock:
+                    for idx in list(analyzer_state.analyzer_running):
+                        analyzer_state.analyzer_running[idx] = False
+                        analyzer_state.analyzer_instances[idx] = None
+            except Exception as e:
+                analyzer_state.app.logger.error(f"Error syncing analyzer daemon status: {e}")
+            self._wake.wait(self.sync_interval)
+            self._wake.clear()
+
+    def _relay_events(self):
+        """Republish daemon events on the local event bus so /api/events works in every web worker"""
+        after_id = 0
+        while True:
+            try:
+                after_id, events = self.client.call('events', after_id, 15.0)
+            except Exception:
+                time.sleep(self.sync_interval)
+                continue
+            for _, event_type, data in events:
+                if event_type == "camera_state":
+                    self._wake.set()
+                elif event_type == "camera_health":
+                    self.camera_states[data["camera_index"]] = data["state"]
+                event_bus.publish(event_type, data)
+
+    # analyzer_state API
+
+    def start_analyzer_thread(self, camera_index=0, show_video=False):
+        started = self.client.call('start', camera_index)
+        self._wake.set()
+        return started
+
+    def ensure_analyzer_started(self, camera_index, show_video=False):
+        result = self.client.call('ensure_started', camera_index)
+        self._wake.set()
+        if result is None:
+            return None
+        state, error = result
+        return RemoteStartup(self.client, camera_index, state, error)
+
+    def stop_analyzer_thread(self, camera_index):
+        self.client.call('stop', camera_index)
+        self.sync()
+
+    def start_all_camera_analyzers(self):
+        result = self.client.call('start_all')
+        self._wake.set()
+        return result
+
+    def stop_all_analyzers(self):
+        stopped = self.client.call('stop_all')
+        self.sync()
+        return stopped
+
+    def allow_analyzers_start(self):
+        self.client.call('allow_start')
+        analyzer_state.analyzers_globally_stopped = False
+
+    def get_camera_history(self, camera_index):
+        return self.client.call('camera_history', camera_index)
+
+    def check_inactive_cameras(self):
+        self.client.call('check_inactive', dict(analyzer_state.camera_last_access))
+        self._wake.set()
+
+def attach(app):
+    """Switch this (web) process to talk to the analyzer daemon"""
+    client = AnalyzerClient(app.config['ANALYZER_DAEMON_ADDRESS'], app.config['ANALYZER_DAEMON_AUTHKEY'])
+    remote = RemoteAnalyzerState(client, app.config['ANALYZER_DAEMON_SYNC_SECONDS'])
+    analyzer_state.remote = remote
+    # The daemon writes the frames, so it owns storage accounting and retention
+    storage_manager.remote = retention_engine.remote = client
+    # Mirror threads start with the first request, so CLI commands that import the app stay local
+    app.before_request(remote.start_sync)
+    return remote
+
+def detach():
+    """Undo attach(): this process runs the analyzers itself"""
+    analyzer_state.remote = None
+    storage_manager.remote = retention_engine.remote = None
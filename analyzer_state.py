@@ -1,7 +1,14 @@
 import threading
 import time
 import os
-from datetime import datetime
+from collections import deque
+from rollups import record_frame_detections
+from camera_registry import get_camera_video_id
+from storage import storage_manager
+from events import event_bus
+from storage_profiles import camera_profile
+import camera_workers
+from camera_supervisor import STOPPED, state_entry
 
 # These will be set by the Flask app at runtime
 app = None
@@ -9,28 +16,123 @@ db = None
 Video = None
 Frame = None
 DetectedObject = None
+Clip = None
 RealtimeAnalyzer = None
 
 analyzers_globally_stopped = False
 
+# RemoteAnalyzerState when cameras live in the analyzer daemon (see analyzer_daemon.attach)
+remote = None
+
 analyzer_threads = {}
 analyzer_instances = {}
 analyzer_running = {}
 analyzer_lock = threading.RLock()
 camera_last_access = {}
+analyzer_startups = {}
+# Supervisor state changes per camera (newest last), kept across analyzer restarts
+camera_history = {}
+
+class AnalyzerStartup:
+    """Readiness handle for one analyzer start.
+
+    Set as soon as the analyzer publishes its first frame, or marked failed
+    if the thread ends before that. Request handlers wait on it with a short
+    timeout (or not at all) instead of sleeping for a fixed time.
+    """
+
+    def __init__(self, camera_index):
+        self.camera_index = camera_index
+        self.started_at = time.time()
+        self.ready_at = None
+        self.error = None
+        self._event = threading.Event()
+
+    @property
+    def done(self):
+        return self._event.is_set()
+
+    @property
+    def ok(self):
+        return self.done and self.error is None
+
+    def set_ready(self):
+        if not self.done:
+            self.ready_at = time.time()
+            self._event.set()
+
+    def set_failed(self, error):
+        if not self.done:
+            self.error = error
+            self._event.set()
+
+    def wait(self, timeout=None):
+        """Block until the analyzer is live or failed; returns True only if it is live"""
+        self._event.wait(timeout)
+        return self.ok
+
+    def state(self):
+        if not self.done:
+            return "starting"
+        return "ready" if self.error is None else "failed"
+
+def publish_camera_state(camera_index, state):
+    event_bus.publish("camera_state", {"camera_index": camera_index, "state": state})
+
+def record_camera_state(camera_index, entry):
+    """Append a supervisor state change (a camera_supervisor.state_entry) to the camera's history and announce it"""
+    with analyzer_lock:
+        history = camera_history.get(camera_index)
+        if history is None:
+            history = camera_history[camera_index] = deque(maxlen=app.config['CAMERA_STATE_HISTORY'])
+        history.append(entry)
+    event_bus.publish("camera_health", dict(entry, camera_index=camera_index))
+
+def get_camera_history(camera_index):
+    """The camera's recorded state changes, oldest first"""
+    if remote is not None:
+        return remote.get_camera_history(camera_index)
+    with analyzer_lock:
+        return list(camera_history.get(camera_index, ()))
+
+def camera_state(camera_index):
+    """The camera's current supervisor state, or None if it never ran"""
+    if remote is not None:
+        return remote.camera_states.get(camera_index)
+    with analyzer_lock:
+        history = camera_history.get(camera_index)
+        return history[-1]["state"] if history else None
+
+def camera_status_snapshot():
+    """Status of every known camera, in the shape of /api/analyzer/status?all=true"""
+    cameras = {}
+    with analyzer_lock:
+        for cam_idx, thread in analyzer_threads.items():
+            running = analyzer_running.get(cam_idx, False)
+            instance = analyzer_instances.get(cam_idx)
+            cameras[str(cam_idx)] = {
+                "status": "active" if (thread.is_alive() and running) else "inactive",
+                "frame_count": instance.frame_count if instance else 0,
+                "camera_index": cam_idx,
+                "camera_state": camera_state(cam_idx)
+            }
+    return cameras
 
 def set_app_context(flask_app, db_models, analyzer_class):
     """Call this ONCE in app.py after app and models are initialized."""
-    global app, db, Video, Frame, DetectedObject, RealtimeAnalyzer
+    global app, db, Video, Frame, DetectedObject, Clip, RealtimeAnalyzer
     app = flask_app
     db = db_models['db']
     Video = db_models['Video']
     Frame = db_models['Frame']
     DetectedObject = db_models['DetectedObject']
+    Clip = db_models['Clip']
     RealtimeAnalyzer = analyzer_class
 
 def start_all_camera_analyzers():
     global analyzers_globally_stopped
+    if remote is not None:
+        return remote.start_all_camera_analyzers()
     if analyzers_globally_stopped:
         app.logger.info("Global stop is active. Not starting any analyzers.")
         return 0, []
@@ -47,14 +149,15 @@ def start_all_camera_analyzers():
         cameras_to_start = available_cameras[:app.config['MAX_CONCURRENT_CAMERAS']]
         if len(available_cameras) > app.config['MAX_CONCURRENT_CAMERAS']:
             app.logger.info(f"Limiting initial startup to {app.config['MAX_CONCURRENT_CAMERAS']} cameras. Others will start on demand.")
-        for camera_idx in cameras_to_start:
+        for position, camera_idx in enumerate(cameras_to_start):
             app.logger.info(f"Starting analyzer for camera {camera_idx}...")
-            if start_analyzer_thread(camera_index=camera_idx, show_video=False):
+            # Staggered inside each analyzer thread, so the caller is not held up
+            start_delay = position * app.config['CAMERA_STARTUP_DELAY']
+            if start_analyzer_thread(camera_index=camera_idx, show_video=False, start_delay=start_delay):
                 started_count += 1
                 camera_last_access[camera_idx] = time.time()
             else:
                 app.logger.error(f"Failed to start analyzer thread for camera {camera_idx}")
-            time.sleep(app.config['CAMERA_STARTUP_DELAY'])
         app.logger.info(f"start_all_camera_analyzers returning: started={started_count}, cameras={available_cameras}")
         return started_count, available_cameras
     except Exception as e:
@@ -68,119 +171,261 @@ def start_all_camera_analyzers():
             except Exception:
                 pass
 
-def run_analyzer_in_thread(camera_index=0, show_video=False):
+def analyzer_kwargs(camera_index):
+    """RealtimeAnalyzer settings for a camera, slowing every camera down as more of them run"""
+    with analyzer_lock:
+        active_camera_count = sum(1 for cam_idx, running in analyzer_running.items() if running)
+    base_frame_rate = app.config['ANALYSIS_CONFIG']["realtime"]["frame_rate"]
+    dynamic_frame_rate = base_frame_rate * max(1.0, min(3.0, active_camera_count / 2))
+    app.logger.info(f"Camera {camera_index} using dynamic frame rate: {dynamic_frame_rate:.3f}s sleep")
+    return dict(
+        model_path=app.config['YOLO_MODEL_PATH'],
+        save_folder=app.config['REALTIME_FOLDER'],
+        confidence=app.config['ANALYSIS_CONFIG']["realtime"]["confidence"],
+        save_interval=app.config['ANALYSIS_CONFIG']["realtime"]["save_interval"],
+        include_classes=app.config['ANALYSIS_CONFIG']["realtime"]["include_classes"],
+        frame_rate=dynamic_frame_rate,
+        storage_profile=camera_profile(app.config, camera_index)
+    )
+
+def save_frame_to_db(saved):
+    """Record a saved frame (the dict passed to on_frame_saved) and announce it"""
+    try:
+        with app.app_context():
+            camera_id = saved["camera_index"]
+            video_id = get_camera_video_id(camera_id)
+            frame_record = Frame(
+                frame_number=saved["frame_number"],
+                image_path=saved["path"],
+                video_id=video_id,
+                object_count=len(saved["objects"]),
+                timestamp=saved["timestamp"],
+                file_size=saved["file_size"],
+                raw_image=saved.get("raw"),
+                image_scale=saved.get("scale"),
+                thumbnail_path=saved.get("thumbnail_path")
+            )
+            db.session.add(frame_record)
+            db.session.flush()
+            for det in saved["objects"]:
+                xmin, ymin, xmax, ymax = det["box"]
+                obj = DetectedObject(
+                    object_name=det["name"],
+                    object_type=DetectedObject.get_type_code(det["name"]),
+                    probability=det["confidence"],
+                    frame_id=frame_record.id,
+                    x_min=xmin,
+                    y_min=ymin,
+                    x_max=xmax,
+                    y_max=ymax
+                )
+                db.session.add(obj)
+            record_frame_detections(
+                video_id,
+                saved["class_counts"],
+                camera_index=camera_id,
+                timestamp=saved["timestamp"]
+            )
+            frame_id = frame_record.id
+            db.session.commit()
+            storage_manager.record_frame(video_id, saved["file_size"], camera_index=camera_id)
+            image_path = saved["path"].replace('\\', '/')
+            event_bus.publish("frame", {
+                "id": frame_id,
+                "frame_number": saved["frame_number"],
+                # Raw frames get their overlay drawn by the frame-image endpoint
+                "path": f"/api/frame-image/{frame_id}" if saved.get("raw") else f"/{image_path}",
+                "thumbnail": f"/api/frame-image/{frame_id}?size=thumb" if saved.get("thumbnail_path") else None,
+                "timestamp": saved["timestamp"].strftime('%Y-%m-%d %H:%M:%S'),
+                "objects": sorted(saved["class_counts"]),
+                "object_count": len(saved["class_counts"]),
+                "counts": saved["class_counts"],
+                "camera_index": camera_id
+            })
+            app.logger.debug(f"Saved frame {saved['frame_number']} for camera {camera_id} to DB.")
+    except Exception as e:
+        app.logger.exception(f"Error saving frame to database: {str(e)}")
+        with app.app_context():
+            db.session.rollback()
+
+def save_clip_to_db(clip):
+    """Record a finished event clip (the dict passed to on_clip_saved) and announce it"""
+    try:
+        with app.app_context():
+            camera_id = clip["camera_index"]
+            video_id = get_camera_video_id(camera_id)
+            clip_record = Clip(
+                video_id=video_id,
+                camera_index=camera_id,
+                path=clip["path"],
+                start_time=clip["start_time"],
+                end_time=clip["end_time"],
+                classes=",".join(clip["classes"]),
+                frame_count=clip["frame_count"],
+                file_size=clip["file_size"]
+            )
+            db.session.add(clip_record)
+            db.session.commit()
+            storage_manager.record_frame(video_id, clip["file_size"], camera_index=camera_id)
+            event_bus.publish("clip", {
+                "id": clip_record.id,
+                "camera_index": camera_id,
+                "start_time": clip["start_time"].strftime('%Y-%m-%d %H:%M:%S'),
+                "end_time": clip["end_time"].strftime('%Y-%m-%d %H:%M:%S'),
+                "classes": clip["classes"],
+                "url": f"/api/clips/{clip_record.id}/video"
+            })
+    except Exception as e:
+        app.logger.exception(f"Error saving clip to database: {str(e)}")
+        with app.app_context():
+            db.session.rollback()
+
+def _mark_ready(startup, camera_index):
+    if startup is not None and not startup.done:
+        startup.set_ready()
+        app.logger.info(f"Camera {camera_index} is live after {startup.ready_at - startup.started_at:.1f}s.")
+
+def _finish_analyzer(camera_index, startup, instance):
+    """Bookkeeping when a camera's analyzer thread ends, however it ends"""
+    _fail_startup(startup, "Analyzer stopped before producing a frame")
+    if instance is not None:
+        try:
+            instance.stop()  # Safe even if already stopped
+        except Exception as stop_err:
+            app.logger.error(f"Error during final stop for camera {camera_index}: {stop_err}")
+    with analyzer_lock:
+        # After a restart the camera's slots belong to the new thread already
+        current = analyzer_threads.get(camera_index) is threading.current_thread()
+        if current:
+            analyzer_running[camera_index] = False
+            analyzer_instances[camera_index] = None
+    if current:
+        if camera_state(camera_index) not in (None, STOPPED):
+            record_camera_state(camera_index, state_entry(STOPPED, "Analyzer exited"))
+        publish_camera_state(camera_index, "inactive")
+    app.logger.info(f"🧵 Analyzer thread finished for camera {camera_index}.")
+
+def run_analyzer_in_thread(camera_index=0, show_video=False, startup=None, start_delay=0):
     app.logger.info(f"🧵 Analyzer thread started for camera {camera_index}.")
     temp_analyzer_instance = None
     try:
         os.makedirs(app.config['REALTIME_FOLDER'], exist_ok=True)
-        with analyzer_lock:
-            active_camera_count = sum(1 for cam_idx, running in analyzer_running.items() if running)
-        base_frame_rate = app.config['ANALYSIS_CONFIG']["realtime"]["frame_rate"]
-        dynamic_frame_rate = base_frame_rate * max(1.0, min(3.0, active_camera_count / 2))
-        app.logger.info(f"Camera {camera_index} using dynamic frame rate: {dynamic_frame_rate:.3f}s sleep")
-
-        temp_analyzer_instance = RealtimeAnalyzer(
-            model_path=app.config['YOLO_MODEL_PATH'],
-            save_folder=app.config['REALTIME_FOLDER'],
-            confidence=app.config['ANALYSIS_CONFIG']["realtime"]["confidence"],
-            save_interval=app.config['ANALYSIS_CONFIG']["realtime"]["save_interval"],
-            include_classes=app.config['ANALYSIS_CONFIG']["realtime"]["include_classes"],
-            frame_rate=dynamic_frame_rate
-        )
+        temp_analyzer_instance = RealtimeAnalyzer(**analyzer_kwargs(camera_index))
         app.logger.info(f"RealtimeAnalyzer initialized for camera {camera_index}.")
 
-        original_process_frame = temp_analyzer_instance.process_frame
-
-        def process_frame_with_db(frame):
-            results, detections = original_process_frame(frame)
-            if len(detections) > 0:
-                try:
-                    with app.app_context():
-                        current_cam_index = temp_analyzer_instance.camera_index if temp_analyzer_instance else 'unknown'
-                        camera_folder = os.path.join(temp_analyzer_instance.output_folder, f"camera_{current_cam_index}")
-                        if os.path.exists(camera_folder):
-                            files = sorted([f for f in os.listdir(camera_folder) if os.path.isfile(os.path.join(camera_folder, f))], reverse=True)
-                            if files:
-                                latest_file = files[0]
-                                image_path = os.path.join(camera_folder, latest_file)
-                                camera_id = current_cam_index
-                                camera_video = Video.query.filter_by(
-                                    filename=f"camera_{camera_id}_live"
-                                ).first()
-                                if not camera_video:
-                                    camera_video = Video(
-                                        filename=f"camera_{camera_id}_live",
-                                        user_id=None,
-                                        analysis_result=f"Live feed from camera {camera_id}"
-                                    )
-                                    db.session.add(camera_video)
-                                    db.session.commit()
-                                    app.logger.info(f"Created new video record for camera {camera_id}")
-                                frame_num = temp_analyzer_instance.frame_count if temp_analyzer_instance else 0
-                                frame_record = Frame(
-                                    frame_number=frame_num,
-                                    image_path=image_path,
-                                    video_id=camera_video.id,
-                                    object_count=len(detections),
-                                    timestamp=datetime.now()
-                                )
-                                db.session.add(frame_record)
-                                db.session.flush()
-                                for _, det in detections.iterrows():
-                                    obj = DetectedObject(
-                                        object_name=det['name'],
-                                        object_type=DetectedObject.get_type_code(det['name']),
-                                        probability=float(det['confidence']),
-                                        frame_id=frame_record.id,
-                                        x_min=int(det['xmin']),
-                                        y_min=int(det['ymin']),
-                                        x_max=int(det['xmax']),
-                                        y_max=int(det['ymax'])
-                                    )
-                                    db.session.add(obj)
-                                db.session.commit()
-                                app.logger.debug(f"Saved frame {frame_num} for camera {camera_id} to DB.")
-                            else:
-                                app.logger.warning(f"No files found in {camera_folder} after processing frame.")
-                        else:
-                            app.logger.warning(f"Camera folder {camera_folder} not found for saving DB record.")
-                except Exception as e:
-                    app.logger.exception(f"Error saving frame to database: {str(e)}")
-                    with app.app_context():
-                        db.session.rollback()
-            return results, detections
-
-        temp_analyzer_instance.process_frame = process_frame_with_db
-        app.logger.info(f"Overrode process_frame method for DB saving for camera {camera_index}.")
+        # Resolve the camera's Video row once so the per-frame hook never queries for it
+        with app.app_context():
+            get_camera_video_id(camera_index)
+
+        # Runs on an image writer thread once the frame file is durable
+        temp_analyzer_instance.on_frame_saved = save_frame_to_db
+        # Runs on the clip encoder thread once the MP4 is complete
+        temp_analyzer_instance.on_clip_saved = save_clip_to_db
+        temp_analyzer_instance.supervisor.on_change = lambda entry: record_camera_state(camera_index, entry)
+        app.logger.info(f"Registered DB saving for frames of camera {camera_index}.")
+
+        original_publish_frame = temp_analyzer_instance.publish_frame
+
+        def publish_frame_and_signal(frame, annotate=None):
+            published = original_publish_frame(frame, annotate)
+            _mark_ready(startup, camera_index)
+            return published
+
+        temp_analyzer_instance.publish_frame = publish_frame_and_signal
 
         with analyzer_lock:
             analyzer_instances[camera_index] = temp_analyzer_instance
             analyzer_running[camera_index] = True
+        publish_camera_state(camera_index, "active")
 
         app.logger.info(f"Starting analyzer instance loop for camera {camera_index}...")
-        start_successful = temp_analyzer_instance.start(camera_index=camera_index, show_video=show_video)
+        start_successful = temp_analyzer_instance.start(camera_index=camera_index, show_video=show_video,
+                                                        start_delay=start_delay)
 
         if not start_successful:
             app.logger.error(f"Analyzer instance start() method returned False for camera {camera_index}.")
+            _fail_startup(startup, f"Could not open camera {camera_index}")
         else:
             app.logger.info(f"Analyzer instance start() method completed for camera {camera_index}.")
 
     except Exception as e:
         app.logger.exception(f"FATAL ERROR in analyzer thread for camera {camera_index}: {str(e)}")
+        _fail_startup(startup, str(e))
     finally:
+        _finish_analyzer(camera_index, startup, temp_analyzer_instance)
+
+def run_analyzer_in_process(camera_index=0, show_video=False, startup=None, start_delay=0):
+    """Like run_analyzer_in_thread, but the camera loop runs in a worker process.
+
+    This thread only supervises: it relays the worker's saved frames and
+    clips to the same DB hooks and keeps the same bookkeeping, with the
+    CameraWorker handle standing in as the camera's analyzer instance.
+    show_video is ignored, since a worker has no display.
+    """
+    app.logger.info(f"🧵 Camera worker supervisor started for camera {camera_index}.")
+    worker = None
+    try:
+        os.makedirs(app.config['REALTIME_FOLDER'], exist_ok=True)
+        settings = camera_workers.worker_settings(app.config)
+        address = authkey = None
+        if app.config['CAMERA_INFERENCE'] == 'shared':
+            address = camera_workers.inference_service.ensure_started(settings)
+            authkey = camera_workers.inference_service.authkey
+        worker = camera_workers.CameraWorker(camera_index, analyzer_kwargs(camera_index), settings,
+                                             inference_address=address, inference_authkey=authkey,
+                                             start_delay=start_delay)
+        with app.app_context():
+            get_camera_video_id(camera_index)
+        worker.on_frame_saved = save_frame_to_db
+        worker.on_clip_saved = save_clip_to_db
+        worker.on_ready = lambda: _mark_ready(startup, camera_index)
+        worker.on_camera_state = lambda entry: record_camera_state(camera_index, entry)
+
         with analyzer_lock:
-            analyzer_running[camera_index] = False
-            instance = analyzer_instances.get(camera_index)
-            if instance is not None:
-                try:
-                    instance.stop()  # Safe even if already stopped
-                except Exception as stop_err:
-                    app.logger.error(f"Error during final stop for camera {camera_index}: {stop_err}")
-            analyzer_instances[camera_index] = None
-        app.logger.info(f"🧵 Analyzer thread finished for camera {camera_index}.")
+            analyzer_instances[camera_index] = worker
+            analyzer_running[camera_index] = True
+        publish_camera_state(camera_index, "active")
+
+        if not worker.run():
+            app.logger.error(f"Camera worker for camera {camera_index} could not run its camera.")
+            _fail_startup(startup, f"Could not open camera {camera_index}")
+        else:
+            app.logger.info(f"Camera worker for camera {camera_index} exited.")
+    except Exception as e:
+        app.logger.exception(f"FATAL ERROR in camera worker supervisor for camera {camera_index}: {str(e)}")
+        _fail_startup(startup, str(e))
+    finally:
+        _finish_analyzer(camera_index, startup, worker)
 
-def start_analyzer_thread(camera_index=0, show_video=False):
+def _fail_startup(startup, error):
+    if startup is not None:
+        startup.set_failed(error)
+
+def ensure_analyzer_started(camera_index, show_video=False):
+    """Start the camera's analyzer unless it is running or already starting.
+
+    Never blocks. Returns the AnalyzerStartup to wait on, or None if the
+    analyzer could not be started (e.g. analyzers are globally stopped).
+    """
+    if remote is not None:
+        return remote.ensure_analyzer_started(camera_index, show_video)
+    # Held across check and start so concurrent cold requests share one startup
+    with analyzer_lock:
+        thread = analyzer_threads.get(camera_index)
+        startup = analyzer_startups.get(camera_index)
+        # A thread that is still alive but no longer running is stopping; start a fresh one
+        if thread is not None and thread.is_alive() and startup is not None and (
+            not startup.done or (startup.ok and analyzer_running.get(camera_index))
+        ):
+            return startup
+        if not start_analyzer_thread(camera_index=camera_index, show_video=show_video):
+            return None
+        return analyzer_startups.get(camera_index)
+
+def start_analyzer_thread(camera_index=0, show_video=False, start_delay=0):
     global analyzers_globally_stopped
+    if remote is not None:
+        return remote.start_analyzer_thread(camera_index, show_video)
     if analyzers_globally_stopped:
         app.logger.info(f"Global stop is active. Not starting analyzer for camera {camera_index}.")
         return False
@@ -191,44 +436,49 @@ def start_analyzer_thread(camera_index=0, show_video=False):
             app.logger.warning(f"Analyzer thread for camera {camera_index} is already running")
             return False
     app.logger.info(f"Starting real-time analyzer thread for camera {camera_index}...")
+    startup = AnalyzerStartup(camera_index)
+    in_process = app.config.get('CAMERA_WORKER_MODE') == 'process'
     new_thread = threading.Thread(
-        target=run_analyzer_in_thread,
-        args=(camera_index, show_video),
+        target=run_analyzer_in_process if in_process else run_analyzer_in_thread,
+        args=(camera_index, show_video, startup, start_delay),
         daemon=True
     )
     with analyzer_lock:
         analyzer_threads[camera_index] = new_thread
         analyzer_running[camera_index] = False
+        analyzer_startups[camera_index] = startup
+    publish_camera_state(camera_index, "starting")
     new_thread.start()
     return True
 
 def stop_analyzer_thread(camera_index):
+    """Signal the camera's analyzer to stop and return at once.
+
+    The analyzer releases the camera and its thread finishes the bookkeeping
+    ("inactive" is published then), so a restart can start the new analyzer
+    straight away: it backs off until the device is free.
+    """
+    if remote is not None:
+        return remote.stop_analyzer_thread(camera_index)
     with analyzer_lock:
-        thread = analyzer_threads.get(camera_index)
         running = analyzer_running.get(camera_index, False)
-        if running:
-            app.logger.info(f"Stopping analyzer thread for camera {camera_index}")
-            analyzer_running[camera_index] = False
-        else:
-            app.logger.info(f"No running analyzer thread for camera {camera_index} to stop")
-            thread = None
-    # Wait for the thread to finish outside the lock
-    if thread is not None and thread.is_alive():
-        app.logger.info(f"Waiting for analyzer thread for camera {camera_index} to exit...")
-        thread.join(timeout=10)
-        app.logger.info(f"Analyzer thread for camera {camera_index} has exited.")
-    # Explicitly release the camera resource if instance exists
-    with analyzer_lock:
         instance = analyzer_instances.get(camera_index)
-        if instance is not None:
-            try:
-                instance.stop()
-                app.logger.info(f"Explicitly called stop() on analyzer instance for camera {camera_index}")
-            except Exception as e:
-                app.logger.error(f"Error calling stop() on analyzer instance for camera {camera_index}: {e}")
-        analyzer_instances[camera_index] = None
+        if not running:
+            app.logger.info(f"No running analyzer thread for camera {camera_index} to stop")
+            return
+        app.logger.info(f"Stopping analyzer thread for camera {camera_index}")
+        analyzer_running[camera_index] = False
+    publish_camera_state(camera_index, "stopping")
+    if instance is not None:
+        try:
+            instance.stop()
+        except Exception as e:
+            app.logger.error(f"Error calling stop() on analyzer instance for camera {camera_index}: {e}")
+
 def stop_all_analyzers():
     global analyzers_globally_stopped
+    if remote is not None:
+        return remote.stop_all_analyzers()
     analyzers_globally_stopped = True
     stopped = 0
     with analyzer_lock:
@@ -240,9 +490,13 @@ def stop_all_analyzers():
 
 def allow_analyzers_start():
     global analyzers_globally_stopped
+    if remote is not None:
+        return remote.allow_analyzers_start()
     analyzers_globally_stopped = False
 
 def check_inactive_cameras():
+    if remote is not None:
+        return remote.check_inactive_cameras()
     app.logger.debug("Checking for inactive cameras")
     current_time = time.time()
     cameras_to_stop = []
@@ -2,12 +2,24 @@ import os
 import logging
 import threading
 import time
+import click
 from flask import Flask
 from flask_login import LoginManager
-from db_models import db, User, configure_db, init_db, Video, Frame, DetectedObject
+from db_models import db, User, configure_db, init_db, default_database_uri, Video, Frame, DetectedObject, Clip
+from db_copy import copy_database
+from frame_shards import migrate_flat_frames
 from analyzer import RealtimeAnalyzer
-from datetime import datetime
-import datetime as dt
+from camera_registry import forget_camera
+from rollups import rebuild_rollups
+from retention import retention_engine
+from storage import storage_manager
+from thumbnails import thumbnail_service
+from events import event_bus
+from image_writer import image_writer
+from overlays import overlay_renderer
+from analysis_cache import analysis_cache
+from uploads import upload_manager
+from analyzer_daemon import AnalyzerDaemon, attach as attach_analyzer_daemon, detach as detach_analyzer_daemon
 
 from config import Config
 
@@ -23,6 +35,14 @@ if not app.logger.handlers:
     app.logger.addHandler(handler)
 
 configure_db(app)
+retention_engine.init_app(app)
+storage_manager.init_app(app)
+thumbnail_service.init_app(app)
+event_bus.init_app(app)
+image_writer.init_app(app)
+overlay_renderer.init_app(app)
+analysis_cache.init_app(app)
+upload_manager.init_app(app)
 
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -40,11 +60,16 @@ set_app_context(
         'db': db,
         'Video': Video,
         'Frame': Frame,
-        'DetectedObject': DetectedObject
+        'DetectedObject': DetectedObject,
+        'Clip': Clip
     },
     RealtimeAnalyzer
 )
 
+# In daemon mode this process only serves the web app; cameras run in `flask analyzer-daemon`
+if app.config['ANALYZER_MODE'] == 'daemon':
+    attach_analyzer_daemon(app)
+
 def start_background_tasks():
     def run_maintenance():
         while True:
@@ -55,157 +80,68 @@ def start_background_tasks():
             except Exception as e:
                 app.logger.error(f"Error in maintenance task: {e}")
 
-    # Start the old activity frame deletion task
-    def delete_old_files():
-        while True:
-            try:
-                time.sleep(86400)  # Run every 24 hours
-                with app.app_context():
-                    now = datetime.now()
-                    retention_days = app.config["FILE_RETENTION_DAYS"]
-                    app.logger.info(f"Running delete_old_files task. Retention: {retention_days} days.")
-                    
-                    # Calculate the cutoff date
-                    cutoff_date = now - dt.timedelta(days=retention_days)
-                    
-                    # Track folders that might need cleanup after file deletion
-                    folders_to_check = set()
-                    
-                    # APPROACH 1: Start with database Frame records and delete from there
-                    # Find frames older than retention period
-                    old_frames = Frame.query.filter(Frame.timestamp < cutoff_date).all()
-                    frame_count = len(old_frames)
-                    
-                    if frame_count > 0:
-                        app.logger.info(f"Found {frame_count} old frames in database to delete")
-                        
-                        for frame in old_frames:
-                            try:
-                                # Get the image path
-                                image_path = frame.image_path
-                                
-                                # Delete the physical file if it exists and is valid
-                                if image_path and os.path.exists(image_path) and os.path.isfile(image_path):
-                                    try:
-                                        # Add parent directory to cleanup list
-                                        parent_dir = os.path.dirname(image_path)
-                                        folders_to_check.add(parent_dir)
-                                        
-                                        os.remove(image_path)
-                                        app.logger.info(f"Deleted file from disk: {image_path}")
-                                    except OSError as e_file:
-                                        app.logger.error(f"Failed to delete file {image_path}: {e_file}")
-                                
-                                # Delete the database record (will cascade to DetectedObject)
-                                db.session.delete(frame)
-                                app.logger.info(f"Deleted frame record ID {frame.id} from database")
-                            except Exception as e_frame:
-                                app.logger.error(f"Error processing frame ID {frame.id}: {e_frame}")
-                                # Continue with other frames even if one fails
-                        
-                        # Commit all database changes
-                        try:
-                            db.session.commit()
-                            app.logger.info(f"Successfully deleted {frame_count} old frames from database")
-                        except Exception as e_commit:
-                            app.logger.error(f"Error committing database changes: {e_commit}")
-                            db.session.rollback()
-                    else:
-                        app.logger.info("No old frames found in database")
-                    
-                    # APPROACH 2: Find orphaned files not in the database
-                    # Handle videos folder
-                    videos_folder = app.config['VIDEOS_FOLDER']
-                    output_folder = app.config['OUTPUT_FOLDER']
-                    
-                    # Function to check for old files by modification time
-                    def delete_old_files_by_mtime(folder_path, log_prefix=""):
-                        if not os.path.exists(folder_path):
-                            app.logger.warning(f"{log_prefix} Folder {folder_path} does not exist")
-                            return
-                            
-                        for root, dirs, files in os.walk(folder_path):
-                            for filename in files:
-                                file_path = os.path.join(root, filename)
-                                try:
-                                    # Check if this file exists in the database
-                                    frame_exists = Frame.query.filter_by(image_path=file_path).first()
-                                    if frame_exists:
-                                        # Skip files that are tracked in the database
-                                        continue
-                                        
-                                    # Check file age
-                                    file_time = datetime.fromtimestamp(os.path.getmtime(file_path))
-                                    if (now - file_time).days > retention_days:
-                                        # Add parent directory to cleanup list
-                                        folders_to_check.add(os.path.dirname(file_path))
-                                        
-                                        os.remove(file_path)
-                                        app.logger.info(f"{log_prefix} Deleted orphaned file: {file_path}")
-                                except Exception as e:
-                                    app.logger.error(f"{log_prefix} Error checking file {file_path}: {e}")
-                    
-                    # Delete orphaned files in videos folder
-                    delete_old_files_by_mtime(videos_folder, "VIDEOS:")
-                    
-                    # Delete orphaned files in output folder
-                    delete_old_files_by_mtime(output_folder, "OUTPUT:")
-                    
-                    # Clean up empty folders (starting from deepest paths first)
-                    if folders_to_check:
-                        app.logger.info(f"Checking {len(folders_to_check)} folders for cleanup")
-                        
-                        # Sort folders by depth (deepest first) to ensure child folders are processed before parents
-                        sorted_folders = sorted(folders_to_check, key=lambda x: x.count(os.sep), reverse=True)
-                        
-                        # Function to recursively check and remove empty directories
-                        def remove_if_empty(folder_path, base_folder):
-                            # Don't delete the base output or videos folders
-                            if folder_path == base_folder:
-                                return
-                                
-                            try:
-                                if os.path.exists(folder_path) and os.path.isdir(folder_path):
-                                    # Check if directory is empty (no files and no subdirectories)
-                                    if not os.listdir(folder_path):
-                                        parent_dir = os.path.dirname(folder_path)
-                                        os.rmdir(folder_path)
-                                        app.logger.info(f"Removed empty folder: {folder_path}")
-                                        
-                                        # Recursively check parent (if it's not the output root folder)
-                                        if parent_dir not in [videos_folder, output_folder]:
-                                            remove_if_empty(parent_dir, base_folder)
-                            except Exception as e:
-                                app.logger.error(f"Error removing empty folder {folder_path}: {e}")
-                        
-                        # Process each folder
-                        for folder in sorted_folders:
-                            # Determine which base folder this belongs to
-                            if folder.startswith(videos_folder):
-                                base = videos_folder
-                            elif folder.startswith(output_folder):
-                                base = output_folder
-                            else:
-                                # Unknown folder, skip it
-                                continue
-                                
-                            remove_if_empty(folder, base)
-                    
-            except Exception as e:
-                app.logger.error(f"Error in delete_old_files task: {e}")
-                with app.app_context():
-                    db.session.rollback()
-
     # Start the maintenance thread
     maintenance_thread = threading.Thread(target=run_maintenance, daemon=True)
     maintenance_thread.start()
     
-    # Start the file deletion thread
-    delete_files_thread = threading.Thread(target=delete_old_files, daemon=True)
-    delete_files_thread.start()
+    # Start the retention scheduler (chunked deletes of expired frames and orphaned files)
+    retention_engine.start()
+    
+    # Start quota-based eviction (wakes as soon as a camera or the global budget is exceeded)
+    storage_manager.start()
 
     app.logger.info("Started background maintenance and file deletion tasks")
 
+@app.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """Recompute the detection rollup tables from raw frame data."""
+    init_db(app)
+    video_rows, bucket_rows = rebuild_rollups()
+    click.echo(f"Rebuilt {video_rows} video/class rows and {bucket_rows} camera buckets")
+
+@app.cli.command('run-retention')
+def run_retention_command():
+    """Run one retention pass immediately and print the reclaimed totals."""
+    init_db(app)
+    metrics = retention_engine.run_once()
+    click.echo(f"Deleted {metrics['rows_deleted']} frame rows and {metrics['files_deleted'] + metrics['orphans_deleted']} files, "
+               f"reclaimed {metrics['bytes_reclaimed']} bytes")
+
+@app.cli.command('copy-db')
+@click.option('--source', default=None, help='Source database URI (defaults to the bundled SQLite file).')
+@click.option('--batch-size', default=5000, show_default=True, help='Rows copied per transaction.')
+@click.option('--truncate', is_flag=True, help='Empty the target tables before copying.')
+def copy_db_command(source, batch_size, truncate):
+    """Copy all history into the database configured by DATABASE_URL."""
+    source = source or default_database_uri()
+    if source == app.config['SQLALCHEMY_DATABASE_URI']:
+        raise click.UsageError("Source and target are the same database; set DATABASE_URL to the target.")
+    copied = copy_database(source, db.engine, batch_size=batch_size, truncate=truncate, log=click.echo)
+    if truncate:
+        forget_camera()  # camera Video rows were replaced, possibly under new ids
+    click.echo(f"Copied {sum(copied.values())} rows across {len(copied)} tables")
+    if 'video_object_count' not in copied or 'camera_object_bucket' not in copied:
+        click.echo("Run 'flask --app app rebuild-rollups' to populate the detection rollups.")
+
+@app.cli.command('shard-frames')
+@click.option('--batch-size', default=1000, show_default=True, help='Files moved per transaction.')
+@click.option('--dry-run', is_flag=True, help='Only report how many files would move.')
+def shard_frames_command(batch_size, dry_run):
+    """Move camera frames from flat camera_N folders into camera_N/YYYY/MM/DD/HH shards."""
+    init_db(app)
+    moved = migrate_flat_frames(app.config['REALTIME_FOLDER'], batch_size=batch_size, dry_run=dry_run, log=click.echo)
+    click.echo(f"{'Would move' if dry_run else 'Moved'} {moved} frame files")
+
+@app.cli.command('analyzer-daemon')
+def analyzer_daemon_command():
+    """Own the cameras, model and background tasks for ANALYZER_MODE=daemon web workers."""
+    detach_analyzer_daemon()
+    init_db(app)
+    start_background_tasks()
+    # Serve right away; cameras come up in the background and web workers see them via status sync
+    threading.Thread(target=start_all_camera_analyzers, daemon=True).start()
+    AnalyzerDaemon(app, app.config['ANALYZER_DAEMON_ADDRESS'], app.config['ANALYZER_DAEMON_AUTHKEY']).serve_forever()
+
 @login_manager.user_loader
 def load_user(user_id):
     return db.session.get(User, int(user_id))
@@ -216,9 +152,12 @@ app.register_blueprint(main_bp)
 if __name__ == '__main__':
     init_db(app)
     app.logger.info("Database Initialized.")
-    start_background_tasks()
-    app.logger.info("Starting analyzers for available cameras...")
-    started, cameras = start_all_camera_analyzers()
-    app.logger.info(f"Started {started} camera analyzers for cameras: {cameras}")
+    if app.config['ANALYZER_MODE'] == 'daemon':
+        app.logger.info(f"Using the analyzer daemon at {app.config['ANALYZER_DAEMON_ADDRESS']}")
+    else:
+        start_background_tasks()
+        app.logger.info("Starting analyzers for available cameras...")
+        started, cameras = start_all_camera_analyzers()
+        app.logger.info(f"Started {started} camera analyzers for cameras: {cameras}")
     app.logger.info("Starting Flask development server...")
     app.run(debug=True, use_reloader=False, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,134 @@
+"""Benchmark frame buffers in the realtime capture/annotation loop.
+
+Feeds synthetic frames through RealtimeAnalyzer's publish/process path
+with a stand-in detector (no model is loaded), once per pipeline:
+
+* copy:    the old loop, reproduced here: a frame.copy() per published
+           frame plus a copy per annotated or info frame
+* ring:    publish_frame()/process_frame() writing into the frame ring,
+           with a reader polling the frames as a live stream would
+* ring-idle: the same without any reader, so overlays are skipped
+
+Each pipeline runs in its own process so peak RSS is not shared. Run from
+the repository root:
+
+    python benchmarks/bench_annotation.py --frames 600 --width 1920 --height 1080
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+import pandas as pd
+
+from analyzer import RealtimeAnalyzer, peak_rss_mb
+
+PIPELINES = ("copy", "ring", "ring-idle")
+
+class BenchAnalyzer(RealtimeAnalyzer):
+    """RealtimeAnalyzer with a fixed fake detection on every other processed frame"""
+
+    def _load_model(self, from_local=True):
+        self.model = object()
+        return True
+
+    def detect_objects(self, frame):
+        self.calls = getattr(self, "calls", 0) + 1
+        if self.calls % 2:
+            return object(), pd.DataFrame(columns=["name", "confidence", "xmin", "ymin", "xmax", "ymax"])
+        h, w = frame.shape[:2]
+        return object(), pd.DataFrame([
+            {"name": "person", "confidence": 0.9, "xmin": w // 4, "ymin": h // 4, "xmax": w // 2, "ymax": h - 40},
+            {"name": "car", "confidence": 0.7, "xmin": w // 2, "ymin": h // 2, "xmax": w - 40, "ymax": h - 60},
+        ])
+
+def run_copy(analyzer, frames, count):
+    """Pre-ring loop: returns the number of full-frame buffers allocated"""
+    allocs = 0
+    for n in range(1, count + 1):
+        frame = frames[n % len(frames)]
+        analyzer.current_frame = frame.copy()
+        allocs += 1
+        if n % analyzer.save_interval == 0:
+            _, detections = analyzer.detect_objects(frame)
+            if len(detections) == 0:
+                info_frame = frame.copy()
+                cv2.putText(info_frame, "No objects detected", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+                analyzer.current_frame = info_frame
+            else:
+                annotated_frame, _ = analyzer.process_detections(frame, detections)
+                cv2.imwrite(os.path.join(analyzer.output_folder, "frame.jpg"), annotated_frame)
+                analyzer.current_frame = annotated_frame
+            allocs += 1
+    return allocs
+
+def run_ring(analyzer, frames, count, reader):
+    for n in range(1, count + 1):
+        frame = frames[n % len(frames)]
+        analyzer.publish_frame(frame)
+        if n % analyzer.save_interval == 0:
+            analyzer.process_frame(frame)
+        if reader:
+            analyzer.get_frame_info()
+    return analyzer.frame_allocs
+
+def run_one(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        analyzer = BenchAnalyzer(save_folder=tmp, save_interval=args.save_interval, frame_rate=0)
+        analyzer.output_folder = tmp
+        analyzer.clip_recorder = None  # event clips are not part of this comparison
+        rng = np.random.default_rng(42)
+        frames = [rng.integers(0, 255, (args.height, args.width, 3), dtype=np.uint8) for _ in range(4)]
+        tracemalloc.start()
+        started = time.perf_counter()
+        if args.run == "copy":
+            allocs = run_copy(analyzer, frames, args.frames)
+        else:
+            allocs = run_ring(analyzer, frames, args.frames, reader=args.run == "ring")
+        elapsed = time.perf_counter() - started
+        _, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        analyzer.stop()
+        print(json.dumps({
+            "fps": args.frames / elapsed,
+            "allocs_per_second": allocs / elapsed,
+            "traced_peak_mb": traced_peak / (1024 * 1024),
+            "peak_rss_mb": peak_rss_mb(),
+            "skipped": analyzer.annotations_skipped,
+        }))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--save-interval", type=int, default=5, help="process every Nth frame")
+    parser.add_argument("--run", choices=PIPELINES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run:
+        run_one(args)
+        return
+
+    print(f"{args.frames} frames at {args.width}x{args.height}, processing every {args.save_interval}th")
+    for pipeline in PIPELINES:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--run", pipeline, "--frames", str(args.frames),
+             "--width", str(args.width), "--height", str(args.height),
+             "--save-interval", str(args.save_interval)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{pipeline:<10} {result['fps']:8.1f} frames/s  {result['allocs_per_second']:8.1f} frame allocs/s  "
+              f"traced peak {result['traced_peak_mb']:7.1f} MB  peak RSS {result['peak_rss_mb']:7.1f} MB  "
+              f"overlays skipped {result['skipped']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""Benchmark camera worker modes with synthetic cameras.
+
+Runs N simulated cameras for a fixed time in each mode and reports the
+aggregate frame rate and the CPU cores the run kept busy:
+
+* thread:              every camera loop in one process (CAMERA_WORKER_MODE=thread)
+* process-shared:      a worker process per camera, detection batched in one
+                       inference process (CAMERA_INFERENCE=shared)
+* process-replicated:  a worker process per camera, each with its own model
+
+The cameras return a fixed frame and every frame is sent to detection.
+The stand-in model sleeps --inference-ms per call (a GPU, or torch with
+the GIL released) and then spends --postprocess-ms per image in Python
+holding the GIL, like result conversion and NMS bookkeeping. One image in
+ten gets a detection, so the save path runs too. Each mode and camera count
+runs in its own process. Run from the repository root:
+
+    python benchmarks/bench_camera_workers.py --cameras 1 4 8 --seconds 10
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+from flask import Flask
+
+from camera_workers import DETECTION_COLUMNS, CameraWorker, WorkerAnalyzer, inference_service, worker_settings
+from config import Config
+from image_writer import image_writer
+
+MODES = ("thread", "process-shared", "process-replicated")
+
+class FakeResults:
+    def __init__(self, frames):
+        self.frames = frames
+
+    def pandas(self):
+        return self
+
+    @property
+    def xyxy(self):
+        return [pd.DataFrame(rows, columns=DETECTION_COLUMNS) for rows in self.frames]
+
+class FakeModel:
+    """Sleeps for the inference, then burns postprocess_ms per image in Python"""
+
+    def __init__(self, inference_ms, postprocess_ms):
+        self.inference = inference_ms / 1000
+        self.postprocess = postprocess_ms / 1000
+        self.calls = 0
+
+    def __call__(self, images):
+        batch = images if isinstance(images, list) else [images]
+        time.sleep(self.inference)
+        frames = []
+        for image in batch:
+            end = time.perf_counter() + self.postprocess
+            while time.perf_counter() < end:
+                pass
+            self.calls += 1
+            h, w = image.shape[:2]
+            frames.append([] if self.calls % 10 else [
+                {"name": "person", "confidence": 0.9, "xmin": w // 4, "ymin": h // 4, "xmax": w // 2, "ymax": h - 40}
+            ])
+        return FakeResults(frames)
+
+class SyntheticCapture:
+    """cv2.VideoCapture stand-in returning copies of one random frame"""
+
+    def __init__(self, width, height):
+        self.frame = np.random.default_rng(42).integers(0, 255, (height, width, 3), dtype=np.uint8)
+
+    def isOpened(self):
+        return True
+
+    def read(self):
+        return True, self.frame.copy()
+
+    def release(self):
+        pass
+
+def load_fake_model(settings):
+    return FakeModel(settings['BENCH_INFERENCE_MS'], settings['BENCH_POSTPROCESS_MS'])
+
+class BenchAnalyzer(WorkerAnalyzer):
+    """Worker analyzer on a synthetic camera; without an inference client it runs its own fake model"""
+
+    def __init__(self, width=640, height=480, inference_ms=20.0, postprocess_ms=5.0, **kwargs):
+        self.bench = (width, height, inference_ms, postprocess_ms)
+        super().__init__(**kwargs)
+
+    def _load_model(self, from_local=True):
+        if self.inference is None:
+            self.model = FakeModel(*self.bench[2:])
+        return True
+
+    def select_camera(self, camera_index=None):
+        self.camera_index = camera_index
+        self.cap = SyntheticCapture(*self.bench[:2])
+        return True
+
+def bench_settings(args, folder):
+    settings = worker_settings(vars(Config))
+    settings.update(
+        OUTPUT_FOLDER=folder,
+        REALTIME_FOLDER=folder,
+        CLIP_RECORDING=False,  # clip encoding is not part of this comparison
+        INFERENCE_BATCH_SIZE=args.batch_size,
+        BENCH_INFERENCE_MS=args.inference_ms,
+        BENCH_POSTPROCESS_MS=args.postprocess_ms,
+    )
+    return settings
+
+def analyzer_kwargs(args, folder):
+    return dict(width=args.width, height=args.height, inference_ms=args.inference_ms,
+                postprocess_ms=args.postprocess_ms, save_folder=folder, save_interval=1, frame_rate=0)
+
+def run_threads(args, settings, folder):
+    app = Flask("bench")
+    app.config.update(settings)
+    image_writer.init_app(app)
+    with app.app_context():
+        analyzers = [BenchAnalyzer(**analyzer_kwargs(args, folder)) for _ in range(args.run_cameras)]
+    threads = [threading.Thread(target=analyzer.start, args=(index, False))
+               for index, analyzer in enumerate(analyzers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    frames = sum(analyzer.frame_count for analyzer in analyzers)
+    elapsed = time.perf_counter() - started
+    for analyzer in analyzers:
+        analyzer.stop()
+    for thread in threads:
+        thread.join()
+    image_writer.flush()
+    return frames, elapsed
+
+def run_processes(args, settings, folder):
+    address = authkey = None
+    if args.run == "process-shared":
+        address = inference_service.ensure_started(settings, model_loader=load_fake_model)
+        authkey = inference_service.authkey
+    workers = [CameraWorker(index, analyzer_kwargs(args, folder), settings, inference_address=address,
+                            inference_authkey=authkey, analyzer_class=BenchAnalyzer)
+               for index in range(args.run_cameras)]
+    threads = [threading.Thread(target=worker.run) for worker in workers]
+    for thread in threads:
+        thread.start()
+    # Time from when every worker is producing frames, so process startup is not counted
+    while any(worker.frame_count == 0 and thread.is_alive() for worker, thread in zip(workers, threads)):
+        time.sleep(0.05)
+    baseline = [worker.frame_count for worker in workers]
+    started = time.perf_counter()
+    time.sleep(args.seconds)
+    frames = sum(worker.frame_count - base for worker, base in zip(workers, baseline))
+    elapsed = time.perf_counter() - started
+    for worker in workers:
+        worker.stop()
+    for thread in threads:
+        thread.join()
+    inference_service.stop()
+    return frames, elapsed
+
+def cpu_seconds():
+    return sum(usage.ru_utime + usage.ru_stime for usage in (
+        resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)))
+
+def run_one(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        settings = bench_settings(args, tmp)
+        cpu_before, wall_before = cpu_seconds(), time.perf_counter()
+        if args.run == "thread":
+            frames, elapsed = run_threads(args, settings, tmp)
+        else:
+            frames, elapsed = run_processes(args, settings, tmp)
+        cores = (cpu_seconds() - cpu_before) / (time.perf_counter() - wall_before)
+        print(json.dumps({"fps": frames / elapsed, "frames": frames, "cores": cores}))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cameras", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--modes", choices=MODES, nargs="+", default=list(MODES))
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--inference-ms", type=float, default=20.0)
+    parser.add_argument("--postprocess-ms", type=float, default=5.0)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--run", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--run-cameras", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run:
+        run_one(args)
+        return
+
+    print(f"{args.seconds:.0f}s per run at {args.width}x{args.height}, inference {args.inference_ms:.0f}ms "
+          f"+ {args.postprocess_ms:.0f}ms Python postprocessing per frame, {os.cpu_count()} CPUs")
+    for cameras in args.cameras:
+        for mode in args.modes:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--run", mode, "--run-cameras", str(cameras),
+                 "--seconds", str(args.seconds), "--width", str(args.width), "--height", str(args.height),
+                 "--inference-ms", str(args.inference_ms), "--postprocess-ms", str(args.postprocess_ms),
+                 "--batch-size", str(args.batch_size)],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{cameras} cameras  {mode:<19} {result['fps']:8.1f} frames/s  "
+                  f"{result['fps'] / cameras:6.1f} per camera  {result['cores']:5.2f} CPU cores")
+
+if __name__ == "__main__":
+    main()
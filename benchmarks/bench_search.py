@@ -0,0 +1,129 @@
+"""Benchmark /api/search queries against a seeded SQLite database.
+
+Seeds a throwaway database with months of synthetic camera frames and
+detections, then times search_detections() for a few typical filters,
+including deep cursor pagination. Run from the repository root:
+
+    python benchmarks/bench_search.py --frames 500000 --cameras 4 --days 90
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import text
+
+from config import Config
+from db_models import db, Video, Frame, DetectedObject, init_db
+from search import search_detections
+
+CLASSES = ["person", "car", "truck", "motorcycle", "bicycle", "bus"]
+WEIGHTS = [0.45, 0.3, 0.08, 0.07, 0.06, 0.04]
+
+def seed(frames, cameras, days, batch_size=20000):
+    random.seed(42)
+    video_ids = []
+    for idx in range(cameras):
+        video = Video(filename=f"camera_{idx}_live", user_id=None)
+        db.session.add(video)
+        db.session.flush()
+        video_ids.append(video.id)
+    db.session.commit()
+
+    start = datetime.now() - timedelta(days=days)
+    step = timedelta(days=days) / frames
+    frame_table = Frame.__table__
+    object_table = DetectedObject.__table__
+    frame_id = 0
+    for offset in range(0, frames, batch_size):
+        frame_rows, object_rows = [], []
+        for i in range(offset, min(offset + batch_size, frames)):
+            frame_id += 1
+            count = random.choices([1, 2, 3, 4, 6], [0.4, 0.3, 0.15, 0.1, 0.05])[0]
+            frame_rows.append({
+                "id": frame_id,
+                "frame_number": i,
+                "timestamp": start + step * i,
+                "image_path": f"static/output/realtime_activity/bench/frame_{i}.jpg",
+                "video_id": random.choice(video_ids),
+                "object_count": count,
+                "file_size": 60000,
+            })
+            for name in random.choices(CLASSES, WEIGHTS, k=count):
+                object_rows.append({
+                    "object_name": name,
+                    "object_type": 0,
+                    "probability": round(random.uniform(0.3, 0.99), 3),
+                    "frame_id": frame_id,
+                })
+        db.session.execute(frame_table.insert(), frame_rows)
+        db.session.execute(object_table.insert(), object_rows)
+        db.session.commit()
+    db.session.execute(text("ANALYZE"))
+    db.session.commit()
+
+def timed(label, repeat=5, **filters):
+    durations = []
+    results = next_cursor = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        results, next_cursor = search_detections(**filters)
+        durations.append((time.perf_counter() - started) * 1000)
+    durations.sort()
+    print(f"{label:<48} median {durations[len(durations) // 2]:8.2f} ms  "
+          f"best {durations[0]:8.2f} ms  rows {len(results)}")
+    return results, next_cursor
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=200000)
+    parser.add_argument("--cameras", type=int, default=4)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--pages", type=int, default=20, help="pages to walk in the pagination test")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        app.config.from_object(Config)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+        db.init_app(app)
+        init_db(app)
+        with app.app_context():
+            started = time.perf_counter()
+            seed(args.frames, args.cameras, args.days)
+            print(f"Seeded {args.frames} frames on {args.cameras} cameras over {args.days} days "
+                  f"in {time.perf_counter() - started:.1f}s")
+
+            now = datetime.now()
+            night_start = (now - timedelta(days=1)).replace(hour=2, minute=0, second=0, microsecond=0)
+            timed("person, cameras 0-2, 02:00-04:00 yesterday",
+                  classes=["person"], cameras=[0, 1, 2],
+                  start=night_start, end=night_start + timedelta(hours=2))
+            timed("person, all cameras, newest page",
+                  classes=["person"])
+            timed("truck conf>=0.9, all cameras, last 30 days",
+                  classes=["truck"], min_confidence=0.9, start=now - timedelta(days=30))
+            timed(">=3 persons in one frame, camera 0",
+                  classes=["person"], cameras=[0], min_count=3)
+            timed("bus conf>=0.95 >=2, all time (sparse)",
+                  classes=["bus"], min_confidence=0.95, min_count=2)
+
+            cursor = None
+            durations = []
+            for _ in range(args.pages):
+                started = time.perf_counter()
+                results, cursor = search_detections(classes=["car"], cameras=[1], limit=100, cursor=cursor)
+                durations.append((time.perf_counter() - started) * 1000)
+                if not cursor:
+                    break
+            print(f"{'car, camera 1, cursor pages of 100':<48} first {durations[0]:8.2f} ms  "
+                  f"last {durations[-1]:8.2f} ms  pages {len(durations)}")
+
+if __name__ == "__main__":
+    main()
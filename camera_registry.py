@@ -0,0 +1,46 @@
+import threading
+
+from db_models import db, Video
+
+# Process-wide cache of camera index -> id of its "camera_N_live" Video row
+_camera_video_ids = {}
+_registry_lock = threading.Lock()
+
+def camera_video_name(camera_index):
+    """Filename of the Video row that collects a camera's live frames"""
+    return f"camera_{camera_index}_live"
+
+def get_camera_video_id(camera_index):
+    """Return the Video id for a camera, creating the row on first use.
+
+    Only the first call per camera touches the database; later calls are a
+    dict lookup. Must be called inside an app context.
+    """
+    with _registry_lock:
+        video_id = _camera_video_ids.get(camera_index)
+    if video_id is not None:
+        return video_id
+    camera_video = Video.query.filter_by(filename=camera_video_name(camera_index)).first()
+    if not camera_video:
+        camera_video = Video(
+            filename=camera_video_name(camera_index),
+            user_id=None,
+            analysis_result=f"Live feed from camera {camera_index}"
+        )
+        db.session.add(camera_video)
+        db.session.commit()
+    with _registry_lock:
+        _camera_video_ids[camera_index] = camera_video.id
+    return camera_video.id
+
+def forget_camera(camera_index=None):
+    """Drop a cached camera entry (or all entries when camera_index is None).
+
+    Call this whenever camera Video rows may be deleted or recreated, so the
+    cache never hands out an id that no longer exists.
+    """
+    with _registry_lock:
+        if camera_index is None:
+            _camera_video_ids.clear()
+        else:
+            _camera_video_ids.pop(camera_index, None)
@@ -0,0 +1,92 @@
+"""Connection state machine for one camera.
+
+The capture loop reports what happens to the camera and asks the
+supervisor how long to wait; every wait is on the supervisor's stop event,
+so stop() wakes a camera that is backing off or between frames at once.
+
+    connecting -> live                  camera opened and a test frame read
+    live       -> degraded -> live      reads failing, then recovering
+    degraded   -> connecting            too many failed reads, camera released
+    connecting -> backoff -> connecting open failed, retried after a jittered
+                                        exponential delay
+    any        -> stopped
+"""
+import random
+import threading
+import time
+
+CONNECTING = "connecting"
+LIVE = "live"
+DEGRADED = "degraded"
+BACKOFF = "backoff"
+STOPPED = "stopped"
+STATES = (CONNECTING, LIVE, DEGRADED, BACKOFF, STOPPED)
+
+def state_entry(state, reason=None, failures=0, retry_in=None):
+    """One state history entry, as stored by analyzer_state and returned by the API"""
+    entry = {"state": state, "reason": reason, "time": time.strftime('%Y-%m-%d %H:%M:%S'), "failures": failures}
+    if retry_in is not None:
+        entry["retry_in"] = round(retry_in, 2)
+    return entry
+
+class CameraSupervisor:
+    """Tracks a camera's connection state and paces reconnects.
+
+    Each failed connection doubles the backoff ceiling from backoff_base up
+    to backoff_max; the actual delay is drawn between half the ceiling and
+    the ceiling, so cameras that fail together do not retry in lockstep.
+    on_change, if set, is called with a state_entry() on every transition.
+    """
+
+    def __init__(self, camera_index=0, backoff_base=0.5, backoff_max=30.0):
+        self.camera_index = camera_index
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.state = STOPPED
+        self.reason = None
+        self.since = time.time()
+        self.failures = 0  # consecutive failed connections
+        self.ever_live = False
+        self.on_change = None
+        self._stop_event = threading.Event()
+
+    @property
+    def stopping(self):
+        return self._stop_event.is_set()
+
+    def reset(self):
+        """Ready for a new run of the capture loop"""
+        self._stop_event.clear()
+        self.failures = 0
+        self.ever_live = False
+
+    def transition(self, state, reason=None, retry_in=None):
+        """Enter state; repeating the current state with the same reason is not recorded again"""
+        if state == self.state and reason == self.reason and retry_in is None:
+            return
+        self.state, self.reason, self.since = state, reason, time.time()
+        if self.on_change is not None:
+            self.on_change(state_entry(state, reason, self.failures, retry_in))
+
+    def connected(self):
+        self.failures = 0
+        self.ever_live = True
+        self.transition(LIVE)
+
+    def next_delay(self):
+        ceiling = min(self.backoff_max, self.backoff_base * 2 ** max(self.failures - 1, 0))
+        return random.uniform(ceiling / 2, ceiling)
+
+    def backoff(self, reason):
+        """Count a failed connection and wait out the backoff delay; False if stopped meanwhile"""
+        self.failures += 1
+        delay = self.next_delay()
+        self.transition(BACKOFF, reason, retry_in=delay)
+        return not self.wait(delay)
+
+    def wait(self, seconds):
+        """Sleep up to seconds, waking early on stop(); True if stopped"""
+        return self._stop_event.wait(seconds)
+
+    def stop(self):
+        self._stop_event.set()
@@ -0,0 +1,548 @@
+"""Camera worker processes for CAMERA_WORKER_MODE=process.
+
+In thread mode every camera loop runs in the server process, where their
+Python-level work (pandas conversion, annotation, logging) takes turns on
+one GIL. Process mode runs each camera's RealtimeAnalyzer loop in its own
+worker process instead:
+
+* CameraWorker is the server-side handle. It spawns the worker and stands
+  in for its analyzer in analyzer_state.analyzer_instances, so views and
+  streaming keep working unchanged: frames are read zero-copy from the
+  worker's shared-memory FrameRing, and saved frames and clips come back
+  as messages that the server writes to the database as in thread mode.
+* With CAMERA_INFERENCE=shared one inference process holds the model and
+  runs detection for every camera, batching the frames that are waiting
+  into one model call. Workers hand it frames by ring slot, so pixels are
+  not copied. With 'replicated' each worker loads its own model, which
+  costs one model's memory per camera.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from multiprocessing.connection import Client, Listener, wait
+
+import pandas as pd
+from flask import Flask
+
+from analyzer import Analyzer, RealtimeAnalyzer
+from camera_supervisor import STOPPED
+from config import Config
+from frame_ring import FrameRing
+from image_writer import image_writer
+
+logger = logging.getLogger("camera_workers")
+
+DETECTION_COLUMNS = ("name", "confidence", "xmin", "ymin", "xmax", "ymax")
+METRICS_INTERVAL = 1.0  # seconds between metrics messages from a worker
+STOP_TIMEOUT = 10.0  # seconds a worker gets to exit after a stop before it is terminated
+INFERENCE_RETRY_SECONDS = 5.0  # how often a worker without inference asks for a restart again
+
+# Spawned, not forked: the server has threads (and possibly CUDA) that must not be copied mid-flight
+_spawn = multiprocessing.get_context("spawn")
+
+def worker_settings(config):
+    """The config a worker or inference process needs, as a plain picklable dict"""
+    return {key: config[key] for key in dir(Config) if key.isupper() and key in config}
+
+# --- Shared inference process ---
+
+def load_model(settings):
+    """The detection model for the inference process, loaded as the analyzers load it"""
+    analyzer = Analyzer(
+        output_folder=settings['OUTPUT_FOLDER'],
+        model_path=settings['YOLO_MODEL_PATH'],
+        confidence=settings['ANALYSIS_CONFIG']["realtime"]["confidence"],
+        include_classes=[]
+    )
+    if not analyzer._load_model():
+        raise RuntimeError(f"Could not load model {settings['YOLO_MODEL_PATH']}")
+    return analyzer.model
+
+def _request_image(conn, request, rings):
+    """The frame a detection request refers to: sent inline, or a slot of the worker's frame ring"""
+    if request[0] == "frame":
+        return request[1]
+    _, name, seq = request
+    ring = rings.get(conn)
+    if ring is None or ring.name != name:
+        if ring is not None:
+            ring.close()
+        ring = rings[conn] = FrameRing.attach(name, tracked=True)
+    item = ring.read(seq, mark_read=False)  # detection is not a viewer, overlays stay skipped
+    if item is None:
+        raise ValueError(f"Frame {seq} is no longer in ring {name}")
+    return item[2]
+
+def _reply(conn, message, dead):
+    """Send a reply to one worker; a worker that died or was terminated is added to dead"""
+    try:
+        conn.send(message)
+    except (OSError, ValueError):
+        dead.add(conn)
+
+def _infer(model, batch, dead):
+    """Run one model call over [(conn, image)] and send each worker its detections"""
+    try:
+        results = model([image for _, image in batch])
+        replies = [(True, {column: detections[column].tolist() for column in DETECTION_COLUMNS})
+                   for detections in results.pandas().xyxy]
+    except Exception as e:
+        logger.error(f"Batched inference failed: {e}")
+        replies = [(False, str(e))] * len(batch)
+    for (conn, _), reply in zip(batch, replies):
+        _reply(conn, reply, dead)
+
+def inference_main(parent, settings, authkey, model_loader=None):
+    """Entry point of the shared inference process.
+
+    Reports its listener address to the server over parent, then serves
+    detection requests from camera workers until parent sends anything or
+    closes. Requests that are waiting together go into one model call.
+    """
+    model = (model_loader or load_model)(settings)
+    batch_size = max(1, settings.get('INFERENCE_BATCH_SIZE', 8))
+    listener = Listener(authkey=authkey)
+    clients, rings = [], {}
+    lock = threading.Lock()
+    wake_reader, wake_writer = multiprocessing.Pipe(duplex=False)
+
+    def accept():
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                logger.warning(f"Rejected inference connection: {e}")
+                continue
+            with lock:
+                clients.append(conn)
+            wake_writer.send(None)  # have the serving loop wait on the new connection too
+
+    def drop(conn):
+        with lock:
+            if conn in clients:
+                clients.remove(conn)
+        ring = rings.pop(conn, None)
+        if ring is not None:
+            ring.close()
+        conn.close()
+
+    threading.Thread(target=accept, daemon=True).start()
+    parent.send(listener.address)
+    while True:
+        with lock:
+            conns = list(clients)
+        ready = wait(conns + [parent, wake_reader])
+        if parent in ready:
+            break
+        if wake_reader in ready:
+            wake_reader.recv()
+        batch, dead = [], set()
+        for conn in ready:
+            if conn is parent or conn is wake_reader:
+                continue
+            try:
+                request = conn.recv()
+            except (EOFError, OSError):
+                dead.add(conn)
+                continue
+            try:
+                batch.append((conn, _request_image(conn, request, rings)))
+            except Exception as e:
+                _reply(conn, (False, str(e)), dead)
+        for start in range(0, len(batch), batch_size):
+            _infer(model, batch[start:start + batch_size], dead)
+        # A dead worker only loses its own connection; the others keep being served
+        for conn in dead:
+            drop(conn)
+
+class InferenceService:
+    """Server-side handle on the shared inference process, started with the first worker that needs it.
+
+    If the process dies, a worker that loses its connection asks its
+    CameraWorker for a new address and restart() brings the process back
+    with the settings it was first started with; the authkey stays the same.
+    """
+
+    def __init__(self):
+        self.address = None
+        self.authkey = os.urandom(16)
+        self._process = None
+        self._conn = None
+        self._start_args = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._process is not None and self._process.is_alive()
+
+    def restart(self):
+        """Address of the inference process, starting it again if it died; None if it was never started"""
+        if self._start_args is None:
+            return None
+        if not self.running:
+            logger.warning("Shared inference process is not running, restarting it")
+        return self.ensure_started(*self._start_args)
+
+    def ensure_started(self, settings, model_loader=None, timeout=120.0):
+        """Address of the running inference process, starting it (and loading the model) if needed"""
+        with self._lock:
+            self._start_args = (settings, model_loader, timeout)
+            if self.running:
+                return self.address
+            conn, child = _spawn.Pipe()
+            process = _spawn.Process(target=inference_main, args=(child, settings, self.authkey, model_loader),
+                                     name="inference", daemon=True)
+            process.start()
+            child.close()
+            try:
+                if not conn.poll(timeout):
+                    raise RuntimeError(f"Inference process did not start within {timeout:.0f}s")
+                self.address = conn.recv()
+            except EOFError:
+                raise RuntimeError("Inference process exited while loading the model")
+            except Exception:
+                process.terminate()
+                raise
+            self._process, self._conn = process, conn
+            logger.info(f"Shared inference process {process.pid} serving on {self.address}")
+            return self.address
+
+    def stop(self):
+        with self._lock:
+            self._start_args = None  # stopped on purpose, so workers must not bring it back
+            if self._process is None:
+                return
+            try:
+                self._conn.send("stop")
+            except OSError:
+                pass
+            self._process.join(5)
+            if self._process.is_alive():
+                self._process.terminate()
+            self._process = self._conn = None
+
+inference_service = InferenceService()
+
+# --- Worker process ---
+
+class InferenceClient:
+    """Worker-side connection to the shared inference process.
+
+    When the connection fails, on_lost (if set) is called to ask for the
+    process to be restarted, at most every INFERENCE_RETRY_SECONDS;
+    set_address() then points the client at the new process. Detections
+    fail until it is back.
+    """
+
+    def __init__(self, address, authkey):
+        self.address = address
+        self.authkey = authkey
+        self.on_lost = None
+        self._conn = None
+        self._lost_at = None
+
+    def set_address(self, address):
+        self.address = address
+        self._lost_at = None
+
+    def _connection_lost(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None  # reconnect on the next frame
+        now = time.monotonic()
+        if self.on_lost is not None and (self._lost_at is None or now - self._lost_at > INFERENCE_RETRY_SECONDS):
+            self._lost_at = now
+            self.on_lost()
+
+    def detect(self, request):
+        """Detections for one frame request as a DataFrame, like results.pandas().xyxy[0]"""
+        try:
+            if self._conn is None:
+                self._conn = Client(self.address, authkey=self.authkey)
+            self._conn.send(request)
+            ok, result = self._conn.recv()
+        except (EOFError, OSError):
+            self._connection_lost()
+            raise
+        if not ok:
+            raise RuntimeError(result)
+        return pd.DataFrame(result, columns=DETECTION_COLUMNS)
+
+class WorkerAnalyzer(RealtimeAnalyzer):
+    """RealtimeAnalyzer inside a camera worker. With an inference client the model lives in the inference process."""
+
+    def __init__(self, inference=None, **kwargs):
+        self.inference = inference
+        self.on_publish = None  # called with (seq, time, frame count, frame ring) after each published frame
+        self._published = None  # (id of the frame, seq) of the last frame published unannotated
+        super().__init__(**kwargs)
+
+    def _load_model(self, from_local=True):
+        if self.inference is not None:
+            return True
+        return super()._load_model(from_local)
+
+    def publish_frame(self, frame, annotate=None):
+        published = super().publish_frame(frame, annotate)
+        if annotate is None:
+            self._published = (id(frame), self.frame_seq)
+        if self.on_publish is not None:
+            self.on_publish(self.frame_seq, self.frame_time, self.frame_count, self.frame_ring)
+        return published
+
+    def detect_objects(self, frame):
+        if self.inference is None:
+            return super().detect_objects(frame)
+        try:
+            start_time = time.time()
+            ring = self.frame_ring
+            published = self._published
+            # The capture loop detects on the frame it just published, so the inference process
+            # can read it from the ring; the ring does not move until this call returns
+            if (ring is not None and ring.name is not None and published is not None
+                    and published[0] == id(frame) and ring.holds(published[1])):
+                request = ("ring", ring.name, published[1])
+            else:
+                request = ("frame", frame)
+            detections = self.filter_detections(self.inference.detect(request))
+            logger.info(f"Frame processed in {time.time() - start_time:.3f}s | Found {len(detections)} objects")
+            return True, detections
+        except Exception as e:
+            logger.error(f"Error detecting objects: {str(e)}")
+            return None, None
+
+def _serve_server(conn, analyzer, send):
+    """Worker thread: send metrics every METRICS_INTERVAL and handle the server's commands.
+
+    ("inference", address) points the worker at a restarted inference
+    process; ("stop",), or losing the server, stops the analyzer.
+    """
+    while True:
+        try:
+            if conn.poll(METRICS_INTERVAL):
+                command = conn.recv()
+                if command[0] == "inference" and analyzer.inference is not None:
+                    analyzer.inference.set_address(command[1])
+                    continue
+                break
+        except (EOFError, OSError):
+            break
+        send("metrics", analyzer.get_metrics())
+    analyzer.stop()
+
+def camera_worker_main(camera_index, analyzer_kwargs, settings, conn, inference_address=None,
+                       inference_authkey=None, analyzer_class=None, start_delay=0):
+    """Entry point of a camera worker process: run one camera's analyzer loop, reporting over conn"""
+    app = Flask("camera_worker")
+    app.config.update(settings)
+    image_writer.init_app(app)
+    send_lock = threading.Lock()
+
+    def send(*message):
+        with send_lock:
+            try:
+                conn.send(message)
+            except (OSError, ValueError):
+                pass  # the server is gone; _serve_server stops the analyzer
+
+    last_ring = [None]
+
+    def on_publish(seq, frame_time, frame_count, ring):
+        name = ring.name if ring is not None else None
+        if name != last_ring[0]:
+            last_ring[0] = name
+            send("ring", name)
+        send("frame", seq, frame_time, frame_count)
+
+    with app.app_context():
+        inference = InferenceClient(inference_address, inference_authkey) if inference_address else None
+        if inference is not None:
+            inference.on_lost = lambda: send("inference_lost")
+        analyzer = (analyzer_class or WorkerAnalyzer)(inference=inference, **analyzer_kwargs)
+        analyzer.on_frame_saved = lambda saved: send("frame_saved", saved)
+        analyzer.on_clip_saved = lambda clip: send("clip", clip)
+        analyzer.on_publish = on_publish
+        analyzer.supervisor.on_change = lambda entry: send("state", entry)
+        threading.Thread(target=_serve_server, args=(conn, analyzer, send), daemon=True).start()
+        ok = False
+        try:
+            ok = analyzer.start(camera_index=camera_index, show_video=False, start_delay=start_delay)
+        except Exception as e:
+            logger.exception(f"Camera worker for camera {camera_index} failed: {e}")
+        finally:
+            image_writer.flush()  # saved-frame messages go out before the exit message
+        send("metrics", analyzer.get_metrics())
+        send("exit", ok)
+
+# --- Server side ---
+
+class CameraWorker:
+    """Server-side handle on one camera's worker process.
+
+    Takes the analyzer's place in analyzer_state.analyzer_instances. run()
+    starts the process and relays its messages until it exits, calling
+    on_ready after the first frame, on_frame_saved/on_clip_saved with what
+    the worker saved and on_camera_state with its supervisor's state
+    changes. A worker that lost the shared inference process gets it
+    restarted and is sent the new address. The worker's frame ring is
+    always shared, with at least two slots, since that is how frames reach
+    this process.
+    """
+
+    def __init__(self, camera_index, analyzer_kwargs, settings, inference_address=None,
+                 inference_authkey=None, analyzer_class=None, start_delay=0):
+        self.camera_index = camera_index
+        self.on_ready = None
+        self.on_frame_saved = None
+        self.on_clip_saved = None
+        self.on_camera_state = None
+        self.metrics = {}
+        self.frame_seq = 0
+        self.frame_time = None
+        self.frame_count = 0
+        self.frame_ring = None
+        self._closed = False
+        self._stop_requested = None
+        self._cond = threading.Condition()
+        self._send_lock = threading.Lock()
+        settings = dict(settings, FRAME_RING_SHARED=True, FRAME_RING_SLOTS=max(2, settings.get('FRAME_RING_SLOTS') or 0))
+        self._conn, self._child_conn = _spawn.Pipe()
+        self.process = _spawn.Process(
+            target=camera_worker_main,
+            args=(camera_index, analyzer_kwargs, settings, self._child_conn, inference_address,
+                  inference_authkey, analyzer_class, start_delay),
+            name=f"camera-{camera_index}",
+            daemon=True
+        )
+
+    def get_metrics(self):
+        return dict(self.metrics, pid=self.process.pid)
+
+    def run(self):
+        """Start the worker and relay its messages until it exits; returns what its analyzer's start() returned"""
+        self.process.start()
+        self._child_conn.close()
+        ok = False
+        try:
+            while True:
+                if (self._stop_requested is not None and self.process.is_alive()
+                        and time.time() - self._stop_requested > STOP_TIMEOUT):
+                    logger.warning(f"Camera worker {self.camera_index} ignored stop, terminating it")
+                    self.process.terminate()
+                try:
+                    if not self._conn.poll(METRICS_INTERVAL):
+                        if not self.process.is_alive():
+                            break
+                        continue
+                    message = self._conn.recv()
+                except (EOFError, OSError):
+                    break
+                kind = message[0]
+                if kind == "frame":
+                    self._frame_published(*message[1:])
+                elif kind == "ring":
+                    self._attach_ring(message[1])
+                elif kind == "metrics":
+                    self.metrics = message[1]
+                elif kind == "frame_saved" and self.on_frame_saved is not None:
+                    self.on_frame_saved(message[1])
+                elif kind == "clip" and self.on_clip_saved is not None:
+                    self.on_clip_saved(message[1])
+                elif kind == "state" and self.on_camera_state is not None:
+                    self.on_camera_state(message[1])
+                elif kind == "inference_lost":
+                    # Loading the model can take a while; keep relaying frames meanwhile
+                    threading.Thread(target=self._restart_inference, daemon=True).start()
+                elif kind == "exit":
+                    ok = message[1]
+        finally:
+            self.process.join(STOP_TIMEOUT)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join()
+            with self._cond:
+                self._closed = True
+                self._cond.notify_all()
+            self._conn.close()
+        return ok
+
+    def _restart_inference(self):
+        try:
+            address = inference_service.restart()
+        except Exception as e:
+            logger.error(f"Could not restart the inference process for camera worker {self.camera_index}: {e}")
+            return  # the worker asks again after INFERENCE_RETRY_SECONDS
+        if address is not None:
+            self._send(("inference", address))
+
+    def _send(self, message):
+        with self._send_lock:
+            try:
+                self._conn.send(message)
+            except (OSError, ValueError):
+                pass
+
+    def _frame_published(self, seq, frame_time, frame_count):
+        first = self.frame_seq == 0
+        with self._cond:
+            self.frame_seq, self.frame_time, self.frame_count = seq, frame_time, frame_count
+            self._cond.notify_all()
+        if first and self.on_ready is not None:
+            self.on_ready()
+
+    def _attach_ring(self, name):
+        ring = None
+        if name is not None:
+            try:
+                ring = FrameRing.attach(name, tracked=True)
+            except (OSError, ValueError) as e:
+                logger.error(f"Cannot attach frame ring {name} of camera worker {self.camera_index}: {e}")
+        old, self.frame_ring = self.frame_ring, ring
+        if old is not None:
+            old.close()
+
+    def _read(self, after_seq=0):
+        """Newest consistent (seq, time, frame view) newer than after_seq, or None"""
+        ring = self.frame_ring
+        try:
+            latest = ring.latest_seq
+        except (AttributeError, TypeError):
+            return None  # no ring yet, or closed for a new one
+        # The newest slot may be mid-write; the one before it is then still intact
+        for seq in (latest, latest - 1):
+            if seq <= after_seq:
+                return None
+            item = ring.read(seq)
+            if item is not None:
+                return item
+        return None
+
+    def get_frame_info(self):
+        item = self._read()
+        if item is not None:
+            return item
+        with self._cond:
+            return self.frame_seq, self.frame_time, None
+
+    def get_current_frame(self):
+        return self.get_frame_info()[2]
+
+    def wait_for_frame(self, after_seq=0, timeout=None):
+        with self._cond:
+            self._cond.wait_for(lambda: self.frame_seq > after_seq or self._closed, timeout)
+            closed = self._closed
+        item = self._read(after_seq)
+        return STOPPED if item is None and closed else item
+
+    def frame_still_valid(self, seq):
+        ring = self.frame_ring
+        return ring is None or ring.holds(seq)
+
+    def stop(self):
+        """Ask the worker to stop and return at once; run() returns once the process has exited"""
+        if self._stop_requested is not None:
+            return
+        self._stop_requested = time.time()
+        self._send(("stop",))
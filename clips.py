@@ -0,0 +1,241 @@
+import logging
+import math
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from frame_shards import shard_folder
+
+logger = logging.getLogger("clips")
+
+# Tried in order when the configured codec has no encoder in this OpenCV build. H.264 is what
+# browsers play; MPEG-4 Part 2 ('mp4v') is always there but only downloads, it does not play inline.
+FALLBACK_FOURCCS = ('avc1', 'H264', 'X264', 'mp4v')
+
+class _ClipJob:
+    """One clip being recorded: its pre-roll plus the frames queued while the event lasts"""
+
+    def __init__(self, path, start_time, fps, preroll, queue_size):
+        self.path = path
+        self.start_time = start_time
+        self.end_at = start_time
+        self.fps = fps
+        self.classes = set()
+        self.preroll = preroll  # [(frame, time)] copied out of the ring
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.ended = False  # the end-of-clip marker has been taken off the queue
+
+    def __iter__(self):
+        preroll, self.preroll = self.preroll or (), None
+        yield from preroll
+        while not self.ended:
+            item = self.frames.get()
+            if item is None:
+                self.ended = True
+                return
+            yield item
+
+class ClipRecorder:
+    """Keeps the last few seconds of one camera's frames and records event clips from them.
+
+    add() is called with every captured frame. Frames are sampled down to at
+    most `fps`, shrunk to `max_dim` and copied into a preallocated ring that
+    holds `pre_seconds` of video. trigger() starts an event, or extends the
+    current one, on a detection: the pre-roll and every sampled frame up to
+    `post_seconds` after the last trigger (at most `max_seconds` in all) are
+    encoded into one MP4 by a background thread, so the capture thread never
+    waits on the encoder. on_clip(clip) runs on that thread once the file is
+    complete and synced.
+    """
+
+    def __init__(self, output_folder, camera_index=0, pre_seconds=5.0, post_seconds=5.0,
+                 max_seconds=120.0, fps=5.0, max_dim=960, fourcc='avc1'):
+        self.output_folder = output_folder
+        self.camera_index = camera_index
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.max_seconds = max_seconds
+        self.fps = fps
+        self.max_dim = max_dim
+        self.fourcc = fourcc
+        self._working_fourcc = None  # the first codec that opened, so later clips skip the probing
+        self.on_clip = None
+        self._slots = max(1, math.ceil(pre_seconds * fps))
+        self._ring = None  # (slots, h, w, c) sampled frames
+        self._times = [0.0] * self._slots
+        self._next = 0
+        self._filled = 0
+        self._last_sample = 0.0
+        self._job = None
+        self._lock = threading.Lock()
+        # Updated from the capture thread and the encoder threads
+        self._metrics_lock = threading.Lock()
+        self.metrics = {"clips": 0, "failed": 0, "frames_dropped": 0, "ring_allocs": 0, "last_error": None}
+
+    def _count(self, key, amount=1):
+        with self._metrics_lock:
+            self.metrics[key] += amount
+
+    def _size_for(self, frame):
+        height, width = frame.shape[:2]
+        if not self.max_dim or max(height, width) <= self.max_dim:
+            return width, height
+        scale = self.max_dim / max(height, width)
+        return max(1, round(width * scale)), max(1, round(height * scale))
+
+    def _store(self, frame, when):
+        """Copy frame into the next ring slot and return the slot"""
+        width, height = self._size_for(frame)
+        shape = (height, width) + frame.shape[2:]
+        if self._ring is None or self._ring.shape[1:] != shape:
+            self._ring = np.empty((self._slots,) + shape, dtype=np.uint8)
+            self._next = self._filled = 0
+            self._count("ring_allocs")
+        slot = self._ring[self._next]
+        if shape == frame.shape:
+            np.copyto(slot, frame)
+        else:
+            cv2.resize(frame, (width, height), dst=slot, interpolation=cv2.INTER_AREA)
+        self._times[self._next] = when
+        self._next = (self._next + 1) % self._slots
+        self._filled = min(self._filled + 1, self._slots)
+        return slot
+
+    def add(self, frame, when=None):
+        """Sample a captured frame into the pre-roll ring and the clip being recorded"""
+        when = time.time() if when is None else when
+        # A little slack so a camera running at exactly `fps` is not sampled at half rate through jitter
+        if when - self._last_sample < 0.9 / self.fps:
+            return
+        self._last_sample = when
+        slot = self._store(frame, when)
+        with self._lock:
+            job = self._job
+            if job is None:
+                return
+            if when > job.end_at:
+                self._finish()
+                return
+            try:
+                job.frames.put_nowait((slot.copy(), when))
+            except queue.Full:
+                self._count("frames_dropped")
+
+    def trigger(self, classes, when=None):
+        """Start an event clip, or extend the one being recorded, because of a detection"""
+        when = time.time() if when is None else when
+        with self._lock:
+            if self._job is None:
+                self._start(when)
+            self._job.classes.update(classes)
+            self._job.end_at = min(when + self.post_seconds, self._job.start_time + self.max_seconds)
+
+    def _start(self, when):
+        order = [(self._next - self._filled + i) % self._slots for i in range(self._filled)]
+        preroll = [(self._ring[i].copy(), self._times[i]) for i in order if self._times[i] >= when - self.pre_seconds]
+        start_time = preroll[0][1] if preroll else when
+        fps = self.fps
+        if len(preroll) > 1 and preroll[-1][1] > start_time:
+            # Play back at the rate frames were actually sampled, not the nominal one
+            fps = min(self.fps, (len(preroll) - 1) / (preroll[-1][1] - start_time))
+        started = datetime.fromtimestamp(start_time)
+        path = os.path.join(shard_folder(self.output_folder, self.camera_index, started),
+                            f"clip_{started.strftime('%Y%m%d_%H%M%S_%f')}.mp4")
+        self._job = _ClipJob(path, start_time, fps, preroll, queue_size=max(2, math.ceil(self.fps * 5)))
+        threading.Thread(target=self._encode, args=(self._job,), daemon=True).start()
+
+    def _finish(self):
+        """End the current clip; the encoder thread drains what is queued and closes the file"""
+        job, self._job = self._job, None
+        if job is not None:
+            job.frames.put(None)
+
+    def close(self):
+        """Stop recording, ending the clip in progress"""
+        with self._lock:
+            self._finish()
+
+    def _open_writer(self, path, fps, size):
+        """A VideoWriter using the configured codec, or the first fallback this OpenCV build can encode"""
+        candidates = [self._working_fourcc] if self._working_fourcc else \
+            [self.fourcc] + [fourcc for fourcc in FALLBACK_FOURCCS if fourcc != self.fourcc]
+        for fourcc in candidates:
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+            if writer.isOpened():
+                if fourcc != self.fourcc and self._working_fourcc is None:
+                    logger.warning(f"No {self.fourcc} video encoder available, recording clips as {fourcc}")
+                self._working_fourcc = fourcc
+                return writer
+            writer.release()
+        self._working_fourcc = None
+        raise RuntimeError(f"no video writer available for {', '.join(candidates)}")
+
+    def _encode(self, job):
+        root, extension = os.path.splitext(job.path)
+        tmp_path = f"{root}.part{extension}"
+        writer = None
+        frame_count = 0
+        end_time = job.start_time
+        try:
+            for frame, when in job:
+                if writer is None:
+                    size = (frame.shape[1], frame.shape[0])
+                    os.makedirs(os.path.dirname(job.path), exist_ok=True)
+                    writer = self._open_writer(tmp_path, job.fps, size)
+                elif (frame.shape[1], frame.shape[0]) != size:
+                    frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)  # resolution changed mid-event
+                writer.write(frame)
+                frame_count += 1
+                end_time = when
+            if writer is None:
+                return  # the event ended before a single frame was sampled
+            writer.release()
+            writer = None
+            fd = os.open(tmp_path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            os.replace(tmp_path, job.path)
+        except Exception as e:
+            with self._metrics_lock:
+                self.metrics["failed"] += 1
+                self.metrics["last_error"] = str(e)
+            logger.error(f"Failed to record clip {job.path}: {e}")
+            for _ in job:
+                pass  # keep taking frames until the event ends so nothing piles up for a dead clip
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        finally:
+            if writer is not None:
+                writer.release()
+        self._count("clips")
+        clip = {
+            "path": job.path,
+            "camera_index": self.camera_index,
+            "start_time": datetime.fromtimestamp(job.start_time),
+            "end_time": datetime.fromtimestamp(end_time),
+            "classes": sorted(job.classes),
+            "frame_count": frame_count,
+            "file_size": os.path.getsize(job.path),
+        }
+        logger.info(f"Recorded {frame_count}-frame clip {job.path}")
+        if self.on_clip is not None:
+            try:
+                self.on_clip(clip)
+            except Exception as e:
+                logger.exception(f"Error in clip callback for {job.path}: {e}")
+
+    def stats(self):
+        ring_bytes = self._ring.nbytes if self._ring is not None else 0
+        with self._metrics_lock:
+            metrics = dict(self.metrics)
+        return dict(metrics, recording=self._job is not None, ring_mb=round(ring_bytes / 1_048_576, 1))
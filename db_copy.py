@@ -0,0 +1,60 @@
+from sqlalchemy import create_engine, inspect, select, text, func
+
+from db_models import db
+
+def copy_database(source_uri, target_engine, batch_size=5000, truncate=False, log=print):
+    """Copy every model table from source_uri into target_engine.
+
+    Tables are copied parent-first in primary-key order and in batches, so
+    history of any size moves with bounded memory. Columns missing from an
+    older source schema are left to their defaults, and tables missing from
+    the source (e.g. rollups) are skipped; run rebuild-rollups afterwards.
+    Refuses to write into non-empty target tables unless truncate is set.
+    Returns a dict of table name -> rows copied.
+    """
+    source_engine = create_engine(source_uri)
+    db.metadata.create_all(target_engine)
+    source_tables = set(inspect(source_engine).get_table_names())
+    tables = db.metadata.sorted_tables
+
+    with target_engine.begin() as target:
+        for table in tables:
+            existing = target.execute(select(func.count()).select_from(table)).scalar()
+            if existing and not truncate:
+                raise RuntimeError(f"Target table {table.name} already has {existing} rows (use truncate)")
+        if truncate:
+            for table in reversed(tables):
+                target.execute(table.delete())
+
+    copied = {}
+    for table in tables:
+        if table.name not in source_tables:
+            log(f"Skipping {table.name}: not present in source")
+            continue
+        source_columns = {column['name'] for column in inspect(source_engine).get_columns(table.name)}
+        columns = [column for column in table.columns if column.name in source_columns]
+        order_by = list(table.primary_key.columns) or columns[:1]
+        query = select(*[table.c[column.name] for column in columns]).order_by(*order_by)
+        count = 0
+        with source_engine.connect() as source:
+            result = source.execution_options(yield_per=batch_size).execute(query)
+            for partition in result.partitions(batch_size):
+                rows = [dict(row._mapping) for row in partition]
+                with target_engine.begin() as target:
+                    target.execute(table.insert(), rows)
+                count += len(rows)
+                log(f"  {table.name}: {count} rows")
+        copied[table.name] = count
+
+    if target_engine.dialect.name == 'postgresql':
+        # Explicit ids were inserted, so move each serial sequence past the copied maximum
+        with target_engine.begin() as target:
+            for table in tables:
+                if 'id' not in table.c or not table.c.id.autoincrement:
+                    continue
+                target.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('\"{table.name}\"', 'id'), "
+                    f"COALESCE((SELECT MAX(id) FROM \"{table.name}\"), 0) + 1, false)"
+                ))
+    source_engine.dispose()
+    return copied
@@ -1,7 +1,10 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
 import os
+import sqlite3
 from enum import IntEnum
 
 # Initialize database without binding to an app
@@ -55,9 +58,19 @@ class Video(db.Model):
     upload_date = db.Column(db.DateTime, default=db.func.current_timestamp())
     analysis_result = db.Column(db.Text, nullable=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
-    
+    file_size = db.Column(db.BigInteger, nullable=True)  # Bytes of the uploaded source file
+    content_hash = db.Column(db.String(64), nullable=True, index=True)  # SHA-256 of the uploaded file
+    # Set when the analysis came from the cache: frames and rollups live on that video
+    results_video_id = db.Column(db.Integer, db.ForeignKey('video.id'), nullable=True)
+    # Last time a later upload reused this video's analysis; retention keeps its frames until this expires too
+    last_used = db.Column(db.DateTime, nullable=True)
+
     # Relationship to frames
     frames = db.relationship('Frame', backref='video', lazy=True, cascade="all, delete-orphan")
+    # Relationship to per-class detection rollups
+    object_counts = db.relationship('VideoObjectCount', backref='video', lazy=True, cascade="all, delete-orphan")
+    # Relationship to recorded event clips
+    clips = db.relationship('Clip', backref='video', lazy=True, cascade="all, delete-orphan")
     
     def __repr__(self):
         return f'<Video {self.filename}>'
@@ -65,14 +78,23 @@ class Video(db.Model):
 class Frame(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     frame_number = db.Column(db.Integer, nullable=False)
-    timestamp = db.Column(db.DateTime, default=db.func.current_timestamp())
+    timestamp = db.Column(db.DateTime, default=db.func.current_timestamp(), index=True)
     image_path = db.Column(db.String(255), nullable=True)  # Optional storage of the frame image
     video_id = db.Column(db.Integer, db.ForeignKey('video.id'), nullable=False)
     object_count = db.Column(db.Integer, default=0)  # Track number of objects in frame
+    file_size = db.Column(db.Integer, nullable=True)  # Bytes of the saved image, for storage accounting
+    raw_image = db.Column(db.Boolean, nullable=True)  # True: saved without overlay, rendered on request
+    image_scale = db.Column(db.Float, nullable=True)  # Saved image size / captured frame size (NULL = 1)
+    thumbnail_path = db.Column(db.String(255), nullable=True)  # Sidecar thumbnail for listings, if any
     
     # Relationship to detected objects
     detected_objects = db.relationship('DetectedObject', backref='frame', lazy=True, cascade="all, delete-orphan")
     
+    __table_args__ = (
+        # Per-camera time range scans (search, listings) in (timestamp, id) order
+        db.Index('ix_frame_video_time', 'video_id', 'timestamp', 'id'),
+    )
+    
     def __repr__(self):
         return f'<Frame {self.frame_number} of Video ID {self.video_id} with {self.object_count} objects>'
     
@@ -83,15 +105,10 @@ class Frame(db.Model):
     
     def get_object_counts_by_type(self):
         """Returns a dictionary with counts of each object type in this frame"""
-        result = {}
-        objects = DetectedObject.query.filter_by(frame_id=self.id).all()
-        
-        for obj in objects:
-            if obj.object_name not in result:
-                result[obj.object_name] = 0
-            result[obj.object_name] += 1
-            
-        return result
+        rows = db.session.query(
+            DetectedObject.object_name, db.func.count(DetectedObject.id)
+        ).filter(DetectedObject.frame_id == self.id).group_by(DetectedObject.object_name).all()
+        return {name: count for name, count in rows}
 
 class DetectedObject(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -105,6 +122,11 @@ class DetectedObject(db.Model):
     y_max = db.Column(db.Float, nullable=True)
     frame_id = db.Column(db.Integer, db.ForeignKey('frame.id'), nullable=False)
     
+    __table_args__ = (
+        # Covers per-frame class/confidence filters without touching the table
+        db.Index('ix_object_frame_class', 'frame_id', 'object_name', 'probability'),
+    )
+    
     def __repr__(self):
         return f'<DetectedObject {self.object_name} (Type: {self.object_type}, {self.probability:.2f}) in Frame ID {self.frame_id}>'
     
@@ -121,27 +143,176 @@ class DetectedObject(db.Model):
                 return name
         return "unknown"
 
-def configure_db(app):
-    # Configure SQLite database
+class Clip(db.Model):
+    """An MP4 recorded around a detection event, from the pre-roll to the post-roll"""
+    id = db.Column(db.Integer, primary_key=True)
+    video_id = db.Column(db.Integer, db.ForeignKey('video.id'), nullable=False)
+    camera_index = db.Column(db.Integer, nullable=False)
+    path = db.Column(db.String(255), nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False, index=True)
+    end_time = db.Column(db.DateTime, nullable=False)
+    classes = db.Column(db.String(255), nullable=True)  # Comma-separated detected classes
+    frame_count = db.Column(db.Integer, default=0)
+    file_size = db.Column(db.BigInteger, nullable=True)  # Bytes of the MP4, for storage accounting
+
+    __table_args__ = (
+        db.Index('ix_clip_camera_time', 'camera_index', 'start_time'),
+    )
+
+    def __repr__(self):
+        return f'<Clip cam {self.camera_index} {self.start_time} - {self.end_time}>'
+
+class AnalysisCacheEntry(db.Model):
+    """Analysis of an upload, keyed by its content hash and the analysis settings"""
+    cache_key = db.Column(db.String(64), primary_key=True)  # SHA-256 of content hash + settings
+    content_hash = db.Column(db.String(64), nullable=False, index=True)
+    video_id = db.Column(db.Integer, db.ForeignKey('video.id'), nullable=False)  # Video holding the results
+    params = db.Column(db.Text, nullable=False)  # JSON of the settings, for inspection
+    frame_count = db.Column(db.Integer, nullable=False, default=0)
+    hits = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp(), index=True)
+    last_hit = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<AnalysisCacheEntry {self.cache_key[:12]} -> Video ID {self.video_id}>'
+
+class UploadSession(db.Model):
+    """A chunked upload in progress: bytes land in a .part file until the whole video has arrived"""
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex, handed to the client
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    filename = db.Column(db.String(255), nullable=False)  # Name the video gets in VIDEOS_FOLDER
+    total_size = db.Column(db.BigInteger, nullable=False)
+    received = db.Column(db.BigInteger, nullable=False, default=0)  # Bytes written and synced, the resume offset
+    sha256 = db.Column(db.String(64), nullable=True)  # Whole-file hash the client declared, checked on completion
+    storage_profile = db.Column(db.String(50), nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='uploading')  # uploading/analyzing/done/failed
+    error = db.Column(db.Text, nullable=True)
+    video_id = db.Column(db.Integer, db.ForeignKey('video.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(), index=True)
+
+    def __repr__(self):
+        return f'<UploadSession {self.id} {self.received}/{self.total_size} {self.status}>'
+
+class VideoObjectCount(db.Model):
+    """Rollup of detections per video and object class, maintained on insert"""
+    video_id = db.Column(db.Integer, db.ForeignKey('video.id'), primary_key=True)
+    object_name = db.Column(db.String(100), primary_key=True)
+    object_count = db.Column(db.Integer, nullable=False, default=0)  # Total detections of this class
+    frame_count = db.Column(db.Integer, nullable=False, default=0)  # Frames containing this class
+    
+    def __repr__(self):
+        return f'<VideoObjectCount {self.object_name}={self.object_count} in Video ID {self.video_id}>'
+
+class CameraObjectBucket(db.Model):
+    """Rollup of detections per camera, object class and time bucket (minute/hour)"""
+    camera_index = db.Column(db.Integer, primary_key=True)
+    object_name = db.Column(db.String(100), primary_key=True)
+    granularity = db.Column(db.String(10), primary_key=True)
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    object_count = db.Column(db.Integer, nullable=False, default=0)
+    frame_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        db.Index('ix_camera_bucket_range', 'camera_index', 'granularity', 'bucket_start'),
+    )
+    
+    def __repr__(self):
+        return f'<CameraObjectBucket cam {self.camera_index} {self.object_name} {self.granularity} {self.bucket_start}>'
+
+def default_database_uri():
     basedir = os.path.abspath(os.path.dirname(__file__))
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'database.db')
+    return 'sqlite:///' + os.path.join(basedir, 'database.db')
+
+def engine_options(uri, config):
+    """Build SQLAlchemy engine options for a database URI from the app config"""
+    options = {
+        'pool_pre_ping': config.get('DB_POOL_PRE_PING', True),
+    }
+    if make_url(uri).get_backend_name() == 'sqlite':
+        # One file, one writer: wait for the lock instead of failing with "database is locked"
+        options['connect_args'] = {
+            'timeout': config.get('DB_BUSY_TIMEOUT', 30),
+            'check_same_thread': False,
+        }
+        return options
+    options.update({
+        'pool_size': config.get('DB_POOL_SIZE', 10),
+        'max_overflow': config.get('DB_MAX_OVERFLOW', 10),
+        'pool_timeout': config.get('DB_POOL_TIMEOUT', 30),
+        'pool_recycle': config.get('DB_POOL_RECYCLE', 1800),
+    })
+    if make_url(uri).get_backend_name() == 'postgresql':
+        lock_timeout_ms = int(config.get('DB_BUSY_TIMEOUT', 30) * 1000)
+        options['connect_args'] = {'options': f'-c lock_timeout={lock_timeout_ms}'}
+    return options
+
+# Set from Config.DB_SQLITE_WAL by configure_db
+_sqlite_wal_enabled = True
+
+@event.listens_for(Engine, 'connect')
+def _configure_sqlite_connection(dbapi_connection, connection_record):
+    """Enable WAL so the web UI can read while camera threads write"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    if _sqlite_wal_enabled:
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.close()
+
+def configure_db(app):
+    global _sqlite_wal_enabled
+    uri = app.config.get('DATABASE_URL') or default_database_uri()
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(uri, app.config))
+    _sqlite_wal_enabled = app.config.get('DB_SQLITE_WAL', True)
     
     # Initialize app with extension
     db.init_app(app)
 
+def ensure_columns():
+    """Add nullable model columns missing from tables that predate them"""
+    inspector = db.inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                conn.execute(db.text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+
+def ensure_indexes():
+    """Create any model indexes missing from tables that predate them"""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
 def init_db(app):
     with app.app_context():
         db.create_all()
+        ensure_columns()
+        ensure_indexes()
+        from rollups import ensure_rollups  # rollups imports this module
+        ensure_rollups()
 
 def reset_db(app):
+    from camera_registry import forget_camera  # camera_registry imports this module
     with app.app_context():
         db.drop_all()
         db.create_all()
+    forget_camera()
 
 def migrate_db(app):
     """Recreates database tables - WARNING: this will delete existing data"""
+    from camera_registry import forget_camera
     with app.app_context():
         db.drop_all()
         db.create_all()
         print("Database schema reset and recreated")
+    forget_camera()
@@ -0,0 +1,86 @@
+import json
+import threading
+import time
+from collections import deque
+
+class EventBus:
+    """In-process publish/subscribe hub behind /api/events.
+
+    Events go into one bounded ring under increasing ids; producers never
+    block and every client reads the same ring, waiting on a condition for
+    ids newer than the last one it sent. A reconnecting EventSource resumes
+    from Last-Event-ID, and a client that fell further behind than the ring
+    holds is told to resync instead of silently missing events.
+    """
+
+    def __init__(self, history=500, metrics_interval=2.0):
+        self.metrics_interval = metrics_interval
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=history)
+        self._last_id = 0
+        self._metrics_thread = None
+        self.clients = 0
+        self.published = 0
+
+    def init_app(self, app):
+        self.metrics_interval = app.config['EVENTS_METRICS_INTERVAL']
+        app.extensions['events'] = self
+
+    @property
+    def last_id(self):
+        with self._cond:
+            return self._last_id
+
+    def publish(self, event_type, data):
+        """Append an event and wake every waiting client. Returns the event id."""
+        with self._cond:
+            self._last_id += 1
+            self._events.append((self._last_id, event_type, data))
+            self.published += 1
+            self._cond.notify_all()
+            return self._last_id
+
+    def subscribe(self):
+        with self._cond:
+            self.clients += 1
+            if self._metrics_thread is None or not self._metrics_thread.is_alive():
+                self._metrics_thread = threading.Thread(target=self._metrics_loop, daemon=True)
+                self._metrics_thread.start()
+
+    def unsubscribe(self):
+        with self._cond:
+            self.clients = max(0, self.clients - 1)
+
+    def wait_for_events(self, after_id, timeout=15.0):
+        """Block until events newer than after_id exist.
+
+        Returns a list of (id, type, data), empty on timeout, or None if
+        events after after_id have already been dropped from the ring.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._last_id > after_id, timeout)
+            if self._events and self._events[0][0] > after_id + 1:
+                return None
+            return [event for event in self._events if event[0] > after_id]
+
+    def _metrics_loop(self):
+        """Publish fps/latency for running cameras while anyone is listening"""
+        import analyzer_state  # analyzer_state publishes through this module
+        while True:
+            with self._cond:
+                if self.clients == 0:
+                    self._metrics_thread = None
+                    return
+            with analyzer_state.analyzer_lock:
+                instances = [
+                    (idx, instance) for idx, instance in analyzer_state.analyzer_instances.items()
+                    if instance is not None and analyzer_state.analyzer_running.get(idx)
+                ]
+            for camera_index, instance in instances:
+                self.publish("camera_metrics", dict(instance.get_metrics(), camera_index=camera_index))
+            time.sleep(self.metrics_interval)
+
+def format_sse(event_id, event_type, data):
+    return f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+event_bus = EventBus()
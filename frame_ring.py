@@ -0,0 +1,172 @@
+import itertools
+import os
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Shared header: latest published seq, slot count, slot capacity in bytes, last read time in ns
+_HEADER_FIELDS = 4
+# Per-slot header: seqlock version (odd while being written), frame seq, time in ns, height, width, channels
+_SLOT_FIELDS = 6
+
+_ring_ids = itertools.count(1)
+
+def _attach_untracked(name):
+    """Attach to an existing segment without letting this process's resource tracker unlink it at exit"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13
+        from multiprocessing import resource_tracker
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+class FrameRing:
+    """Per-camera ring of fixed-size frame slots in shared memory.
+
+    One producer writes each frame exactly once into the next slot. Readers
+    in any process get NumPy views straight onto the slot, with no copy and
+    no pickling. Each slot carries a seqlock version: the writer makes it odd
+    before touching the pixels and even again afterwards, and only then
+    records which frame the slot holds. A view stays valid until its slot is
+    reused N frames later; readers call holds(seq) after using a view to
+    make sure it was not overwritten underneath them (a torn frame is
+    dropped, never served). The writer does not issue memory fences, so
+    holds() is the authoritative check, not the version alone.
+
+    A ring created with shared=False lives in ordinary process memory; it
+    works the same way but has no name and cannot be attached elsewhere.
+    """
+
+    def __init__(self, buf, shm=None, owner=False):
+        self.shm = shm
+        self.name = shm.name if shm is not None else None
+        self.owner = owner
+        self._header = np.ndarray((_HEADER_FIELDS,), dtype=np.int64, buffer=buf)
+        self.slots = int(self._header[1])
+        self.slot_bytes = int(self._header[2])
+        offset = self._header.nbytes
+        self._slot_headers = np.ndarray((self.slots, _SLOT_FIELDS), dtype=np.int64, buffer=buf, offset=offset)
+        offset += self._slot_headers.nbytes
+        self._data = np.ndarray((self.slots, self.slot_bytes), dtype=np.uint8, buffer=buf, offset=offset)
+
+    @classmethod
+    def create(cls, frame_shape, slots=4, prefix="frames", shared=True):
+        """New ring sized for frames of frame_shape (h, w[, c])"""
+        slot_bytes = int(np.prod(frame_shape))
+        size = 8 * (_HEADER_FIELDS + slots * _SLOT_FIELDS) + slots * slot_bytes
+        if shared:
+            name = f"{prefix}_{os.getpid()}_{next(_ring_ids)}"
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            buf = shm.buf
+        else:
+            shm, buf = None, bytearray(size)
+        header = np.ndarray((_HEADER_FIELDS,), dtype=np.int64, buffer=buf)
+        header[:] = (0, slots, slot_bytes, 0)
+        ring = cls(buf, shm, owner=True)
+        ring._slot_headers[:] = 0
+        return ring
+
+    @classmethod
+    def attach(cls, name, tracked=False):
+        """Attach to a shared ring by name.
+
+        Pass tracked=True from processes spawned off the same parent as the
+        creator: they share its resource tracker, so untracking the segment
+        here would also drop the creator's registration.
+        """
+        shm = shared_memory.SharedMemory(name=name) if tracked else _attach_untracked(name)
+        return cls(shm.buf, shm)
+
+    def fits(self, frame):
+        return frame.dtype == np.uint8 and frame.nbytes <= self.slot_bytes
+
+    def write(self, frame, seq, frame_time=None, annotate=None):
+        """Copy frame into the slot for seq and return a view of it. Single producer only.
+
+        annotate, if given, is called with the slot view to draw on it in place
+        before the slot is marked consistent.
+        """
+        slot = seq % self.slots
+        header = self._slot_headers[slot]
+        header[0] += 1  # odd: write in progress
+        shape = frame.shape if frame.ndim == 3 else frame.shape + (1,)
+        view = self._view(slot, shape)
+        view[...] = frame.reshape(shape)
+        if frame.ndim == 2:
+            view = view[..., 0]
+        if annotate is not None:
+            annotate(view)
+        header[1:] = (seq, int((frame_time or time.time()) * 1e9)) + shape
+        header[0] += 1  # even: slot is consistent
+        self._header[0] = seq
+        return view
+
+    def _view(self, slot, shape):
+        count = shape[0] * shape[1] * shape[2]
+        return self._data[slot, :count].reshape(shape)
+
+    @property
+    def latest_seq(self):
+        return int(self._header[0])
+
+    @property
+    def last_read(self):
+        """Wall-clock time of the most recent read() from any process, or None"""
+        ring_header = self._header
+        if ring_header is None:
+            return None
+        read_ns = int(ring_header[3])
+        return read_ns / 1e9 if read_ns else None
+
+    def read(self, seq=None, mark_read=True):
+        """Zero-copy (seq, time, frame view) for seq (default: the latest), or None.
+
+        None means the slot is being written or already holds another frame.
+        mark_read=False leaves last_read alone, for readers that are not viewers.
+        """
+        ring_header, headers = self._header, self._slot_headers
+        if headers is None:
+            return None
+        seq = int(ring_header[0]) if seq is None else seq
+        if mark_read:
+            ring_header[3] = time.time_ns()
+        if seq <= 0:
+            return None
+        slot = seq % self.slots
+        header = headers[slot]
+        version = int(header[0])
+        if version % 2 or int(header[1]) != seq:
+            return None
+        height, width, channels = (int(v) for v in header[3:6])
+        frame_time = int(header[2]) / 1e9
+        view = self._view(slot, (height, width, channels))
+        if channels == 1:
+            view = view[..., 0]
+        if int(header[0]) != version:
+            return None
+        return seq, frame_time, view
+
+    def holds(self, seq):
+        """True while seq's slot is consistent and has not been reused for a newer frame"""
+        headers = self._slot_headers
+        if headers is None:
+            return True  # closed: nothing will overwrite the slot any more
+        header = headers[seq % self.slots]
+        return int(header[0]) % 2 == 0 and int(header[1]) == seq
+
+    def close(self):
+        # Drop the views before closing, or the mmap refuses to close
+        self._header = self._slot_headers = self._data = None
+        if self.shm is None:
+            return
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # frame views are still alive; the mapping goes away with them
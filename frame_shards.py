@@ -0,0 +1,145 @@
+import os
+import re
+from datetime import datetime
+
+from db_models import db, Frame
+from storage_profiles import is_frame_file
+
+# Live camera frames are stored as <REALTIME_FOLDER>/camera_N/YYYY/MM/DD/HH/frame_<timestamp>.<ext>
+SHARD_FORMATS = ("%Y", "%m", "%d", "%H")
+CAMERA_FOLDER_PATTERN = re.compile(r'^camera_\d+$')
+FRAME_TIMESTAMP_PATTERN = re.compile(r'^frame_(\d{8}_\d{6})')
+
+def shard_folder(base_folder, camera_index, when):
+    """Folder a camera frame captured at `when` is saved into"""
+    return os.path.join(base_folder, f"camera_{camera_index}", *(when.strftime(fmt) for fmt in SHARD_FORMATS))
+
+def frame_time(filename):
+    """Capture time encoded in a saved frame's filename, or None"""
+    match = FRAME_TIMESTAMP_PATTERN.match(filename)
+    if not match:
+        return None
+    try:
+        return datetime.strptime(match.group(1), '%Y%m%d_%H%M%S')
+    except ValueError:
+        return None
+
+def shard_start(path):
+    """Start of the period a shard folder (camera_N/YYYY[/MM[/DD[/HH]]]) covers, or None"""
+    parts = os.path.normpath(path).split(os.sep)
+    digits = []
+    while parts and parts[-1].isdigit() and len(digits) < len(SHARD_FORMATS):
+        digits.insert(0, parts.pop())
+    if not digits or not parts or not CAMERA_FOLDER_PATTERN.match(parts[-1]):
+        return None
+    try:
+        return datetime.strptime('/'.join(digits), '/'.join(SHARD_FORMATS[:len(digits)]))
+    except ValueError:
+        return None
+
+def _subfolders(folder, newest_first):
+    try:
+        with os.scandir(folder) as entries:
+            names = [entry.name for entry in entries if entry.is_dir() and entry.name.isdigit()]
+    except OSError:
+        return []
+    return [os.path.join(folder, name) for name in sorted(names, reverse=newest_first)]
+
+def _frame_files(folder, newest_first):
+    try:
+        with os.scandir(folder) as entries:
+            names = [entry.name for entry in entries if entry.is_file() and is_frame_file(entry.name)]
+    except OSError:
+        return []
+    return [os.path.join(folder, name) for name in sorted(names, reverse=newest_first)]
+
+def iter_frame_files(camera_folder, newest_first=True):
+    """Yield a camera's saved frame paths in capture order, one shard at a time.
+
+    Only the shards actually reached are listed, so taking the newest N
+    frames touches a handful of hour folders however much history is kept.
+    Frames left in the flat pre-shard layout count as older than any shard.
+    """
+    if not newest_first:
+        yield from _frame_files(camera_folder, newest_first)
+
+    def walk(folder, depth):
+        if depth == len(SHARD_FORMATS):
+            yield from _frame_files(folder, newest_first)
+            return
+        for subfolder in _subfolders(folder, newest_first):
+            yield from walk(subfolder, depth + 1)
+    yield from walk(camera_folder, 0)
+    if newest_first:
+        yield from _frame_files(camera_folder, newest_first)
+
+def migrate_flat_frames(base_folder, batch_size=1000, dry_run=False, log=print):
+    """Move frames from flat camera_N folders into date shards and repoint their Frame rows.
+
+    Files are moved a batch at a time and each batch's rows are committed
+    before the next, so an interrupted run can simply be started again.
+    Returns the number of files moved.
+    """
+    moved = 0
+    if not os.path.isdir(base_folder):
+        return moved
+    for camera_name in sorted(os.listdir(base_folder)):
+        camera_folder = os.path.join(base_folder, camera_name)
+        if not CAMERA_FOLDER_PATTERN.match(camera_name) or not os.path.isdir(camera_folder):
+            continue
+        with os.scandir(camera_folder) as entries:
+            filenames = sorted(entry.name for entry in entries if entry.is_file())
+        count = 0
+        for start in range(0, len(filenames), batch_size):
+            count += _migrate_batch(camera_folder, filenames[start:start + batch_size], dry_run)
+        log(f"{camera_name}: {'would move' if dry_run else 'moved'} {count} files")
+        moved += count
+    return moved
+
+def _migrate_batch(camera_folder, filenames, dry_run):
+    moves = {}
+    for filename in filenames:
+        path = os.path.join(camera_folder, filename)
+        when = frame_time(filename)
+        if when is None:
+            try:
+                when = datetime.fromtimestamp(os.path.getmtime(path))
+            except OSError:
+                continue
+        target = os.path.join(camera_folder, *(when.strftime(fmt) for fmt in SHARD_FORMATS), filename)
+        moves[path] = target
+    if dry_run or not moves:
+        return len(moves)
+    done = []
+    try:
+        for path, target in moves.items():
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(path, target)
+            done.append((path, target))
+        targets = {os.path.normpath(path): target for path, target in moves.items()}
+        stored = _stored_variants(moves)
+        # A sidecar thumbnail can land in a different batch from its frame
+        for column in (Frame.image_path, Frame.thumbnail_path):
+            rows = db.session.query(Frame.id, column).filter(column.in_(stored)).all()
+            for frame_id, path in rows:
+                Frame.query.filter_by(id=frame_id).update(
+                    {column.key: targets[os.path.normpath(path)]}, synchronize_session=False
+                )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        # Put the files back so the rows still point at them
+        for path, target in reversed(done):
+            try:
+                os.replace(target, path)
+            except OSError:
+                pass
+        raise
+    return len(done)
+
+def _stored_variants(moves):
+    """The old paths as Frame rows may have stored them (as joined, normalised or with / separators)"""
+    variants = set()
+    for path in moves:
+        variants.update((path, os.path.normpath(path), path.replace('\\', '/')))
+    return list(variants)
@@ -0,0 +1,316 @@
+import logging
+import os
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger("image_writer")
+
+def fit_within(image, max_dim):
+    """image downscaled so its longer side is at most max_dim (0 = no limit), and the scale used"""
+    height, width = image.shape[:2]
+    if not max_dim or max(height, width) <= max_dim:
+        return image, 1.0
+    scale = max_dim / max(height, width)
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA), scale
+
+class WriteTracker:
+    """Counts one submitter's frames still in the writer pool, so it can wait for just those"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.pending = 0
+
+    def add(self):
+        with self._cond:
+            self.pending += 1
+
+    def done(self):
+        with self._cond:
+            self.pending -= 1
+            if self.pending <= 0:
+                self._cond.notify_all()
+
+    def wait(self, timeout=None):
+        """Block until every tracked frame is written and durable (or failed); False on timeout"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.pending <= 0, timeout)
+
+class ImageWriterPool:
+    """Encodes and writes saved frames on a few background threads.
+
+    submit() hands a frame to a bounded queue and returns at once; capture
+    and inference threads never wait on JPEG encoding or the disk. When the
+    queue is full the frame is dropped, or with IMAGE_WRITER_POLICY=block
+    the caller waits up to IMAGE_WRITER_BLOCK_SECONDS first. Each worker
+    writes to a temporary file and fsyncs in batches of up to
+    IMAGE_WRITER_FSYNC_BATCH files (or after IMAGE_WRITER_FSYNC_SECONDS),
+    then renames the files into place, syncs their directories and only
+    then calls each job's on_durable callback, so the DB never points at a
+    file a power cut can lose. Drops and failed writes are counted. A
+    submitter that needs its own frames on disk passes a WriteTracker and
+    waits on it, instead of on every other camera's queued frames.
+    """
+
+    def __init__(self, app=None):
+        self.threads = 2
+        self.queue_size = 32
+        self.policy = "drop"
+        self.block_seconds = 5.0
+        self.fsync_batch = 8
+        self.fsync_seconds = 1.0
+        self._queue = None
+        self._workers = []
+        self._start_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._buffers = {}  # (shape, dtype) -> idle copy buffers
+        self.metrics = {
+            "submitted": 0,
+            "written": 0,
+            "dropped": 0,
+            "failed": 0,
+            "bytes_written": 0,
+            "fsync_batches": 0,
+            "buffer_allocs": 0,
+            "last_error": None,
+        }
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.threads = app.config['IMAGE_WRITER_THREADS']
+        self.queue_size = app.config['IMAGE_WRITER_QUEUE_SIZE']
+        self.policy = app.config['IMAGE_WRITER_POLICY']
+        self.block_seconds = app.config['IMAGE_WRITER_BLOCK_SECONDS']
+        self.fsync_batch = app.config['IMAGE_WRITER_FSYNC_BATCH']
+        self.fsync_seconds = app.config['IMAGE_WRITER_FSYNC_SECONDS']
+        app.extensions['image_writer'] = self
+
+    def _start(self):
+        with self._start_lock:
+            if self._queue is None:
+                self._queue = queue.Queue(maxsize=self.queue_size)
+            self._workers = [worker for worker in self._workers if worker.is_alive()]
+            while len(self._workers) < self.threads:
+                worker = threading.Thread(target=self._run, daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.metrics[key] += amount
+
+    def _record_error(self, message):
+        with self._lock:
+            self.metrics["failed"] += 1
+            self.metrics["last_error"] = message
+        logger.error(message)
+
+    def _acquire(self, image):
+        """A private copy of image, in a recycled buffer when one of the same shape is idle"""
+        key = (image.shape, image.dtype.str)
+        with self._lock:
+            idle = self._buffers.get(key)
+            buffer = idle.pop() if idle else None
+            if buffer is None:
+                self.metrics["buffer_allocs"] += 1
+        if buffer is None:
+            buffer = np.empty_like(image)
+        np.copyto(buffer, image)
+        return buffer
+
+    def _release(self, buffer):
+        key = (buffer.shape, buffer.dtype.str)
+        with self._lock:
+            idle = self._buffers.setdefault(key, [])
+            if len(idle) < self.queue_size + self.threads:
+                idle.append(buffer)
+
+    def submit(self, path, image, params=None, on_durable=None, copy=True, block=None, profile=None, tracker=None):
+        """Queue image to be encoded into path (format from its extension).
+
+        With a StorageProfile, the image is resized and encoded as the
+        profile says and its sidecar thumbnail is written too; otherwise
+        params are passed to cv2.imencode. on_durable(path, file_size) runs
+        on a writer thread once every file is on disk, with file_size
+        covering the thumbnail as well. Pass copy=False only if the caller
+        never touches image again. block=True waits for queue room however
+        long it takes and block=False never waits; by default the
+        configured policy applies. tracker, a WriteTracker, counts the job
+        until it is durable or has failed. Returns False if the frame was dropped.
+        """
+        self._start()
+        self._count("submitted")
+        timeout = None
+        if block is None:
+            block = self.policy == "block"
+            timeout = self.block_seconds if self.block_seconds > 0 else None
+        job = (path, self._acquire(image) if copy else image, copy, params or [], profile, on_durable, tracker)
+        if tracker is not None:
+            tracker.add()
+        try:
+            if block:
+                self._queue.put(job, timeout=timeout)
+            else:
+                self._queue.put_nowait(job)
+            return True
+        except queue.Full:
+            if copy:
+                self._release(job[1])
+            if tracker is not None:
+                tracker.done()
+            self._count("dropped")
+            logger.warning(f"Image writer queue full, dropped {path}")
+            return False
+
+    @staticmethod
+    def _write(path, image, params):
+        """Encode and write image to a temporary file; returns (path, tmp_path, fd, size)"""
+        ok, buffer = cv2.imencode(os.path.splitext(path)[1] or '.jpg', image, params)
+        if not ok:
+            raise ValueError("encoder returned no data")
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            view = memoryview(buffer)
+            while view:
+                view = view[os.write(fd, view):]
+        except BaseException:
+            os.close(fd)
+            os.remove(tmp_path)
+            raise
+        return path, tmp_path, fd, buffer.nbytes
+
+    def _write_job(self, path, image, params, profile):
+        """Write a job's files to temporary paths; the thumbnail, if any, goes first"""
+        if profile is None:
+            return [self._write(path, image, params)]
+        image, thumbnail = profile.prepare(image)
+        files = []
+        try:
+            if thumbnail is not None:
+                files.append(self._write(profile.thumbnail_path(path), thumbnail, profile.params))
+            files.append(self._write(path, image, profile.params))
+        except BaseException:
+            self._discard(files)
+            raise
+        return files
+
+    @staticmethod
+    def _discard(files):
+        for _, tmp_path, fd, _ in files:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _sync(self, pending):
+        """Make a batch of written jobs durable, then report them"""
+        done, folders = [], set()
+        for path, files, on_durable, tracker in pending:
+            error = None
+            for _, _, fd, _ in files:
+                try:
+                    try:
+                        os.fsync(fd)
+                    finally:
+                        os.close(fd)
+                except OSError as e:
+                    error = error or e
+            try:
+                for file_path, tmp_path, _, _ in ([] if error else files):
+                    os.replace(tmp_path, file_path)
+                    folders.add(os.path.dirname(file_path) or '.')
+            except OSError as e:
+                error = e
+            if error is not None:
+                for _, tmp_path, _, _ in files:
+                    try:
+                        os.remove(tmp_path)
+                    except OSError:
+                        pass
+                self._record_error(f"Failed to write {path}: {error}")
+                if tracker is not None:
+                    tracker.done()
+                continue
+            done.append((path, sum(file[3] for file in files), on_durable, tracker))
+        for folder in folders:
+            # The renames are only durable once their directory entries are
+            try:
+                dir_fd = os.open(folder, os.O_RDONLY)
+                try:
+                    os.fsync(dir_fd)
+                finally:
+                    os.close(dir_fd)
+            except OSError:
+                pass  # not supported on every platform/filesystem
+        self._count("fsync_batches")
+        for path, size, on_durable, tracker in done:
+            self._count("written")
+            self._count("bytes_written", size)
+            if on_durable is not None:
+                try:
+                    on_durable(path, size)
+                except Exception as e:
+                    logger.exception(f"Error in image writer callback for {path}: {e}")
+            if tracker is not None:
+                tracker.done()
+
+    def _run(self):
+        pending = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                path, image, pooled, params, profile, on_durable, tracker = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                idle = True
+            else:
+                idle = False
+                try:
+                    pending.append((path, self._write_job(path, image, params, profile), on_durable, tracker))
+                    if deadline is None:
+                        deadline = time.monotonic() + self.fsync_seconds
+                except Exception as e:
+                    self._record_error(f"Failed to write {path}: {e}")
+                    if tracker is not None:
+                        tracker.done()
+                    self._queue.task_done()
+                finally:
+                    if pooled:
+                        self._release(image)
+            # Queued jobs count as done for flush() only once their batch is synced
+            if pending and (idle or len(pending) >= self.fsync_batch or time.monotonic() >= deadline):
+                batch, pending, deadline = pending, [], None
+                self._sync(batch)
+                for _ in batch:
+                    self._queue.task_done()
+
+    def flush(self, tracker=None):
+        """Block until every queued frame (or, with a tracker, every frame it tracks) is written and durable (or failed)"""
+        if tracker is not None:
+            tracker.wait()
+        elif self._queue is not None:
+            self._queue.join()
+
+    def stats(self):
+        with self._lock:
+            metrics = dict(self.metrics)
+        metrics.update(
+            queued=self._queue.qsize() if self._queue is not None else 0,
+            queue_size=self.queue_size,
+            policy=self.policy,
+            threads=len([worker for worker in self._workers if worker.is_alive()]),
+        )
+        return metrics
+
+image_writer = ImageWriterPool()
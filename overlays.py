@@ -0,0 +1,96 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import cv2
+from flask import Response, request
+
+from analyzer import Analyzer
+from db_models import DetectedObject
+
+class OverlayRenderer:
+    """Draws detection overlays onto raw saved frames when they are requested.
+
+    Frames saved with FRAME_STORAGE_MODE=raw have no boxes burned in; their
+    DetectedObject rows hold the boxes in captured-frame pixels and
+    Frame.image_scale says how much smaller the stored image is. The
+    rendered JPEGs are kept in an LRU cache keyed by frame id and file
+    mtime, so paging back and forth through frames renders each one once.
+    """
+
+    def __init__(self, app=None):
+        self.max_entries = 64
+        self.quality = 90
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (frame_id, mtime) -> entry dict
+        self.metrics = {"renders": 0, "hits": 0, "evictions": 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_entries = app.config['OVERLAY_CACHE_SIZE']
+        self.quality = app.config['OVERLAY_JPEG_QUALITY']
+        app.extensions['overlays'] = self
+
+    def _render(self, frame, path):
+        image = cv2.imread(path)
+        if image is None:
+            return None
+        objects = [
+            {
+                "name": obj.object_name,
+                "confidence": obj.probability,
+                "box": None if obj.x_min is None else (obj.x_min, obj.y_min, obj.x_max, obj.y_max),
+            }
+            for obj in DetectedObject.query.filter_by(frame_id=frame.id).order_by(DetectedObject.id)
+        ]
+        Analyzer.draw_overlay(image, objects, timestamp=frame.timestamp, scale=frame.image_scale or 1.0)
+        ret, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ret:
+            return None
+        return buffer.tobytes()
+
+    def render(self, frame, path):
+        """Cached overlay entry (jpeg, etag, last_modified) for a raw frame, or None if unreadable"""
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        key = (frame.id, mtime)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.metrics["hits"] += 1
+                return entry
+        jpeg = self._render(frame, path)
+        if jpeg is None:
+            return None
+        entry = {
+            "jpeg": jpeg,
+            "etag": hashlib.sha1(jpeg).hexdigest(),
+            "last_modified": datetime.fromtimestamp(int(mtime), timezone.utc),
+        }
+        with self._lock:
+            self.metrics["renders"] += 1
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.metrics["evictions"] += 1
+        return entry
+
+    def stats(self):
+        with self._lock:
+            return dict(self.metrics, entries=len(self._entries), max_entries=self.max_entries)
+
+def overlay_response(entry):
+    """JPEG response for a rendered overlay; answers 304 when the client's validators still match"""
+    response = Response(entry["jpeg"], mimetype='image/jpeg')
+    response.set_etag(entry["etag"])
+    response.last_modified = entry["last_modified"]
+    response.headers['Cache-Control'] = 'private, max-age=3600'
+    return response.make_conditional(request)
+
+overlay_renderer = OverlayRenderer()
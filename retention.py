@@ -0,0 +1,324 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_
+
+from db_models import db, Frame, Clip, Video
+from rollups import prune_buckets
+from analysis_cache import analysis_cache
+from uploads import upload_manager
+from storage import FRAME_ROW_COLUMNS, CLIP_ROW_COLUMNS, delete_frames, delete_clips, storage_manager
+from frame_shards import shard_start
+
+class RetentionEngine:
+    """Deletes expired frames and orphaned files in small, throttled batches.
+
+    Expired Frame rows are selected through the timestamp index a chunk at a
+    time, removed with set-based DELETEs and committed per chunk so the camera
+    writers are never locked out for long. Orphaned files are found by
+    comparing one set of tracked paths against a directory scan instead of
+    querying the database per file; date-sharded camera folders newer than
+    the cutoff are never listed.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._thread = None
+        self.remote = None  # analyzer daemon client when another process runs retention
+        self._stop_event = threading.Event()
+        self._run_event = threading.Event()
+        self._run_lock = threading.Lock()
+        self.metrics = {
+            "runs": 0,
+            "running": False,
+            "last_run_started": None,
+            "last_run_duration": None,
+            "last_cutoff": None,
+            "rows_deleted": 0,
+            "clips_deleted": 0,
+            "cache_entries_deleted": 0,
+            "uploads_purged": 0,
+            "objects_deleted": 0,
+            "files_deleted": 0,
+            "orphans_deleted": 0,
+            "folders_removed": 0,
+            "bytes_reclaimed": 0,
+            "errors": 0,
+            "last_error": None,
+        }
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['retention'] = self
+
+    @property
+    def chunk_size(self):
+        return self.app.config['RETENTION_CHUNK_SIZE']
+
+    @property
+    def throttle(self):
+        return self.app.config['RETENTION_THROTTLE_SECONDS']
+
+    def start(self):
+        """Start the scheduler thread (no-op if already running)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._schedule_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._run_event.set()
+
+    def trigger(self):
+        """Ask the scheduler thread to run as soon as possible"""
+        if self.remote is not None:
+            return self.remote.call('retention.trigger')
+        self._run_event.set()
+
+    def _schedule_loop(self):
+        while not self._stop_event.is_set():
+            self._run_event.wait(self.app.config['RETENTION_INTERVAL_SECONDS'])
+            self._run_event.clear()
+            if self._stop_event.is_set():
+                break
+            try:
+                with self.app.app_context():
+                    self.run_once()
+            except Exception as e:
+                self.app.logger.error(f"Error in retention task: {e}")
+
+    def _pause(self):
+        """Yield to camera writers between batches"""
+        if self.throttle > 0:
+            self._stop_event.wait(self.throttle)
+
+    def _record_error(self, message):
+        self.metrics["errors"] += 1
+        self.metrics["last_error"] = message
+        self.app.logger.error(message)
+
+    def _remove_file(self, path):
+        """Delete a file and return the bytes reclaimed, or None if nothing was deleted"""
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            return size
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            self._record_error(f"Failed to delete file {path}: {e}")
+            return None
+
+    def run_once(self, now=None):
+        """Run one full retention pass. Must be called inside an app context."""
+        if not self._run_lock.acquire(blocking=False):
+            self.app.logger.info("Retention pass already in progress, skipping")
+            return self.metrics
+        try:
+            now = now or datetime.now()
+            retention_days = self.app.config["FILE_RETENTION_DAYS"]
+            cutoff = now - timedelta(days=retention_days)
+            started = time.time()
+            self.metrics["running"] = True
+            self.metrics["last_run_started"] = now.strftime('%Y-%m-%d %H:%M:%S')
+            self.metrics["last_cutoff"] = cutoff.strftime('%Y-%m-%d %H:%M:%S')
+            self.app.logger.info(f"Running retention pass. Retention: {retention_days} days.")
+
+            folders_to_check = set()
+            rows, files, reclaimed = self.purge_expired_frames(cutoff, folders_to_check)
+            clips, clip_bytes = self.purge_expired_clips(cutoff, folders_to_check)
+            files += clips
+            reclaimed += clip_bytes
+            orphans, orphan_bytes = self.sweep_orphans(cutoff, folders_to_check)
+            removed = self.remove_empty_folders(folders_to_check)
+            try:
+                prune_buckets(cutoff)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                self._record_error(f"Error pruning detection rollup buckets: {e}")
+            try:
+                self.metrics["cache_entries_deleted"] += analysis_cache.purge(cutoff)
+            except Exception as e:
+                db.session.rollback()
+                self._record_error(f"Error purging analysis cache entries: {e}")
+            try:
+                self.metrics["uploads_purged"] += upload_manager.purge(cutoff)
+            except Exception as e:
+                db.session.rollback()
+                self._record_error(f"Error purging stale upload sessions: {e}")
+
+            duration = time.time() - started
+            self.metrics["runs"] += 1
+            self.metrics["last_run_duration"] = round(duration, 3)
+            self.app.logger.info(
+                f"Retention pass done in {duration:.1f}s: {rows} frame rows, {clips} clips, {files + orphans} files "
+                f"({orphans} orphaned), {removed} folders, {(reclaimed + orphan_bytes) / 1_048_576:.1f} MB reclaimed"
+            )
+            return self.metrics
+        finally:
+            self.metrics["running"] = False
+            self._run_lock.release()
+
+    def purge_expired_frames(self, cutoff, folders_to_check=None):
+        """Delete Frame rows (and their files) older than cutoff, one chunk per transaction"""
+        total_rows = total_files = total_bytes = 0
+        while not self._stop_event.is_set():
+            try:
+                # Frames of an analysis a recent upload reused (Video.last_used) are kept
+                chunk = db.session.query(*FRAME_ROW_COLUMNS).outerjoin(Video, Video.id == Frame.video_id).filter(
+                    Frame.timestamp < cutoff,
+                    or_(Video.last_used.is_(None), Video.last_used < cutoff)
+                ).order_by(Frame.timestamp).limit(self.chunk_size).all()
+            except Exception as e:
+                db.session.rollback()
+                self._record_error(f"Error selecting expired frames: {e}")
+                break
+            if not chunk:
+                break
+            stats = delete_frames(chunk)
+            for error in stats["errors"]:
+                self._record_error(error)
+            if not stats["rows"]:
+                break
+            if folders_to_check is not None:
+                folders_to_check.update(stats["folders"])
+            total_rows += stats["rows"]
+            total_files += stats["files"]
+            total_bytes += stats["bytes"]
+            self.metrics["rows_deleted"] += stats["rows"]
+            self.metrics["objects_deleted"] += stats["objects"]
+            self.metrics["files_deleted"] += stats["files"]
+            self.metrics["bytes_reclaimed"] += stats["bytes"]
+            self.app.logger.debug(f"Retention chunk: {stats['rows']} frames, {stats['objects']} objects, {stats['files']} files")
+            if len(chunk) < self.chunk_size:
+                break
+            self._pause()
+        return total_rows, total_files, total_bytes
+
+    def purge_expired_clips(self, cutoff, folders_to_check=None):
+        """Delete event clips that ended before cutoff, one chunk per transaction"""
+        total_clips = total_bytes = 0
+        while not self._stop_event.is_set():
+            try:
+                chunk = db.session.query(*CLIP_ROW_COLUMNS).filter(
+                    Clip.end_time < cutoff
+                ).order_by(Clip.start_time).limit(self.chunk_size).all()
+            except Exception as e:
+                db.session.rollback()
+                self._record_error(f"Error selecting expired clips: {e}")
+                break
+            if not chunk:
+                break
+            stats = delete_clips(chunk)
+            for error in stats["errors"]:
+                self._record_error(error)
+            if not stats["rows"]:
+                break
+            if folders_to_check is not None:
+                folders_to_check.update(stats["folders"])
+            total_clips += stats["rows"]
+            total_bytes += stats["bytes"]
+            self.metrics["clips_deleted"] += stats["rows"]
+            self.metrics["files_deleted"] += stats["files"]
+            self.metrics["bytes_reclaimed"] += stats["bytes"]
+            if len(chunk) < self.chunk_size:
+                break
+            self._pause()
+        return total_clips, total_bytes
+
+    def tracked_paths(self):
+        """Set of normalised image, thumbnail and clip paths referenced by Frame and Clip rows"""
+        paths = db.session.query(Frame.image_path, Frame.thumbnail_path).filter(
+            Frame.image_path.isnot(None)
+        ).execution_options(yield_per=5000)
+        tracked = set()
+        for image_path, thumbnail_path in paths:
+            tracked.add(os.path.normpath(image_path))
+            if thumbnail_path:
+                tracked.add(os.path.normpath(thumbnail_path))
+        for (path,) in db.session.query(Clip.path).execution_options(yield_per=5000):
+            tracked.add(os.path.normpath(path))
+        return tracked
+
+    def _scan_folders(self):
+        return [self.app.config['VIDEOS_FOLDER'], self.app.config['OUTPUT_FOLDER']]
+
+    @staticmethod
+    def _after_cutoff(folder, cutoff):
+        start = shard_start(folder)
+        return start is not None and start >= cutoff
+
+    def sweep_orphans(self, cutoff, folders_to_check=None):
+        """Delete untracked files whose modification time is older than cutoff"""
+        tracked = self.tracked_paths()
+        cutoff_ts = cutoff.timestamp()
+        videos_folder = os.path.normpath(self.app.config['VIDEOS_FOLDER'])
+        orphans = reclaimed = scanned = 0
+        for folder in self._scan_folders():
+            if not os.path.exists(folder):
+                self.app.logger.warning(f"Retention: folder {folder} does not exist")
+                continue
+            for root, dirs, files in os.walk(folder):
+                if self._stop_event.is_set():
+                    return orphans, reclaimed
+                # Nothing saved into a date shard that starts after the cutoff can be old enough yet
+                dirs[:] = [name for name in sorted(dirs) if not self._after_cutoff(os.path.join(root, name), cutoff)]
+                for filename in files:
+                    file_path = os.path.join(root, filename)
+                    scanned += 1
+                    if scanned % self.chunk_size == 0:
+                        self._pause()
+                    if os.path.normpath(file_path) in tracked:
+                        continue
+                    try:
+                        if os.path.getmtime(file_path) >= cutoff_ts:
+                            continue
+                    except OSError:
+                        continue
+                    size = self._remove_file(file_path)
+                    if size is None:
+                        continue
+                    orphans += 1
+                    reclaimed += size
+                    if os.path.normpath(root) == videos_folder:
+                        storage_manager.release_upload(filename, size)
+                    if folders_to_check is not None:
+                        folders_to_check.add(root)
+        self.metrics["orphans_deleted"] += orphans
+        self.metrics["bytes_reclaimed"] += reclaimed
+        return orphans, reclaimed
+
+    def remove_empty_folders(self, folders_to_check):
+        """Remove now-empty folders, deepest first, never touching the base folders"""
+        base_folders = {os.path.normpath(folder) for folder in self._scan_folders()}
+        removed = 0
+        for folder in sorted(folders_to_check, key=lambda x: x.count(os.sep), reverse=True):
+            folder = os.path.normpath(folder)
+            if not any(folder.startswith(base + os.sep) for base in base_folders):
+                continue
+            while folder not in base_folders:
+                try:
+                    if not os.path.isdir(folder) or os.listdir(folder):
+                        break
+                    os.rmdir(folder)
+                    removed += 1
+                except OSError as e:
+                    self._record_error(f"Error removing empty folder {folder}: {e}")
+                    break
+                folder = os.path.dirname(folder)
+        self.metrics["folders_removed"] += removed
+        return removed
+
+    def get_metrics(self):
+        if self.remote is not None:
+            return self.remote.call('retention.metrics')
+        return dict(self.metrics)
+
+retention_engine = RetentionEngine()
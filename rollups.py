@@ -0,0 +1,242 @@
+import re
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, update, insert
+from sqlalchemy.dialects import sqlite, postgresql
+
+from db_models import db, Video, Frame, DetectedObject, VideoObjectCount, CameraObjectBucket
+
+# Time bucket sizes maintained for every camera
+BUCKET_GRANULARITIES = {
+    'minute': timedelta(minutes=1),
+    'hour': timedelta(hours=1),
+}
+
+CAMERA_VIDEO_PATTERN = re.compile(r'^camera_(\d+)_live$')
+
+def camera_index_for_video(filename):
+    """Return the camera index encoded in a live camera video filename, or None"""
+    match = CAMERA_VIDEO_PATTERN.match(filename or '')
+    return int(match.group(1)) if match else None
+
+def bucket_start(timestamp, granularity):
+    """Truncate a timestamp to the start of its bucket"""
+    if granularity == 'minute':
+        return timestamp.replace(second=0, microsecond=0)
+    if granularity == 'hour':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    raise ValueError(f"Unknown bucket granularity: {granularity}")
+
+def _increment(model, keys, deltas):
+    """Add deltas to the rollup row identified by keys, creating it if missing.
+
+    Uses a native upsert on SQLite/PostgreSQL so concurrent camera writers never
+    race on the read-modify-write. Runs inside the caller's transaction.
+    """
+    table = model.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        dialect_insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        stmt = dialect_insert(table).values(**keys, **deltas)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys.keys()),
+            set_={name: table.c[name] + stmt.excluded[name] for name in deltas}
+        )
+        db.session.execute(stmt)
+        return
+    conditions = [table.c[name] == value for name, value in keys.items()]
+    result = db.session.execute(
+        update(table).where(*conditions).values(
+            **{name: table.c[name] + value for name, value in deltas.items()}
+        )
+    )
+    if result.rowcount == 0:
+        db.session.execute(insert(table).values(**keys, **deltas))
+
+def record_frame_detections(video_id, class_counts, camera_index=None, timestamp=None):
+    """Fold one frame's detections into the rollup tables.
+
+    class_counts maps object name -> number of detections in the frame. Call
+    this in the same transaction that inserts the Frame/DetectedObject rows so
+    the rollups can never drift from the raw data.
+    """
+    if not class_counts:
+        return
+    for object_name, count in class_counts.items():
+        _increment(
+            VideoObjectCount,
+            {'video_id': video_id, 'object_name': object_name},
+            {'object_count': count, 'frame_count': 1}
+        )
+    if camera_index is None:
+        return
+    timestamp = timestamp or datetime.now()
+    for granularity in BUCKET_GRANULARITIES:
+        start = bucket_start(timestamp, granularity)
+        for object_name, count in class_counts.items():
+            _increment(
+                CameraObjectBucket,
+                {
+                    'camera_index': camera_index,
+                    'object_name': object_name,
+                    'granularity': granularity,
+                    'bucket_start': start,
+                },
+                {'object_count': count, 'frame_count': 1}
+            )
+
+def _camera_videos(video_ids=None):
+    """video_id -> camera index for live camera videos (only the given ids, if passed)"""
+    query = Video.query.filter(Video.filename.like("camera_%_live"))
+    if video_ids is not None:
+        query = query.filter(Video.id.in_(video_ids))
+    camera_videos = {video.id: camera_index_for_video(video.filename) for video in query.all()}
+    return {vid: idx for vid, idx in camera_videos.items() if idx is not None}
+
+def _bucket_totals(per_frame, camera_videos):
+    """Fold (video_id, timestamp, object_name, count) per-frame rows into camera bucket totals"""
+    buckets = {}
+    for video_id, timestamp, object_name, count in per_frame:
+        for granularity in BUCKET_GRANULARITIES:
+            key = (camera_videos[video_id], object_name, granularity, bucket_start(timestamp, granularity))
+            totals = buckets.setdefault(key, [0, 0])
+            totals[0] += count
+            totals[1] += 1
+    return buckets
+
+def _per_frame_counts(video_ids):
+    """Detections per (frame, class) of the given videos' timestamped frames"""
+    return db.session.query(
+        Frame.video_id,
+        Frame.timestamp,
+        DetectedObject.object_name,
+        func.count(DetectedObject.id)
+    ).join(Frame, Frame.id == DetectedObject.frame_id).filter(
+        Frame.video_id.in_(video_ids),
+        Frame.timestamp.isnot(None)
+    ).group_by(Frame.id, DetectedObject.object_name)
+
+def discount_frames(frame_ids, chunk_size=500):
+    """Subtract the detections of frames that are about to be deleted from the video and camera rollups"""
+    frame_ids = list(frame_ids)
+    for offset in range(0, len(frame_ids), chunk_size):
+        chunk = frame_ids[offset:offset + chunk_size]
+        rows = db.session.query(
+            Frame.video_id,
+            DetectedObject.object_name,
+            func.count(DetectedObject.id),
+            func.count(func.distinct(DetectedObject.frame_id))
+        ).join(Frame, Frame.id == DetectedObject.frame_id).filter(
+            DetectedObject.frame_id.in_(chunk)
+        ).group_by(Frame.video_id, DetectedObject.object_name).all()
+        for video_id, object_name, object_count, frame_count in rows:
+            _increment(
+                VideoObjectCount,
+                {'video_id': video_id, 'object_name': object_name},
+                {'object_count': -object_count, 'frame_count': -frame_count}
+            )
+        camera_videos = _camera_videos({video_id for video_id, *_ in rows})
+        if not camera_videos:
+            continue
+        per_frame = _per_frame_counts(list(camera_videos)).filter(Frame.id.in_(chunk)).all()
+        for (camera_index, object_name, granularity, start), (objects, frames) in _bucket_totals(
+                per_frame, camera_videos).items():
+            _increment(
+                CameraObjectBucket,
+                {
+                    'camera_index': camera_index,
+                    'object_name': object_name,
+                    'granularity': granularity,
+                    'bucket_start': start,
+                },
+                {'object_count': -objects, 'frame_count': -frames}
+            )
+    VideoObjectCount.query.filter(VideoObjectCount.object_count <= 0).delete(synchronize_session=False)
+    CameraObjectBucket.query.filter(CameraObjectBucket.object_count <= 0).delete(synchronize_session=False)
+
+def prune_buckets(cutoff):
+    """Drop camera buckets whose whole window ended before the cutoff"""
+    deleted = 0
+    for granularity, width in BUCKET_GRANULARITIES.items():
+        deleted += CameraObjectBucket.query.filter(
+            CameraObjectBucket.granularity == granularity,
+            CameraObjectBucket.bucket_start <= cutoff - width
+        ).delete(synchronize_session=False)
+    return deleted
+
+def rebuild_rollups(batch_size=5000):
+    """Recompute every rollup table from the raw Frame/DetectedObject rows"""
+    VideoObjectCount.query.delete(synchronize_session=False)
+    CameraObjectBucket.query.delete(synchronize_session=False)
+
+    video_rows = db.session.query(
+        Frame.video_id,
+        DetectedObject.object_name,
+        func.count(DetectedObject.id),
+        func.count(func.distinct(DetectedObject.frame_id))
+    ).join(Frame, Frame.id == DetectedObject.frame_id).group_by(
+        Frame.video_id, DetectedObject.object_name
+    ).all()
+    db.session.bulk_insert_mappings(VideoObjectCount, [
+        {'video_id': video_id, 'object_name': name, 'object_count': objects, 'frame_count': frames}
+        for video_id, name, objects, frames in video_rows
+    ])
+
+    camera_videos = _camera_videos()
+    buckets = {}
+    if camera_videos:
+        per_frame = _per_frame_counts(list(camera_videos)).execution_options(yield_per=batch_size)
+        buckets = _bucket_totals(per_frame, camera_videos)
+    db.session.bulk_insert_mappings(CameraObjectBucket, [
+        {
+            'camera_index': camera_index,
+            'object_name': object_name,
+            'granularity': granularity,
+            'bucket_start': start,
+            'object_count': objects,
+            'frame_count': frames,
+        }
+        for (camera_index, object_name, granularity, start), (objects, frames) in buckets.items()
+    ])
+    db.session.commit()
+    return len(video_rows), len(buckets)
+
+def ensure_rollups():
+    """Build the rollups once for a database whose detections predate them"""
+    if VideoObjectCount.query.first() is not None or CameraObjectBucket.query.first() is not None:
+        return None
+    if DetectedObject.query.first() is None:
+        return None
+    return rebuild_rollups()
+
+def get_video_object_counts(video_id):
+    """Per-class detection totals for a video, most frequent first"""
+    rows = VideoObjectCount.query.filter_by(video_id=video_id).order_by(
+        VideoObjectCount.object_count.desc()
+    ).all()
+    return [
+        {"name": row.object_name, "count": row.object_count, "frames": row.frame_count}
+        for row in rows
+    ]
+
+def get_camera_timeline(camera_index, granularity='hour', since=None, until=None, object_names=None):
+    """Bucketed detection counts for one camera, oldest bucket first"""
+    if granularity not in BUCKET_GRANULARITIES:
+        raise ValueError(f"Unknown bucket granularity: {granularity}")
+    query = CameraObjectBucket.query.filter_by(camera_index=camera_index, granularity=granularity)
+    if since is not None:
+        query = query.filter(CameraObjectBucket.bucket_start >= bucket_start(since, granularity))
+    if until is not None:
+        query = query.filter(CameraObjectBucket.bucket_start < until)
+    if object_names:
+        query = query.filter(CameraObjectBucket.object_name.in_(object_names))
+    rows = query.order_by(CameraObjectBucket.bucket_start, CameraObjectBucket.object_name).all()
+    return [
+        {
+            "bucket_start": row.bucket_start.strftime('%Y-%m-%d %H:%M:%S'),
+            "object_name": row.object_name,
+            "object_count": row.object_count,
+            "frame_count": row.frame_count,
+        }
+        for row in rows
+    ]
@@ -0,0 +1,107 @@
+import base64
+from datetime import datetime
+
+from sqlalchemy import func, and_, or_
+
+from db_models import db, Video, Frame, DetectedObject
+from rollups import camera_index_for_video
+from camera_registry import camera_video_name
+
+MAX_PAGE_SIZE = 500
+
+def encode_cursor(timestamp, frame_id):
+    """Opaque keyset cursor for the (timestamp, id) position of the last result"""
+    raw = f"{timestamp.isoformat()}|{frame_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, frame_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(timestamp), int(frame_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def camera_video_ids(camera_indices=None):
+    """Map camera index -> live Video id for the requested cameras (all cameras when None)"""
+    query = db.session.query(Video.id, Video.filename)
+    if camera_indices:
+        query = query.filter(Video.filename.in_([camera_video_name(idx) for idx in camera_indices]))
+    else:
+        query = query.filter(Video.filename.like("camera_%_live"))
+    result = {}
+    for video_id, filename in query.all():
+        camera_index = camera_index_for_video(filename)
+        if camera_index is not None:
+            result[video_id] = camera_index
+    return result
+
+def search_detections(classes=None, cameras=None, start=None, end=None,
+                      min_confidence=0.0, min_count=1, limit=50, cursor=None):
+    """Find saved frames matching detection filters, newest first.
+
+    A frame matches when it has at least min_count detections of the given
+    classes with probability >= min_confidence. Results are paged with a
+    keyset cursor on (timestamp, id), so every page costs the same no matter
+    how deep it is. Returns (results, next_cursor).
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    videos = camera_video_ids(cameras)
+    if not videos:
+        return [], None
+
+    # Count matching detections per frame with a correlated subquery so the
+    # planner can walk frames in (timestamp, id) order and stop at the limit
+    match_filters = [DetectedObject.frame_id == Frame.id]
+    if classes:
+        match_filters.append(DetectedObject.object_name.in_(classes))
+    if min_confidence:
+        match_filters.append(DetectedObject.probability >= min_confidence)
+    matches = db.session.query(func.count(DetectedObject.id)).filter(
+        *match_filters
+    ).correlate(Frame).scalar_subquery()
+
+    query = db.session.query(
+        Frame.id, Frame.timestamp, Frame.video_id, Frame.frame_number, matches.label('matches')
+    ).filter(
+        Frame.video_id.in_(list(videos.keys())),
+        matches >= max(1, min_count)
+    )
+    if start is not None:
+        query = query.filter(Frame.timestamp >= start)
+    if end is not None:
+        query = query.filter(Frame.timestamp < end)
+    if cursor:
+        cursor_time, cursor_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            Frame.timestamp < cursor_time,
+            and_(Frame.timestamp == cursor_time, Frame.id < cursor_id)
+        ))
+    rows = query.order_by(Frame.timestamp.desc(), Frame.id.desc()).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    frame_objects = {}
+    if rows:
+        counts = db.session.query(
+            DetectedObject.frame_id, DetectedObject.object_name, func.count(DetectedObject.id)
+        ).filter(
+            DetectedObject.frame_id.in_([row.id for row in rows])
+        ).group_by(DetectedObject.frame_id, DetectedObject.object_name).all()
+        for frame_id, object_name, count in counts:
+            frame_objects.setdefault(frame_id, {})[object_name] = count
+
+    results = [
+        {
+            "frame_id": row.id,
+            "camera_index": videos[row.video_id],
+            "frame_number": row.frame_number,
+            "timestamp": row.timestamp.strftime('%Y-%m-%d %H:%M:%S') if row.timestamp else None,
+            "image_path": f"/api/frame-image/{row.id}",
+            "matches": row.matches,
+            "objects": frame_objects.get(row.id, {}),
+        }
+        for row in rows
+    ]
+    next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id) if has_more else None
+    return results, next_cursor
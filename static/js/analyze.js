@@ -78,9 +78,28 @@ document.addEventListener("DOMContentLoaded", function () {
     // Hide results if they were shown before
     resultsSection.style.display = "none";
 
+    const storageProfile = document.getElementById("storageProfile");
+    const profileName = storageProfile ? storageProfile.value : null;
+
+    // Chunked uploads need crypto.subtle for the chunk checksums (HTTPS or localhost)
+    if (window.crypto && window.crypto.subtle) {
+      uploadInChunks(selectedFile, profileName)
+        .then((data) => {
+          updateProgress(100);
+          setTimeout(() => displayResults(data), 500);
+        })
+        .catch((error) => {
+          showError("An error occurred during analysis: " + error.message);
+        });
+      return;
+    }
+
     // Create form data
     const formData = new FormData();
     formData.append("video", selectedFile);
+    if (profileName) {
+      formData.append("storage_profile", profileName);
+    }
 
     // Simulate progress updates (since we can't get real-time updates from the server easily)
     let progress = 0;
@@ -102,6 +121,10 @@ document.addEventListener("DOMContentLoaded", function () {
       })
       .then((data) => {
         updateProgress(100);
+        if (data.cached) {
+          statusMessage.innerHTML =
+            '<i class="fas fa-check-circle me-2"></i>This video was analyzed before; showing the stored results.';
+        }
         setTimeout(() => {
           if (data.status === "success") {
             displayResults(data);
@@ -116,6 +139,98 @@ document.addEventListener("DOMContentLoaded", function () {
       });
   });
 
+  const CHUNK_RETRIES = 5;
+  const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+  async function sha256Hex(buffer) {
+    const digest = await crypto.subtle.digest("SHA-256", buffer);
+    return Array.from(new Uint8Array(digest))
+      .map((b) => b.toString(16).padStart(2, "0"))
+      .join("");
+  }
+
+  // Upload in checksummed chunks, resuming from the server's offset after a failure,
+  // then wait for the analysis (which may already have started on the first fragments)
+  async function uploadInChunks(file, profileName) {
+    const created = await fetch("/api/uploads", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({
+        filename: file.name,
+        size: file.size,
+        storage_profile: profileName,
+      }),
+    }).then((response) => response.json());
+    if (created.status !== "success") {
+      throw new Error(created.message || "Could not start the upload");
+    }
+    const uploadUrl = `/api/uploads/${created.upload_id}`;
+    let offset = created.offset;
+    let failures = 0;
+    while (offset < file.size) {
+      const chunk = await file
+        .slice(offset, offset + created.chunk_size)
+        .arrayBuffer();
+      try {
+        const response = await fetch(`${uploadUrl}?offset=${offset}`, {
+          method: "PUT",
+          headers: {
+            "Content-Type": "application/octet-stream",
+            "X-Chunk-SHA256": await sha256Hex(chunk),
+          },
+          body: chunk,
+        });
+        const data = await response.json();
+        if (response.status === 409) {
+          offset = data.offset;
+          continue;
+        }
+        if (!response.ok) {
+          throw new Error(data.message || `Upload failed (${response.status})`);
+        }
+        offset = data.offset;
+        failures = 0;
+        updateUploadProgress(offset / file.size, data.analysis);
+      } catch (error) {
+        failures += 1;
+        if (failures > CHUNK_RETRIES) {
+          throw error;
+        }
+        await sleep(1000 * failures);
+        const status = await fetch(uploadUrl).then((response) => response.json());
+        if (status.status !== "success") {
+          throw new Error(status.message || "Upload was lost");
+        }
+        offset = status.offset;
+      }
+    }
+    let status = await fetch(`${uploadUrl}/complete`, { method: "POST" }).then(
+      (response) => response.json()
+    );
+    if (status.status !== "success") {
+      throw new Error(status.message || "Upload could not be completed");
+    }
+    let progress = 60;
+    while (status.state === "analyzing") {
+      await sleep(1000);
+      progress = Math.min(progress + Math.random() * 3, 95);
+      updateProgress(progress);
+      status = await fetch(uploadUrl).then((response) => response.json());
+    }
+    if (status.state !== "done") {
+      throw new Error(status.error || "Video analysis failed");
+    }
+    return { status: "success", video_id: status.video_id };
+  }
+
+  function updateUploadProgress(fraction, analysis) {
+    updateProgress(fraction * 60);
+    statusMessage.innerHTML =
+      analysis && analysis.frames_with_activity
+        ? `<i class="fas fa-spinner fa-spin me-2"></i>Uploading... ${analysis.frames_with_activity} frames with activity found so far`
+        : '<i class="fas fa-spinner fa-spin me-2"></i>Uploading video...';
+  }
+
   // Reset for new analysis
   newAnalysisBtn.addEventListener("click", () => {
     videoPreview.style.display = "none";
@@ -190,7 +305,7 @@ document.addEventListener("DOMContentLoaded", function () {
             const frameItem = document.createElement("div");
             frameItem.className = "frame-item";
             frameItem.innerHTML = `
-                                    <img src="${frame.image_path}" alt="Frame ${
+                                    <img src="${frame.thumbnail || frame.image_path}" alt="Frame ${
               frame.frame_number
             }">
                                     <div class="frame-info">
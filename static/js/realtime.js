@@ -21,46 +21,59 @@ document.addEventListener('DOMContentLoaded', function () {
         streamStatus.innerHTML = '<p class="text-danger">Error loading live stream. Is the analyzer running on the correct camera?</p>';
     };
 
+    // Latest known state per camera, fed by /api/events (or the status poll as a fallback)
+    let cameraStates = {};
+    let eventsConnected = false;
+
+    function renderAllCamerasStatus() {
+        const statusContainer = document.getElementById("all-cameras-status");
+        statusContainer.innerHTML = "";
+
+        if (Object.keys(cameraStates).length > 0) {
+            Object.entries(cameraStates).forEach(([camIdx, status]) => {
+                const isActive = status.status === "active";
+                const metrics = status.fps !== undefined
+                    ? `<p class="camera-metrics"><small>${status.fps} fps | ${status.latency_ms ?? '-'} ms detection</small></p>`
+                    : '';
+                const cameraCol = document.createElement("div");
+                cameraCol.className = "col-md-4 mb-3";
+                cameraCol.innerHTML = `
+                    <div class="card ${isActive ? "border-success" : "border-danger"}">
+                        <div class="card-header">
+                            Camera ${camIdx}
+                            <span class="badge bg-${isActive ? "success" : "danger"} float-end">
+                                ${isActive ? "Active" : "Inactive"}
+                            </span>
+                        </div>
+                        <div class="card-body">
+                            <p>Frames: ${status.frame_count || 0}</p>
+                            ${metrics}
+                            <button class="btn btn-sm btn-primary camera-view-btn" 
+                               data-camera-index="${camIdx}">View Stream</button>
+                        </div>
+                    </div>
+                `;
+                statusContainer.appendChild(cameraCol);
+            });
+
+            statusContainer.querySelectorAll(".camera-view-btn").forEach((btn) => {
+                btn.addEventListener("click", () => {
+                    const camIdx = btn.getAttribute("data-camera-index");
+                    switchCamera(camIdx);
+                });
+            });
+        } else {
+            statusContainer.innerHTML =
+                '<p class="text-muted">No camera analyzers are currently running.</p>';
+        }
+    }
+
     function updateAllCamerasStatus() {
         fetch("/api/analyzer/status?all=true")
             .then((res) => res.json())
             .then((data) => {
-                const statusContainer = document.getElementById("all-cameras-status");
-                statusContainer.innerHTML = "";
-
-                if (data.cameras && Object.keys(data.cameras).length > 0) {
-                    Object.entries(data.cameras).forEach(([camIdx, status]) => {
-                        const isActive = status.status === "active";
-                        const cameraCol = document.createElement("div");
-                        cameraCol.className = "col-md-4 mb-3";
-                        cameraCol.innerHTML = `
-                            <div class="card ${isActive ? "border-success" : "border-danger"}">
-                                <div class="card-header">
-                                    Camera ${camIdx}
-                                    <span class="badge bg-${isActive ? "success" : "danger"} float-end">
-                                        ${isActive ? "Active" : "Inactive"}
-                                    </span>
-                                </div>
-                                <div class="card-body">
-                                    <p>Frames: ${status.frame_count || 0}</p>
-                                    <button class="btn btn-sm btn-primary camera-view-btn" 
-                                       data-camera-index="${camIdx}">View Stream</button>
-                                </div>
-                            </div>
-                        `;
-                        statusContainer.appendChild(cameraCol);
-                    });
-
-                    document.querySelectorAll(".camera-view-btn").forEach((btn) => {
-                        btn.addEventListener("click", () => {
-                            const camIdx = btn.getAttribute("data-camera-index");
-                            switchCamera(camIdx);
-                        });
-                    });
-                } else {
-                    statusContainer.innerHTML =
-                        '<p class="text-muted">No camera analyzers are currently running.</p>';
-                }
+                cameraStates = data.cameras || {};
+                renderAllCamerasStatus();
             })
             .catch((err) => {
                 console.error("Error fetching all camera status:", err);
@@ -112,6 +125,41 @@ document.addEventListener('DOMContentLoaded', function () {
             });
     }
 
+    function createFrameItem(frame, source) {
+        const frameItem = document.createElement('div');
+        frameItem.className = 'frame-item card mb-2';
+
+        let objectsHtml = '';
+        if (frame.objects && Array.isArray(frame.objects) && frame.objects.length > 0) {
+            objectsHtml = '<div class="mt-1">' + frame.objects.map(obj =>
+                `<span class="badge bg-secondary me-1">${obj}</span>`).join('') + '</div>';
+        }
+
+        const imagePath = frame.path || '/static/placeholder.png';
+        const cameraInfo = `Camera ${frame.camera_index}`;
+
+        frameItem.innerHTML = `
+            <img src="${frame.thumbnail || imagePath}" class="card-img-top frame-thumb" alt="Frame ${frame.id || frame.filename || ''}">
+            <div class="card-body p-2">
+                <p class="card-text mb-1">
+                    <span class="badge bg-primary me-1">${cameraInfo}</span>
+                    <small class="text-muted">${frame.timestamp || 'No timestamp'} (Frame ${frame.frame_number ?? 'N/A'})</small>
+                </p>
+                ${objectsHtml}
+            </div>`;
+
+        frameItem.addEventListener('click', () => {
+            modalImg.src = imagePath;
+            modalInfo.innerHTML = `
+                <h5>Camera ${frame.camera_index} - Captured: ${frame.timestamp || 'Unknown'}</h5>
+                <p>Source: ${source}</p>
+                <p>Objects Detected: ${frame.objects && frame.objects.length > 0 ? '' : 'None'}</p>
+                ${objectsHtml}`;
+            modal.style.display = 'flex';
+        });
+        return frameItem;
+    }
+
     function loadFrames() {
         loadingFrames.style.display = 'block';
         framesContainer.innerHTML = '';
@@ -134,38 +182,7 @@ document.addEventListener('DOMContentLoaded', function () {
                     }
 
                     data.frames.forEach(frame => {
-                        const frameItem = document.createElement('div');
-                        frameItem.className = 'frame-item card mb-2';
-
-                        let objectsHtml = '';
-                        if (frame.objects && Array.isArray(frame.objects) && frame.objects.length > 0) {
-                            objectsHtml = '<div class="mt-1">' + frame.objects.map(obj =>
-                                `<span class="badge bg-secondary me-1">${obj}</span>`).join('') + '</div>';
-                        }
-
-                        const imagePath = frame.path || '/static/placeholder.png';
-                        const cameraInfo = `Camera ${frame.camera_index}`;
-
-                        frameItem.innerHTML = `
-                            <img src="${imagePath}" class="card-img-top frame-thumb" alt="Frame ${frame.id || frame.filename || ''}">
-                            <div class="card-body p-2">
-                                <p class="card-text mb-1">
-                                    <span class="badge bg-primary me-1">${cameraInfo}</span>
-                                    <small class="text-muted">${frame.timestamp || 'No timestamp'} (Frame ${frame.frame_number ?? 'N/A'})</small>
-                                </p>
-                                ${objectsHtml}
-                            </div>`;
-
-                        frameItem.addEventListener('click', () => {
-                            modalImg.src = imagePath;
-                            modalInfo.innerHTML = `
-                                <h5>Camera ${frame.camera_index} - Captured: ${frame.timestamp || 'Unknown'}</h5>
-                                <p>Source: ${data.source}</p>
-                                <p>Objects Detected: ${frame.objects && frame.objects.length > 0 ? '' : 'None'}</p>
-                                ${objectsHtml}`;
-                            modal.style.display = 'flex';
-                        });
-                        framesContainer.appendChild(frameItem);
+                        framesContainer.appendChild(createFrameItem(frame, data.source));
                     });
                 } else {
                     framesContainer.innerHTML = `<p class="text-danger">Error loading frames: ${data.message || 'Unknown error'}</p>`;
@@ -481,14 +498,16 @@ function loadAllCameraFeedsWithOfflineOverlay() {
     const refreshCamerasBtn = document.getElementById('refresh-cameras-btn');
     const checkStatusBtn = document.getElementById('check-status-btn');
     let activeCameraFeeds = {};
+    const thumbnailEtags = {};
+    const thumbnailUrls = {};
+    const thumbnailTimers = {};
 
     function createCameraFeed(cameraIdx) {
         const cameraFeed = document.createElement('div');
         cameraFeed.className = 'camera-feed';
         cameraFeed.id = `camera-feed-${cameraIdx}`;
-        const timestamp = Date.now();
         cameraFeed.innerHTML = `
-            <img src="/api/camera-thumbnail/${cameraIdx}?t=${timestamp}" 
+            <img src="/api/camera-thumbnail/${cameraIdx}" 
                  alt="Camera ${cameraIdx}" 
                  class="camera-thumbnail"
                  data-camera-index="${cameraIdx}">
@@ -516,12 +535,23 @@ function loadAllCameraFeedsWithOfflineOverlay() {
         const streamModalImg = document.getElementById('stream-modal-image');
         streamModalTitle.textContent = `Camera ${cameraIdx} Live Stream`;
         const timestamp = Date.now();
-        streamModalImg.src = `/api/stream?camera_index=${cameraIdx}&t=${timestamp}`;
+        streamModalImg.src = `/api/stream?camera_index=${cameraIdx}&adaptive=1&t=${timestamp}`;
         const bootstrapModal = new bootstrap.Modal(streamModal);
         bootstrapModal.show();
         streamModal.dataset.cameraIndex = cameraIdx;
     };
 
+    // All cameras in one stream: a single connection and encode however many cameras there are
+    window.viewMosaicStream = function() {
+        const streamModal = document.getElementById('stream-modal');
+        document.getElementById('stream-modal-title').textContent = 'All Cameras';
+        document.getElementById('stream-modal-image').src = `/api/stream/mosaic?t=${Date.now()}`;
+        delete streamModal.dataset.cameraIndex;
+        new bootstrap.Modal(streamModal).show();
+    };
+
+    document.getElementById('mosaic-view-btn').addEventListener('click', viewMosaicStream);
+
     document.getElementById('stream-restart-btn').addEventListener('click', function() {
         const streamModal = document.getElementById('stream-modal');
         const cameraIdx = streamModal.dataset.cameraIndex;
@@ -542,7 +572,9 @@ function loadAllCameraFeedsWithOfflineOverlay() {
             overlay.innerHTML = `Camera ${cameraIdx} <span class="badge bg-success">Ready</span>`;
         }
         activeCameraFeeds[cameraIdx] = true;
-        setTimeout(() => {
+        // One pending refresh per camera, however many loads scheduled one
+        clearTimeout(thumbnailTimers[cameraIdx]);
+        thumbnailTimers[cameraIdx] = setTimeout(() => {
             refreshCameraThumbnail(cameraIdx);
         }, 10000);
     };
@@ -571,7 +603,7 @@ function loadAllCameraFeedsWithOfflineOverlay() {
                     refreshCameraThumbnail(cameraIdx);
                     if (isInModal) {
                         const streamModalImg = document.getElementById('stream-modal-image');
-                        streamModalImg.src = `/api/stream?camera_index=${cameraIdx}&t=${Date.now()}`;
+                        streamModalImg.src = `/api/stream?camera_index=${cameraIdx}&adaptive=1&t=${Date.now()}`;
                     }
                 }, 5000);
             } else {
@@ -589,12 +621,28 @@ function loadAllCameraFeedsWithOfflineOverlay() {
 
     function refreshCameraThumbnail(cameraIdx) {
         const img = document.querySelector(`#camera-feed-${cameraIdx} img.camera-thumbnail`);
-        if (img) {
-            const timestamp = Date.now();
-            img.src = `/api/camera-thumbnail/${cameraIdx}?t=${timestamp}`;
-            img.onload = function() { handleCameraThumbnailLoaded(cameraIdx); };
-            img.onerror = function() { handleCameraThumbnailError(cameraIdx); };
-        }
+        if (!img) return;
+        // no-cache revalidates with the stored ETag, so an unchanged thumbnail costs a 304
+        fetch(`/api/camera-thumbnail/${cameraIdx}`, { cache: 'no-cache' })
+            .then(res => {
+                if (!res.ok) throw new Error(`HTTP ${res.status}`);
+                const etag = res.headers.get('ETag');
+                if (etag && etag === thumbnailEtags[cameraIdx]) {
+                    handleCameraThumbnailLoaded(cameraIdx);
+                    return null;
+                }
+                thumbnailEtags[cameraIdx] = etag;
+                return res.blob();
+            })
+            .then(blob => {
+                if (!blob) return;
+                if (thumbnailUrls[cameraIdx]) URL.revokeObjectURL(thumbnailUrls[cameraIdx]);
+                thumbnailUrls[cameraIdx] = URL.createObjectURL(blob);
+                img.onload = function() { handleCameraThumbnailLoaded(cameraIdx); };
+                img.onerror = function() { handleCameraThumbnailError(cameraIdx); };
+                img.src = thumbnailUrls[cameraIdx];
+            })
+            .catch(err => handleCameraThumbnailError(cameraIdx));
     }
 
     function loadAllCameraFeeds() {
@@ -692,6 +740,85 @@ function loadAllCameraFeedsWithOfflineOverlay() {
         }
     });
 
+    // --- Server push: camera state, metrics and new frames from /api/events --- //
+    const MAX_RECENT_FRAMES = 30;
+    const CAMERA_STATE_BADGES = {
+        starting: ['Starting...', 'warning'],
+        active: ['Ready', 'success'],
+        stopping: ['Stopping...', 'warning'],
+        inactive: ['Offline', 'danger']
+    };
+    // Supervisor states of a running camera (camera_health events)
+    const CAMERA_HEALTH_BADGES = {
+        connecting: ['Connecting...', 'warning'],
+        live: ['Ready', 'success'],
+        degraded: ['Degraded', 'warning'],
+        backoff: ['Reconnecting...', 'warning'],
+        stopped: ['Stopped', 'secondary']
+    };
+
+    function connectEvents() {
+        if (!window.EventSource) return;
+        const source = new EventSource('/api/events');
+        source.onopen = () => { eventsConnected = true; };
+        // EventSource reconnects on its own; polling covers the gap meanwhile
+        source.onerror = () => { eventsConnected = false; };
+
+        source.addEventListener('snapshot', e => {
+            cameraStates = JSON.parse(e.data).cameras || {};
+            renderAllCamerasStatus();
+        });
+
+        source.addEventListener('camera_state', e => {
+            const data = JSON.parse(e.data);
+            const key = String(data.camera_index);
+            cameraStates[key] = Object.assign(cameraStates[key] || { camera_index: data.camera_index },
+                                              { status: data.state === 'active' ? 'active' : 'inactive' });
+            renderAllCamerasStatus();
+            const overlay = document.querySelector(`#camera-feed-${data.camera_index} .camera-overlay`);
+            if (overlay) {
+                const [text, color] = CAMERA_STATE_BADGES[data.state] || [data.state, 'secondary'];
+                overlay.innerHTML = `Camera ${data.camera_index} <span class="badge bg-${color}">${text}</span>`;
+            }
+            if (data.state === 'active') {
+                refreshCameraThumbnail(data.camera_index);
+            }
+            if (data.camera_index === currentCameraIndex && data.state === 'inactive') {
+                updateStatusBadge('Inactive', 'danger');
+            }
+        });
+
+        source.addEventListener('camera_health', e => {
+            const data = JSON.parse(e.data);
+            const overlay = document.querySelector(`#camera-feed-${data.camera_index} .camera-overlay`);
+            const badge = CAMERA_HEALTH_BADGES[data.state];
+            if (overlay && badge) {
+                const retry = data.retry_in ? ` in ${data.retry_in}s` : '';
+                overlay.innerHTML = `Camera ${data.camera_index} <span class="badge bg-${badge[1]}">${badge[0]}${retry}</span>`;
+                overlay.title = data.reason || '';
+            }
+        });
+
+        source.addEventListener('camera_metrics', e => {
+            const data = JSON.parse(e.data);
+            const key = String(data.camera_index);
+            cameraStates[key] = Object.assign(cameraStates[key] || { camera_index: data.camera_index, status: 'active' }, data);
+            renderAllCamerasStatus();
+        });
+
+        source.addEventListener('frame', e => {
+            const frame = JSON.parse(e.data);
+            const showAll = document.getElementById('show-all-cameras').checked;
+            if (!showAll && frame.camera_index !== currentCameraIndex) return;
+            const emptyNotice = framesContainer.querySelector(':scope > p');
+            if (emptyNotice) emptyNotice.remove();
+            framesContainer.prepend(createFrameItem(frame, 'live'));
+            while (framesContainer.children.length > MAX_RECENT_FRAMES) {
+                framesContainer.lastElementChild.remove();
+            }
+        });
+    }
+
     // --- Initial Load Sequence ---
     // Try to restore last selected camera from localStorage if available
     let lastSelectedCamera = localStorage.getItem('selectedCameraIndex');
@@ -702,7 +829,11 @@ function loadAllCameraFeedsWithOfflineOverlay() {
 
     updateAllCamerasStatus();
 
-    setInterval(updateAllCamerasStatus, 30000);
+    connectEvents();
+
+    setInterval(() => {
+        if (!eventsConnected) updateAllCamerasStatus();
+    }, 30000);
     setInterval(refreshAllThumbnails, 60000);
 
     setTimeout(() => {
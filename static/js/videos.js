@@ -218,7 +218,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 const imageSrc = frame.image_path;
                 
                 frameItem.innerHTML = `
-                    <img src="${imageSrc}" alt="Frame ${frame.frame_number}" 
+                    <img src="${frame.thumbnail || imageSrc}" alt="Frame ${frame.frame_number}" 
                         onerror="this.onerror=null; this.src='/static/images/image-not-found.png'; console.error('Failed to load image for frame ${frame.id}');"
                         loading="lazy">
                     <div class="frame-info">
@@ -0,0 +1,369 @@
+import os
+import threading
+
+from sqlalchemy import func
+
+from db_models import db, Video, Frame, DetectedObject, Clip
+from image_writer import image_writer
+from rollups import discount_frames, camera_index_for_video
+
+# Columns every frame-deletion chunk is selected with
+FRAME_ROW_COLUMNS = (Frame.id, Frame.image_path, Frame.video_id, Frame.file_size, Frame.thumbnail_path)
+# Columns every clip-deletion chunk is selected with
+CLIP_ROW_COLUMNS = (Clip.id, Clip.path, Clip.video_id, Clip.file_size)
+
+def _remove_file(path):
+    """Delete a file and return the bytes reclaimed, or None if nothing was deleted"""
+    try:
+        size = os.path.getsize(path)
+        os.remove(path)
+        return size
+    except FileNotFoundError:
+        return None
+
+def delete_frames(rows):
+    """Delete a chunk of frames: DB rows in one transaction, then their files.
+
+    rows are (id, image_path, video_id, file_size, thumbnail_path) tuples as
+    selected with FRAME_ROW_COLUMNS. Rollups and storage accounting are updated to match.
+    Returns a dict with rows, objects, files, bytes, folders and errors.
+    """
+    rows = list(rows)
+    stats = {"rows": 0, "objects": 0, "files": 0, "bytes": 0, "folders": set(), "errors": []}
+    if not rows:
+        return stats
+    frame_ids = [row[0] for row in rows]
+    try:
+        discount_frames(frame_ids)
+        stats["objects"] = DetectedObject.query.filter(
+            DetectedObject.frame_id.in_(frame_ids)
+        ).delete(synchronize_session=False)
+        stats["rows"] = Frame.query.filter(Frame.id.in_(frame_ids)).delete(synchronize_session=False)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        stats["errors"].append(f"Error deleting frame chunk: {e}")
+        return stats
+
+    # Files go after the commit: a crash leaves an orphan for the sweep, never a dangling row
+    for _, image_path, video_id, file_size, thumbnail_path in rows:
+        size = None
+        for path in (image_path, thumbnail_path):
+            if not path:
+                continue
+            try:
+                removed = _remove_file(path)
+            except OSError as e:
+                stats["errors"].append(f"Failed to delete file {path}: {e}")
+                continue
+            if removed is not None:
+                # file_size covers the thumbnail too, so both count towards the release below
+                size = (size or 0) + removed
+                stats["files"] += 1
+                stats["bytes"] += removed
+                stats["folders"].add(os.path.dirname(path))
+        storage_manager.release(video_id, file_size if file_size is not None else (size or 0))
+    return stats
+
+def delete_clips(rows):
+    """Delete a chunk of event clips: DB rows in one transaction, then their MP4 files.
+
+    rows are (id, path, video_id, file_size) tuples as selected with
+    CLIP_ROW_COLUMNS. Returns the same stats dict as delete_frames.
+    """
+    rows = list(rows)
+    stats = {"rows": 0, "objects": 0, "files": 0, "bytes": 0, "folders": set(), "errors": []}
+    if not rows:
+        return stats
+    try:
+        stats["rows"] = Clip.query.filter(Clip.id.in_([row[0] for row in rows])).delete(synchronize_session=False)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        stats["errors"].append(f"Error deleting clip chunk: {e}")
+        return stats
+    for _, path, video_id, file_size in rows:
+        try:
+            removed = _remove_file(path)
+        except OSError as e:
+            stats["errors"].append(f"Failed to delete file {path}: {e}")
+            removed = None
+        if removed is not None:
+            stats["files"] += 1
+            stats["bytes"] += removed
+            stats["folders"].add(os.path.dirname(path))
+        storage_manager.release(video_id, file_size if file_size is not None else (removed or 0))
+    return stats
+
+class StorageManager:
+    """Tracks bytes used per camera and per upload folder and enforces quotas.
+
+    Usage is loaded once from the Frame/Clip/Video file_size columns and then
+    kept up to date incrementally as frames and clips are written and
+    deleted, so no directory walks are needed. Crossing a per-camera or
+    global quota wakes the eviction thread immediately; it deletes the oldest
+    frames (rows and files together), then the oldest clips, until usage is
+    back under the low watermark. Only camera recordings are evicted; uploads
+    and their analyses count towards the global total but are left to
+    retention, so the global target is the share of the quota they leave to
+    the cameras. If they fill the quota on their own, nothing is evicted.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.Lock()
+        self._evict_event = threading.Event()
+        self._thread = None
+        self.remote = None        # analyzer daemon client when another process owns accounting
+        self.loaded = False
+        self.video_bytes = {}     # video_id -> bytes of saved frames
+        self.camera_videos = {}   # video_id -> camera index
+        self.upload_bytes = 0     # bytes of uploaded source videos
+        self._quota_unmet = False  # uploads alone exceed the global quota (warned once)
+        self.metrics = {
+            "evictions": 0,
+            "frames_evicted": 0,
+            "bytes_evicted": 0,
+            "last_eviction": None,
+            "errors": 0,
+            "last_error": None,
+        }
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['storage'] = self
+
+    @staticmethod
+    def _mb(value):
+        return int(value * 1_048_576)
+
+    def camera_quota(self, camera_index):
+        """Byte budget for one camera (0 means unlimited)"""
+        quotas = self.app.config['STORAGE_CAMERA_QUOTAS']
+        return self._mb(quotas.get(camera_index, self.app.config['STORAGE_CAMERA_QUOTA_MB']))
+
+    def global_quota(self):
+        return self._mb(self.app.config['STORAGE_GLOBAL_QUOTA_MB'])
+
+    def load_baseline(self, batch_size=1000):
+        """Initialise usage from the database, back-filling sizes of legacy rows"""
+        while True:
+            rows = db.session.query(Frame.id, Frame.image_path).filter(
+                Frame.file_size.is_(None)
+            ).limit(batch_size).all()
+            if not rows:
+                break
+            for frame_id, image_path in rows:
+                try:
+                    size = os.path.getsize(image_path) if image_path else 0
+                except OSError:
+                    size = 0
+                Frame.query.filter_by(id=frame_id).update({'file_size': size}, synchronize_session=False)
+            db.session.commit()
+        videos_folder = self.app.config['VIDEOS_FOLDER']
+        for video in Video.query.filter(Video.file_size.is_(None)).all():
+            path = os.path.join(videos_folder, video.filename)
+            video.file_size = os.path.getsize(path) if os.path.isfile(path) else 0
+        db.session.commit()
+
+        frame_totals = db.session.query(Frame.video_id, func.sum(Frame.file_size)).group_by(Frame.video_id).all()
+        clip_totals = db.session.query(Clip.video_id, func.sum(Clip.file_size)).group_by(Clip.video_id).all()
+        upload_total = db.session.query(func.sum(Video.file_size)).scalar() or 0
+        camera_videos = {
+            video.id: camera_index_for_video(video.filename)
+            for video in Video.query.filter(Video.filename.like("camera_%_live")).all()
+        }
+        with self._lock:
+            self.video_bytes = {video_id: int(total or 0) for video_id, total in frame_totals}
+            for video_id, total in clip_totals:
+                self.video_bytes[video_id] = self.video_bytes.get(video_id, 0) + int(total or 0)
+            self.camera_videos = {vid: idx for vid, idx in camera_videos.items() if idx is not None}
+            self.upload_bytes = int(upload_total)
+            self.loaded = True
+        if self._over_quota():
+            self._evict_event.set()
+
+    def start(self):
+        """Load the baseline and start the eviction thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self.app.app_context():
+            self.load_baseline()
+        self._thread = threading.Thread(target=self._eviction_loop, daemon=True)
+        self._thread.start()
+
+    def record_frame(self, video_id, nbytes, camera_index=None):
+        """Account for a newly written frame file"""
+        if self.remote is not None:
+            return self.remote.call('storage.record_frame', video_id, nbytes, camera_index=camera_index)
+        with self._lock:
+            self.video_bytes[video_id] = self.video_bytes.get(video_id, 0) + nbytes
+            if camera_index is not None:
+                self.camera_videos[video_id] = camera_index
+        if self.loaded and self._over_quota(video_id):
+            self._evict_event.set()
+
+    def record_upload(self, nbytes):
+        """Account for a newly stored uploaded video"""
+        if self.remote is not None:
+            return self.remote.call('storage.record_upload', nbytes)
+        with self._lock:
+            self.upload_bytes += nbytes
+        if self.loaded and self._over_quota():
+            self._evict_event.set()
+
+    def release(self, video_id, nbytes):
+        with self._lock:
+            self.video_bytes[video_id] = max(0, self.video_bytes.get(video_id, 0) - nbytes)
+
+    def release_upload(self, filename, nbytes):
+        """Account for an uploaded video removed from disk. Must run inside an app context."""
+        with self._lock:
+            self.upload_bytes = max(0, self.upload_bytes - nbytes)
+        Video.query.filter_by(filename=filename).update({'file_size': 0}, synchronize_session=False)
+        db.session.commit()
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(self.video_bytes.values()) + self.upload_bytes
+
+    def _camera_budget(self):
+        """(bytes of camera recordings, bytes the global quota leaves them after everything else)"""
+        with self._lock:
+            camera_bytes = sum(self.video_bytes.get(vid, 0) for vid in self.camera_videos)
+        return camera_bytes, self.global_quota() - (self.total_bytes() - camera_bytes)
+
+    def _over_quota(self, video_id=None):
+        """True if any quota is exceeded in a way eviction can fix (only the given video's camera, if one is passed)"""
+        if self.global_quota():
+            camera_bytes, camera_budget = self._camera_budget()
+            if camera_bytes > camera_budget and (camera_budget > 0 or not self._quota_unmet):
+                return True
+        with self._lock:
+            video_ids = [video_id] if video_id is not None else list(self.camera_videos)
+            for vid in video_ids:
+                camera_index = self.camera_videos.get(vid)
+                if camera_index is None:
+                    continue
+                quota = self.camera_quota(camera_index)
+                if quota and self.video_bytes.get(vid, 0) > quota:
+                    return True
+        return False
+
+    def _eviction_loop(self):
+        while True:
+            # The timeout is only a safety net; crossings set the event directly
+            self._evict_event.wait(60)
+            self._evict_event.clear()
+            try:
+                with self.app.app_context():
+                    self.evict()
+            except Exception as e:
+                self._record_error(f"Error in storage eviction: {e}")
+
+    def _record_error(self, message):
+        self.metrics["errors"] += 1
+        self.metrics["last_error"] = message
+        self.app.logger.error(message)
+
+    def _evict_until(self, query, is_over, order_by=(Frame.timestamp, Frame.id), delete=delete_frames):
+        """Delete the oldest rows of query (frames by default), chunk by chunk, while is_over() holds"""
+        chunk_size = self.app.config['RETENTION_CHUNK_SIZE']
+        evicted = 0
+        while is_over():
+            rows = query.order_by(*order_by).limit(chunk_size).all()
+            if not rows:
+                break
+            stats = delete(rows)
+            for error in stats["errors"]:
+                self._record_error(error)
+            if not stats["rows"]:
+                break
+            evicted += stats["rows"]
+            self.metrics["frames_evicted"] += stats["rows"]
+            self.metrics["bytes_evicted"] += stats["bytes"]
+        return evicted
+
+    def evict(self):
+        """Bring every camera and the global total back under their low watermarks"""
+        watermark = self.app.config['STORAGE_LOW_WATERMARK']
+        evicted = 0
+        with self._lock:
+            cameras = list(self.camera_videos.items())
+        for video_id, camera_index in cameras:
+            quota = self.camera_quota(camera_index)
+            if not quota or self.video_bytes.get(video_id, 0) <= quota:
+                continue
+            target = quota * watermark
+            is_over = lambda: self.video_bytes.get(video_id, 0) > target
+            query = db.session.query(*FRAME_ROW_COLUMNS).filter(Frame.video_id == video_id)
+            count = self._evict_until(query, is_over)
+            query = db.session.query(*CLIP_ROW_COLUMNS).filter(Clip.video_id == video_id)
+            count += self._evict_until(query, is_over, (Clip.start_time, Clip.id), delete_clips)
+            self.app.logger.warning(f"Camera {camera_index} exceeded its storage quota; evicted {count} frames and clips")
+            evicted += count
+        global_quota = self.global_quota()
+        camera_bytes, camera_budget = self._camera_budget()
+        if global_quota and camera_budget <= 0:
+            # Uploads and analyses alone fill the quota: deleting camera frames cannot meet it
+            if not self._quota_unmet:
+                self.app.logger.warning(
+                    f"Global storage quota cannot be met by eviction: uploads and their analyses use "
+                    f"{self.total_bytes() - camera_bytes} of {global_quota} bytes and are only removed by "
+                    f"retention. Camera recordings are not evicted for the global quota until they fit")
+            self._quota_unmet = True
+        elif global_quota and camera_bytes > camera_budget:
+            self._quota_unmet = False
+            # Only camera recordings are evictable, so the target is their share of the quota
+            target = camera_budget * watermark
+            is_over = lambda: self._camera_budget()[0] > target
+            camera_video_ids = [video_id for video_id, _ in cameras]
+            count = 0
+            if camera_video_ids:
+                query = db.session.query(*FRAME_ROW_COLUMNS).filter(Frame.video_id.in_(camera_video_ids))
+                count += self._evict_until(query, is_over)
+                query = db.session.query(*CLIP_ROW_COLUMNS).filter(Clip.video_id.in_(camera_video_ids))
+                count += self._evict_until(query, is_over, (Clip.start_time, Clip.id), delete_clips)
+            self.app.logger.warning(f"Global storage quota exceeded; evicted {count} frames and clips")
+            evicted += count
+        else:
+            self._quota_unmet = False
+        if evicted:
+            self.metrics["evictions"] += 1
+            self.metrics["last_eviction"] = evicted
+        return evicted
+
+    def usage(self):
+        """Current usage and quotas per camera, per folder and in total"""
+        if self.remote is not None:
+            return self.remote.call('storage.usage')
+        with self._lock:
+            cameras = {}
+            analysis_bytes = 0
+            for video_id, nbytes in self.video_bytes.items():
+                camera_index = self.camera_videos.get(video_id)
+                if camera_index is None:
+                    analysis_bytes += nbytes
+                else:
+                    cameras[camera_index] = cameras.get(camera_index, 0) + nbytes
+            upload_bytes = self.upload_bytes
+        total = sum(cameras.values()) + analysis_bytes + upload_bytes
+        return {
+            "loaded": self.loaded,
+            "total_bytes": total,
+            "global_quota_bytes": self.global_quota(),
+            "cameras": {
+                str(idx): {"bytes": nbytes, "quota_bytes": self.camera_quota(idx)}
+                for idx, nbytes in sorted(cameras.items())
+            },
+            "folders": {
+                "videos": upload_bytes,
+                "analysis": analysis_bytes,
+            },
+            "metrics": dict(self.metrics),
+            "writer": image_writer.stats(),
+        }
+
+storage_manager = StorageManager()
@@ -0,0 +1,83 @@
+import os
+
+import cv2
+
+from image_writer import fit_within
+
+# codec -> (file extension, OpenCV quality flag)
+CODECS = {
+    "jpeg": (".jpg", cv2.IMWRITE_JPEG_QUALITY),
+    "webp": (".webp", cv2.IMWRITE_WEBP_QUALITY),
+    "png": (".png", cv2.IMWRITE_PNG_COMPRESSION),
+}
+FRAME_EXTENSIONS = tuple(extension for extension, _ in CODECS.values())
+THUMBNAIL_SUFFIX = "_thumb"
+
+class StorageProfile:
+    """How saved frames are encoded: codec, quality, size cap and sidecar thumbnail.
+
+    quality is 1-100 for JPEG and WebP and the compression level (0-9) for
+    PNG. max_dim caps the longer side of the stored image and thumbnail the
+    longer side of a small sidecar image written next to it; 0 disables
+    either.
+    """
+
+    def __init__(self, name="default", codec="jpeg", quality=95, max_dim=0, thumbnail=0):
+        codec = codec.lower()
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec {codec!r} in storage profile {name!r}")
+        self.name = name
+        self.codec = codec
+        self.quality = int(quality)
+        self.max_dim = int(max_dim)
+        self.thumbnail = int(thumbnail)
+
+    @classmethod
+    def from_config(cls, config, name):
+        profiles = config['STORAGE_PROFILES']
+        if name not in profiles:
+            raise ValueError(f"Unknown storage profile {name!r}; expected one of {', '.join(profiles)}")
+        return cls(name, **profiles[name])
+
+    @property
+    def extension(self):
+        return CODECS[self.codec][0]
+
+    @property
+    def params(self):
+        return [CODECS[self.codec][1], self.quality]
+
+    def scale_for(self, shape):
+        """Stored size / frame size for a frame of this shape"""
+        longest = max(shape[:2])
+        return self.max_dim / longest if self.max_dim and longest > self.max_dim else 1.0
+
+    def prepare(self, image):
+        """The image as it will be stored, and its sidecar thumbnail (or None)"""
+        image, _ = fit_within(image, self.max_dim)
+        thumbnail = fit_within(image, self.thumbnail)[0] if self.thumbnail else None
+        return image, thumbnail
+
+    def thumbnail_path(self, path):
+        if not self.thumbnail:
+            return None
+        root, extension = os.path.splitext(path)
+        return f"{root}{THUMBNAIL_SUFFIX}{extension}"
+
+    def to_dict(self):
+        return {"name": self.name, "codec": self.codec, "quality": self.quality,
+                "max_dim": self.max_dim, "thumbnail": self.thumbnail}
+
+def camera_profile(config, camera_index):
+    """Storage profile for a live camera: its CAMERA_STORAGE_PROFILES entry or CAMERA_STORAGE_PROFILE"""
+    name = config['CAMERA_STORAGE_PROFILES'].get(camera_index, config['CAMERA_STORAGE_PROFILE'])
+    return StorageProfile.from_config(config, name)
+
+def upload_profile(config, name=None):
+    """Storage profile for an uploaded video's frames, defaulting to UPLOAD_STORAGE_PROFILE"""
+    return StorageProfile.from_config(config, name or config['UPLOAD_STORAGE_PROFILE'])
+
+def is_frame_file(filename):
+    """True for saved frame images, excluding sidecar thumbnails"""
+    root, extension = os.path.splitext(filename)
+    return extension.lower() in FRAME_EXTENSIONS and not root.endswith(THUMBNAIL_SUFFIX)
@@ -0,0 +1,494 @@
+import abc
+import logging
+import math
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+import analyzer_state
+from camera_supervisor import STOPPED
+
+logger = logging.getLogger("streaming")
+
+class JpegBroadcaster(abc.ABC):
+    """Encoder thread plus fan-out shared by every MJPEG broadcaster.
+
+    The thread runs while at least one client is subscribed and exits after
+    idle_timeout without clients. Each JPEG it produces is stored under an
+    increasing sequence number and every client waiting on the condition is
+    woken. Clients block in wait_for_jpeg() until a frame newer than the last
+    one they sent exists, so nobody spins or re-sends duplicates.
+
+    Subclasses implement _step(), one iteration of the encoder loop, which
+    returns True once its source has ended for good. An error in a step is
+    logged and the loop carries on; after MAX_CONSECUTIVE_ERRORS in a row,
+    or when the source ends, the thread gives up, marks the source closed so
+    client generators end, and the next subscribe() starts a fresh one.
+    """
+
+    MAX_CONSECUTIVE_ERRORS = 5
+    ERROR_RETRY_SECONDS = 0.5
+
+    def __init__(self, jpeg_quality=95, idle_timeout=10.0):
+        self.jpeg_quality = jpeg_quality
+        self.idle_timeout = idle_timeout
+        self._cond = threading.Condition()
+        self._thread = None
+        self._idle_since = None
+        self._encode_times = deque()
+        self.seq = 0
+        self.jpeg = None
+        self.clients = 0
+        self.total_encodes = 0
+        self.source_closed = False
+
+    def subscribe(self):
+        with self._cond:
+            self.clients += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._idle_since = None
+                self.source_closed = False
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def unsubscribe(self):
+        with self._cond:
+            self.clients = max(0, self.clients - 1)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def wait_for_jpeg(self, after_seq, timeout=5.0):
+        """Block until a frame newer than after_seq is encoded. Returns (seq, jpeg) or None on timeout."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.seq > after_seq or self.source_closed, timeout):
+                return None
+            if self.seq <= after_seq:
+                return None
+            return self.seq, self.jpeg
+
+    def _encode(self, frame):
+        ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ret:
+            return None
+        now = time.time()
+        self._encode_times.append(now)
+        while self._encode_times and now - self._encode_times[0] > 5.0:
+            self._encode_times.popleft()
+        self.total_encodes += 1
+        return buffer.tobytes()
+
+    def _publish(self, jpeg):
+        with self._cond:
+            self.seq += 1
+            self.jpeg = jpeg
+            self._cond.notify_all()
+
+    def _notify_closed(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def _idle_expired(self):
+        """True once nobody has been subscribed for idle_timeout; the caller's thread must then exit"""
+        with self._cond:
+            if self.clients:
+                self._idle_since = None
+                return False
+            self._idle_since = self._idle_since or time.time()
+            if time.time() - self._idle_since > self.idle_timeout:
+                self._thread = None
+                return True
+            return False
+
+    def _fail(self):
+        """Give up on this encoder thread: end the clients' streams and let subscribe() start another"""
+        with self._cond:
+            self.source_closed = True
+            if self._thread is threading.current_thread():
+                self._thread = None
+        self._notify_closed()
+
+    def _reset(self):
+        """Clear per-run loop state before the encoder thread starts stepping"""
+
+    @abc.abstractmethod
+    def _step(self):
+        """One iteration of the encoder loop; True ends the loop because the source has ended"""
+
+    def _run(self):
+        self._reset()
+        errors = 0
+        while not self._idle_expired():
+            try:
+                if self._step():
+                    self._fail()
+                    return
+                errors = 0
+            except Exception as e:
+                errors += 1
+                logger.exception(f"Error in {type(self).__name__} encoder ({errors} in a row): {e}")
+                if errors >= self.MAX_CONSECUTIVE_ERRORS:
+                    logger.error(f"{type(self).__name__} encoder stopped after {errors} consecutive errors")
+                    self._fail()
+                    return
+                time.sleep(self.ERROR_RETRY_SECONDS)
+
+    def stats(self):
+        now = time.time()
+        recent = [t for t in list(self._encode_times) if now - t <= 5.0]
+        return {
+            "clients": self.clients,
+            "seq": self.seq,
+            "total_encodes": self.total_encodes,
+            "encodes_per_second": round(len(recent) / 5.0, 2),
+            "encoder_running": self.running,
+        }
+
+class FrameBroadcaster(JpegBroadcaster):
+    """Encodes each new frame of one camera once and fans the JPEG out to all clients.
+
+    The encoder sleeps on the analyzer's wait_for_frame() until a new frame
+    is published, so each frame is encoded exactly once per variant. A
+    variant is a target width (None keeps the full resolution) plus a JPEG
+    quality; frames wider than the target are downscaled before encoding.
+    """
+
+    def __init__(self, camera_index, jpeg_quality=95, width=None, wait_timeout=0.5, idle_timeout=10.0):
+        super().__init__(jpeg_quality=jpeg_quality, idle_timeout=idle_timeout)
+        self.camera_index = camera_index
+        self.width = width
+        self.wait_timeout = wait_timeout
+
+    def _instance(self):
+        """The camera's analyzer instance, or None; flags the source as closed if it is gone"""
+        with analyzer_state.analyzer_lock:
+            instance = analyzer_state.analyzer_instances.get(self.camera_index)
+        self.source_closed = instance is None
+        return instance
+
+    def _reset(self):
+        self._source = None
+        self._frame_seq = 0
+
+    def _step(self):
+        current = self._instance()
+        if current is None:
+            self._notify_closed()
+            time.sleep(self.wait_timeout)
+            return
+        if current is not self._source:
+            # A restarted analyzer numbers its frames from scratch
+            self._source, self._frame_seq = current, 0
+        item = current.wait_for_frame(self._frame_seq, timeout=self.wait_timeout)
+        if item == STOPPED:
+            # Stopped but not unregistered yet: it will publish nothing more
+            return True
+        if item is None:
+            return
+        self._frame_seq, _, frame = item
+        if self.width and frame.shape[1] > self.width:
+            height = max(1, int(frame.shape[0] * self.width / frame.shape[1]))
+            frame = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        jpeg = self._encode(frame)
+        # A frame overwritten in the ring while being encoded may be torn; wait for the next one
+        if jpeg is not None and current.frame_still_valid(self._frame_seq):
+            self._publish(jpeg)
+
+    def stats(self):
+        return dict(super().stats(), camera_index=self.camera_index,
+                    width=self.width, jpeg_quality=self.jpeg_quality)
+
+class MosaicBroadcaster(JpegBroadcaster):
+    """Tiles the latest frames of several cameras into one grid image.
+
+    One tick every 1/fps seconds reads each camera's current frame without
+    blocking, resizes it into its cell of a preallocated canvas and encodes
+    the canvas once for every viewer. Ticks where no camera published a new
+    frame are skipped, so a static wall costs no encodes. cameras=None
+    means every camera the analyzer state knows about, re-read each tick.
+    """
+
+    def __init__(self, cameras=None, width=1280, height=720, fps=5.0, jpeg_quality=80, idle_timeout=10.0):
+        super().__init__(jpeg_quality=jpeg_quality, idle_timeout=idle_timeout)
+        self.cameras = tuple(cameras) if cameras else None
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.camera_indices = []
+        self._canvas = np.zeros((height, width, 3), dtype=np.uint8)
+        self._offline_tiles = {}
+
+    @staticmethod
+    def grid(count):
+        """(rows, cols) of the most nearly square grid holding count cells"""
+        cols = max(1, math.ceil(math.sqrt(count)))
+        return max(1, math.ceil(count / cols)), cols
+
+    def _sources(self):
+        with analyzer_state.analyzer_lock:
+            indices = sorted(analyzer_state.analyzer_instances) if self.cameras is None else list(self.cameras)
+            return [(idx, analyzer_state.analyzer_instances.get(idx)) for idx in indices]
+
+    def _offline_tile(self, camera_index, width, height):
+        tile = self._offline_tiles.get((camera_index, width, height))
+        if tile is None:
+            tile = np.zeros((height, width, 3), dtype=np.uint8)
+            cv2.putText(tile, f"Camera {camera_index} Offline", (10, height // 2),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+            self._offline_tiles[(camera_index, width, height)] = tile
+        return tile
+
+    def _compose(self, frames):
+        rows, cols = self.grid(len(frames))
+        tile_w, tile_h = self.width // cols, self.height // rows
+        self._canvas[:] = 0
+        for i, (camera_index, frame) in enumerate(frames):
+            y, x = (i // cols) * tile_h, (i % cols) * tile_w
+            if frame is None:
+                tile = self._offline_tile(camera_index, tile_w, tile_h)
+            else:
+                tile = cv2.resize(frame, (tile_w, tile_h), interpolation=cv2.INTER_AREA)
+                cv2.putText(tile, f"Camera {camera_index}", (8, 22),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+            self._canvas[y:y + tile_h, x:x + tile_w] = tile
+        return self._canvas
+
+    def _reset(self):
+        self._last_signature = None
+        self._next_tick = time.monotonic()
+
+    def _step(self):
+        try:
+            self._tick()
+        finally:
+            # Keep the pace even when a tick fails
+            self._next_tick += 1.0 / self.fps
+            delay = self._next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                self._next_tick = time.monotonic()
+
+    def _tick(self):
+        frames, signature, views = [], [], []
+        for camera_index, instance in self._sources():
+            if instance is None:
+                frames.append((camera_index, None))
+                signature.append((camera_index, None, 0))
+                continue
+            seq, _, frame = instance.get_frame_info()
+            frames.append((camera_index, frame))
+            signature.append((camera_index, id(instance), seq))
+            views.append((instance, seq))
+        signature = tuple(signature)
+        if signature == self._last_signature:
+            return
+        canvas = self._compose(frames)
+        # Recompose next tick if any source frame was overwritten mid-copy
+        valid = all(instance.frame_still_valid(seq) for instance, seq in views)
+        jpeg = self._encode(canvas) if valid else None
+        if jpeg is not None:
+            self._publish(jpeg)
+            self._last_signature = signature
+            self.camera_indices = [camera_index for camera_index, _ in frames]
+
+    def stats(self):
+        return dict(super().stats(), cameras=self.camera_indices, width=self.width,
+                    height=self.height, fps=self.fps)
+
+_broadcasters = {}
+_broadcasters_lock = threading.Lock()
+
+def _prune(registry, keep_key):
+    """Drop broadcasters nobody is using any more. Call with _broadcasters_lock held."""
+    for key in [k for k, b in registry.items() if k != keep_key and not b.clients and not b.running]:
+        del registry[key]
+
+def get_broadcaster(camera_index, jpeg_quality=95, width=None):
+    """Process-wide broadcaster for one (camera, width, quality) variant, created on first use"""
+    key = (camera_index, width, jpeg_quality)
+    with _broadcasters_lock:
+        _prune(_broadcasters, key)
+        broadcaster = _broadcasters.get(key)
+        if broadcaster is None:
+            broadcaster = FrameBroadcaster(camera_index, jpeg_quality=jpeg_quality, width=width)
+            _broadcasters[key] = broadcaster
+        return broadcaster
+
+_client_streams = set()
+
+# Adaptive clients step through these (width, quality ceiling) variants, so
+# they converge on a few shared encodes instead of one each
+VARIANT_LADDER = ((None, 95), (1280, 85), (960, 75), (640, 65), (480, 55), (320, 45))
+
+class ClientStream:
+    """Paces one /api/stream client and picks the variant it receives.
+
+    max_fps caps how often frames are sent; frames published in between are
+    skipped, never queued. With adaptive set, the time each yield takes to
+    drain into the socket is tracked: a client that needs most of its frame
+    budget to drain steps down the variant ladder (smaller, lower quality)
+    and, at the bottom, to a lower fps; a client with plenty of headroom
+    steps back up, never above what it asked for.
+    """
+
+    SLOW_RATIO = 0.8     # drain time / frame budget above which the client is behind
+    FAST_RATIO = 0.25    # ... and below which it has room to spare
+    STEP_DOWN_AFTER = 5
+    STEP_UP_AFTER = 50
+    MIN_FPS = 1.0
+
+    def __init__(self, camera_index, width=None, jpeg_quality=95, max_fps=None, adaptive=False):
+        self.camera_index = camera_index
+        self.max_fps = max_fps
+        self.adaptive = adaptive
+        self.fps = max_fps
+        self.drain_time = None
+        self.frame_interval = None
+        self._slow = self._fast = 0
+        if adaptive:
+            # Snap the requested variant onto the ladder; that rung is the ceiling
+            requested = width or float('inf')
+            self.ceiling = next(
+                (i for i, (w, _) in enumerate(VARIANT_LADDER) if (w or float('inf')) <= requested),
+                len(VARIANT_LADDER) - 1
+            )
+            self.requested_quality = jpeg_quality
+            self.level = self.ceiling
+            self.width, self.jpeg_quality = self._variant(self.level)
+        else:
+            self.width, self.jpeg_quality = width, jpeg_quality
+
+    def _variant(self, level):
+        width, quality = VARIANT_LADDER[level]
+        return width, min(quality, self.requested_quality)
+
+    def _observe(self, drain, interval):
+        """Update drain/interval averages; returns True if the variant changed"""
+        self.drain_time = drain if self.drain_time is None else 0.8 * self.drain_time + 0.2 * drain
+        if interval is not None:
+            self.frame_interval = interval if self.frame_interval is None else 0.8 * self.frame_interval + 0.2 * interval
+        budget = 1.0 / self.fps if self.fps else self.frame_interval
+        if not self.adaptive or not budget:
+            return False
+        ratio = self.drain_time / budget
+        self._slow = self._slow + 1 if ratio > self.SLOW_RATIO else 0
+        self._fast = self._fast + 1 if ratio < self.FAST_RATIO else 0
+        if self._slow >= self.STEP_DOWN_AFTER:
+            self._slow = 0
+            if self.level < len(VARIANT_LADDER) - 1:
+                self.level += 1
+                self.width, self.jpeg_quality = self._variant(self.level)
+                return True
+            # Smallest variant and still behind: send fewer frames instead
+            self.fps = max(self.MIN_FPS, (self.fps or 1.0 / budget) / 2)
+        elif self._fast >= self.STEP_UP_AFTER:
+            self._fast = 0
+            if self.fps and self.fps != self.max_fps:
+                self.fps = min(self.fps * 2, self.max_fps) if self.max_fps else None
+            elif self.level > self.ceiling:
+                self.level -= 1
+                self.width, self.jpeg_quality = self._variant(self.level)
+                return True
+        return False
+
+    def frames(self):
+        """Yield JPEG bytes for this client until the camera's analyzer goes away"""
+        broadcaster = get_broadcaster(self.camera_index, self.jpeg_quality, self.width)
+        broadcaster.subscribe()
+        with _broadcasters_lock:
+            _client_streams.add(self)
+        try:
+            last_seq = 0
+            last_frame_at = None
+            while True:
+                item = broadcaster.wait_for_jpeg(last_seq, timeout=5.0)
+                if item is None:
+                    if broadcaster.source_closed:
+                        break
+                    continue
+                last_seq, jpeg = item
+                now = time.monotonic()
+                interval = now - last_frame_at if last_frame_at is not None else None
+                last_frame_at = now
+                started = time.monotonic()
+                yield jpeg
+                if self._observe(time.monotonic() - started, interval):
+                    # Switch variants; the new broadcaster numbers its own frames
+                    broadcaster.unsubscribe()
+                    broadcaster = get_broadcaster(self.camera_index, self.jpeg_quality, self.width)
+                    broadcaster.subscribe()
+                    last_seq = 0
+                if self.fps:
+                    delay = 1.0 / self.fps - (time.monotonic() - started)
+                    if delay > 0:
+                        time.sleep(delay)
+        finally:
+            broadcaster.unsubscribe()
+            with _broadcasters_lock:
+                _client_streams.discard(self)
+
+    def stats(self):
+        return {
+            "camera_index": self.camera_index,
+            "width": self.width,
+            "jpeg_quality": self.jpeg_quality,
+            "fps": self.fps,
+            "adaptive": self.adaptive,
+            "drain_ms": round(self.drain_time * 1000, 1) if self.drain_time is not None else None,
+        }
+
+_mosaics = {}
+
+def get_mosaic(cameras, width, height, fps, jpeg_quality=80):
+    """Process-wide mosaic broadcaster for one layout, created on first use.
+
+    Layouts nobody is watching any more are dropped here, so odd one-off
+    parameter combinations don't accumulate.
+    """
+    key = (tuple(cameras) if cameras else None, width, height, fps, jpeg_quality)
+    with _broadcasters_lock:
+        _prune(_mosaics, key)
+        mosaic = _mosaics.get(key)
+        if mosaic is None:
+            mosaic = MosaicBroadcaster(cameras, width, height, fps, jpeg_quality=jpeg_quality)
+            _mosaics[key] = mosaic
+        return mosaic
+
+def broadcaster_stats():
+    with _broadcasters_lock:
+        broadcasters = list(_broadcasters.values())
+        mosaics = list(_mosaics.values())
+        client_streams = list(_client_streams)
+    stats = {
+        f"{b.camera_index}:{b.width or 'full'}:q{b.jpeg_quality}": b.stats()
+        for b in broadcasters
+    }
+    if mosaics:
+        stats["mosaics"] = [m.stats() for m in mosaics]
+    if client_streams:
+        stats["clients"] = [c.stats() for c in client_streams]
+    return stats
+
+_placeholders = {}
+
+def placeholder_jpeg(text, width=640, height=480):
+    """A black frame with a message, encoded once per text and size"""
+    key = (text, width, height)
+    jpeg = _placeholders.get(key)
+    if jpeg is None:
+        image = np.zeros((height, width, 3), dtype=np.uint8)
+        (text_w, text_h), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.8, 2)
+        cv2.putText(image, text, (max(0, (width - text_w) // 2), (height + text_h) // 2),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+        jpeg = cv2.imencode('.jpg', image)[1].tobytes()
+        _placeholders[key] = jpeg
+    return jpeg
+
+def mjpeg_part(jpeg):
+    return (b'--frame\r\n'
+            b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
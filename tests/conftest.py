@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from db_models import db, configure_db, init_db
+
+@pytest.fixture
+def app(tmp_path):
+    """A Flask app on a throwaway SQLite file and folders, with an app context pushed"""
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config.update(
+        TESTING=True,
+        DATABASE_URL='sqlite:///' + str(tmp_path / 'test.db'),
+        VIDEOS_FOLDER=str(tmp_path / 'videos'),
+        OUTPUT_FOLDER=str(tmp_path / 'output'),
+    )
+    os.makedirs(app.config['VIDEOS_FOLDER'])
+    os.makedirs(app.config['OUTPUT_FOLDER'])
+    configure_db(app)
+    init_db(app)
+    with app.app_context():
+        yield app
+        db.session.remove()
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from analysis_cache import AnalysisCache
+from db_models import db, Video, Frame, AnalysisCacheEntry
+
+CONTENT = "ab" * 32
+PARAMS = {"model": "yolov5n.pt", "confidence": 0.5, "include_classes": ["car", "person"]}
+
+@pytest.fixture
+def cache(app):
+    return AnalysisCache(app)
+
+@pytest.fixture
+def analysed_video(app):
+    video = Video(filename="upload.mp4", content_hash=CONTENT)
+    db.session.add(video)
+    db.session.flush()
+    for number in range(3):
+        db.session.add(Frame(frame_number=number, video_id=video.id, image_path=f"frame_{number}.jpg"))
+    db.session.commit()
+    return video
+
+def test_miss_then_hit(cache, analysed_video):
+    assert cache.lookup(CONTENT, PARAMS) is None
+    cache.store(CONTENT, PARAMS, analysed_video.id)
+    entry = cache.lookup(CONTENT, PARAMS)
+    assert entry.video_id == analysed_video.id
+    assert entry.frame_count == 3 and entry.hits == 1
+    stats = cache.stats()
+    assert (stats["lookups"], stats["hits"], stats["misses"]) == (2, 1, 1)
+
+def test_other_settings_miss(cache, analysed_video):
+    cache.store(CONTENT, PARAMS, analysed_video.id)
+    assert cache.lookup(CONTENT, dict(PARAMS, confidence=0.6)) is None
+    assert cache.lookup("cd" * 32, PARAMS) is None
+    assert cache.contains(CONTENT, PARAMS)
+    assert not cache.contains(CONTENT, dict(PARAMS, confidence=0.6))
+
+def test_hit_renews_entry_and_results_video(cache, analysed_video):
+    cache.store(CONTENT, PARAMS, analysed_video.id)
+    cache.lookup(CONTENT, PARAMS)
+    entry = db.session.get(AnalysisCacheEntry, cache.cache_key(CONTENT, PARAMS))
+    db.session.refresh(analysed_video)
+    assert entry.last_hit is not None
+    assert analysed_video.last_used == entry.last_hit
+
+def test_entry_with_evicted_frames_is_stale(cache, analysed_video):
+    cache.store(CONTENT, PARAMS, analysed_video.id)
+    Frame.query.filter_by(video_id=analysed_video.id, frame_number=0).delete()
+    db.session.commit()
+    assert cache.lookup(CONTENT, PARAMS) is None
+    assert AnalysisCacheEntry.query.count() == 0
+    assert cache.stats()["stale"] == 1
+
+def test_purge_keeps_recently_hit_entries(cache, analysed_video):
+    cache.store(CONTENT, PARAMS, analysed_video.id)
+    other = dict(PARAMS, confidence=0.6)
+    cache.store(CONTENT, other, analysed_video.id)
+    old = datetime.now() - timedelta(days=10)
+    AnalysisCacheEntry.query.update({"created_at": old})
+    db.session.commit()
+    cache.lookup(CONTENT, PARAMS)
+    assert cache.purge(datetime.now() - timedelta(days=1)) == 1
+    assert cache.contains(CONTENT, PARAMS)
+    assert not cache.contains(CONTENT, other)
+
+def test_disabled_cache_never_hits(app, analysed_video):
+    app.config['ANALYSIS_CACHE'] = False
+    cache = AnalysisCache(app)
+    assert cache.store(CONTENT, PARAMS, analysed_video.id) is None
+    assert cache.lookup(CONTENT, PARAMS) is None
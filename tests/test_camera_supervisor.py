@@ -0,0 +1,56 @@
+import threading
+import time
+
+from camera_supervisor import CameraSupervisor, BACKOFF, LIVE, STOPPED
+
+def test_backoff_ceiling_doubles_up_to_max():
+    supervisor = CameraSupervisor(backoff_base=0.5, backoff_max=4.0)
+    ceilings = []
+    for failures in range(1, 7):
+        supervisor.failures = failures
+        delays = [supervisor.next_delay() for _ in range(50)]
+        ceiling = min(4.0, 0.5 * 2 ** (failures - 1))
+        assert all(ceiling / 2 <= delay <= ceiling for delay in delays)
+        ceilings.append(ceiling)
+    assert ceilings == [0.5, 1.0, 2.0, 4.0, 4.0, 4.0]
+
+def test_backoff_counts_failures_and_reports_the_delay():
+    supervisor = CameraSupervisor(backoff_base=0.01, backoff_max=0.01)
+    changes = []
+    supervisor.on_change = changes.append
+    assert supervisor.backoff("open failed")
+    assert supervisor.backoff("open failed")
+    assert supervisor.failures == 2
+    assert [entry["state"] for entry in changes] == [BACKOFF, BACKOFF]
+    assert changes[-1]["failures"] == 2 and 0.0 <= changes[-1]["retry_in"] <= 0.01
+
+def test_connected_resets_failures():
+    supervisor = CameraSupervisor(backoff_base=0.01, backoff_max=0.01)
+    supervisor.backoff("open failed")
+    supervisor.connected()
+    assert supervisor.failures == 0
+    assert supervisor.state == LIVE and supervisor.ever_live
+
+def test_stop_wakes_a_camera_in_backoff():
+    supervisor = CameraSupervisor(backoff_base=30.0, backoff_max=30.0)
+    threading.Timer(0.05, supervisor.stop).start()
+    started = time.monotonic()
+    assert not supervisor.backoff("open failed")
+    assert time.monotonic() - started < 5
+    assert supervisor.stopping
+
+def test_reset_clears_stop_and_failures():
+    supervisor = CameraSupervisor()
+    supervisor.failures = 3
+    supervisor.stop()
+    supervisor.reset()
+    assert not supervisor.stopping and supervisor.failures == 0
+
+def test_repeated_transition_is_recorded_once():
+    supervisor = CameraSupervisor()
+    changes = []
+    supervisor.on_change = changes.append
+    supervisor.transition(LIVE)
+    supervisor.transition(LIVE)
+    supervisor.transition(STOPPED, "stop requested")
+    assert [entry["state"] for entry in changes] == [LIVE, STOPPED]
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from frame_ring import FrameRing
+
+@pytest.fixture(params=[False, True], ids=["local", "shared"])
+def ring(request):
+    ring = FrameRing.create((4, 6, 3), slots=3, prefix="test", shared=request.param)
+    yield ring
+    ring.close()
+
+def frame(value, shape=(4, 6, 3)):
+    return np.full(shape, value, dtype=np.uint8)
+
+def test_read_returns_latest_frame_as_view(ring):
+    assert ring.read() is None
+    written = ring.write(frame(1), 1, frame_time=10.0)
+    seq, frame_time, view = ring.read()
+    assert (seq, frame_time) == (1, 10.0)
+    assert (view == 1).all()
+    written[0, 0, 0] = 99  # same slot memory, no copy
+    assert view[0, 0, 0] == 99
+
+def test_slot_reuse_invalidates_older_frames(ring):
+    for seq in range(1, 5):
+        ring.write(frame(seq), seq)
+    # seq 1 shared its slot with seq 4
+    assert not ring.holds(1)
+    assert ring.read(1) is None
+    assert ring.holds(2) and ring.holds(4)
+    assert (ring.read(2)[2] == 2).all()
+
+def test_slot_being_written_is_not_served(ring):
+    ring.write(frame(1), 1)
+    ring.write(frame(2), 2)
+    seen = {}
+
+    def annotate(view):
+        # The seqlock version is odd while the slot for seq 4 (reusing seq 1's) is written
+        seen["read"] = ring.read(4)
+        seen["holds"] = ring.holds(4)
+        seen["old"] = ring.holds(1)
+
+    ring.write(frame(3), 3)
+    ring.write(frame(4), 4, annotate=annotate)
+    assert seen == {"read": None, "holds": False, "old": False}
+    assert ring.holds(4)
+
+def test_smaller_and_grayscale_frames_fit(ring):
+    ring.write(frame(5, (2, 3, 3)), 1)
+    assert ring.read()[2].shape == (2, 3, 3)
+    ring.write(frame(6, (4, 6)), 2)
+    assert ring.read()[2].shape == (4, 6)
+    assert not ring.fits(frame(0, (8, 8, 3)))
+
+def test_attach_sees_frames_written_after_attaching():
+    ring = FrameRing.create((4, 6, 3), slots=2, prefix="test")
+    try:
+        reader = FrameRing.attach(ring.name)
+        try:
+            ring.write(frame(7), 1)
+            seq, _, view = reader.read()
+            assert seq == 1 and (view == 7).all()
+            assert reader.last_read is not None
+        finally:
+            reader.close()
+    finally:
+        ring.close()
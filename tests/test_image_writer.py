@@ -0,0 +1,79 @@
+import os
+import threading
+
+import numpy as np
+
+from image_writer import ImageWriterPool, WriteTracker
+
+def make_pool(**settings):
+    pool = ImageWriterPool()
+    pool.fsync_seconds = 0.05
+    for name, value in settings.items():
+        setattr(pool, name, value)
+    return pool
+
+def image(value=0):
+    return np.full((8, 8, 3), value, dtype=np.uint8)
+
+def test_tracker_waits_until_files_are_durable(tmp_path):
+    pool = make_pool()
+    tracker = WriteTracker()
+    durable = []
+    paths = [str(tmp_path / "frames" / f"frame_{i}.jpg") for i in range(5)]
+    for path in paths:
+        assert pool.submit(path, image(), on_durable=lambda p, size: durable.append((p, size)), tracker=tracker)
+    pool.flush(tracker)
+    assert tracker.pending == 0
+    assert sorted(p for p, _ in durable) == sorted(paths)
+    assert all(size > 0 for _, size in durable)
+    assert all(os.path.exists(path) for path in paths)
+    assert not [name for name in os.listdir(tmp_path / "frames") if name.endswith(".tmp")]
+    assert pool.stats()["written"] == 5
+
+def test_tracker_only_waits_for_its_own_frames(tmp_path):
+    pool = make_pool(threads=2, fsync_batch=1)
+    started, release = threading.Event(), threading.Event()
+
+    def slow(path, size):
+        started.set()
+        release.wait(5)
+
+    # A slow callback keeps one worker busy, as another camera's queued frames would
+    pool.submit(str(tmp_path / "slow.jpg"), image(), on_durable=slow)
+    assert started.wait(2)
+    tracker = WriteTracker()
+    pool.submit(str(tmp_path / "mine.jpg"), image(), tracker=tracker)
+    assert tracker.wait(2)
+    assert os.path.exists(tmp_path / "mine.jpg")
+    release.set()
+    pool.flush()
+
+def test_failed_write_releases_the_tracker(tmp_path):
+    pool = make_pool()
+    blocker = tmp_path / "not_a_folder"
+    blocker.write_text("")
+    tracker = WriteTracker()
+    pool.submit(str(blocker / "frame.jpg"), image(), tracker=tracker)
+    assert tracker.wait(2)
+    stats = pool.stats()
+    assert stats["failed"] == 1 and stats["written"] == 0
+    assert stats["last_error"]
+
+def test_dropped_frame_releases_the_tracker(tmp_path):
+    pool = make_pool(threads=1, queue_size=1, fsync_batch=1)
+    started, release = threading.Event(), threading.Event()
+
+    def hold(path, size):
+        started.set()
+        release.wait(5)
+
+    pool.submit(str(tmp_path / "held.jpg"), image(), on_durable=hold)
+    assert started.wait(2)
+    pool.submit(str(tmp_path / "queued.jpg"), image(), block=False)
+    tracker = WriteTracker()
+    assert not pool.submit(str(tmp_path / "dropped.jpg"), image(), block=False, tracker=tracker)
+    assert tracker.pending == 0
+    assert pool.stats()["dropped"] == 1
+    release.set()
+    pool.flush()
+    assert not os.path.exists(tmp_path / "dropped.jpg")
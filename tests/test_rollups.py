@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from db_models import db, Video, Frame, DetectedObject, VideoObjectCount, CameraObjectBucket
+from rollups import record_frame_detections, rebuild_rollups
+from storage import storage_manager
+
+START = datetime(2026, 1, 5, 8, 0, 0)
+
+def add_frame(video, when, detections, image_path):
+    frame = Frame(frame_number=0, timestamp=when, video_id=video.id, image_path=image_path,
+                  file_size=100, object_count=sum(detections.values()))
+    db.session.add(frame)
+    db.session.flush()
+    for name, count in detections.items():
+        for _ in range(count):
+            db.session.add(DetectedObject(object_name=name, probability=0.9, frame_id=frame.id))
+    record_frame_detections(video.id, detections, camera_index=0, timestamp=when)
+    db.session.commit()
+    storage_manager.record_frame(video.id, 100, camera_index=0)
+    return frame
+
+def rollups():
+    videos = {(row.video_id, row.object_name): (row.object_count, row.frame_count)
+              for row in VideoObjectCount.query.all()}
+    buckets = {(row.object_name, row.granularity, row.bucket_start): (row.object_count, row.frame_count)
+               for row in CameraObjectBucket.query.all()}
+    return videos, buckets
+
+@pytest.fixture
+def camera(app, tmp_path):
+    app.config.update(STORAGE_GLOBAL_QUOTA_MB=0, STORAGE_CAMERA_QUOTAS={}, STORAGE_LOW_WATERMARK=0.5,
+                      RETENTION_CHUNK_SIZE=1)
+    storage_manager.init_app(app)
+    storage_manager.load_baseline()
+    video = Video(filename="camera_0_live")
+    db.session.add(video)
+    db.session.commit()
+    for minute in range(10):
+        path = tmp_path / f"frame_{minute}.jpg"
+        path.write_bytes(b"x" * 100)
+        detections = {"person": 1 + minute % 2} if minute < 5 else {"person": 1, "car": 2}
+        add_frame(video, START + timedelta(minutes=minute), detections, str(path))
+    return video
+
+def test_eviction_discounts_rollups(app, camera):
+    # 1000 bytes of frames against a 600 byte quota: evict down to 300 bytes, oldest first
+    app.config['STORAGE_CAMERA_QUOTAS'] = {0: 600 / 1_048_576}
+    assert storage_manager.evict() == 7
+    assert Frame.query.count() == 3
+    after_eviction = rollups()
+    rebuild_rollups()
+    assert after_eviction == rollups()
+    videos, buckets = after_eviction
+    assert videos[(camera.id, "car")] == (6, 3)
+    assert videos[(camera.id, "person")] == (3, 3)
+    assert ("person", "minute", START) not in buckets
+
+def test_evicting_every_frame_of_a_class_drops_its_rows(app, camera):
+    app.config['STORAGE_CAMERA_QUOTAS'] = {0: 600 / 1_048_576}
+    app.config['STORAGE_LOW_WATERMARK'] = 0.01
+    storage_manager.evict()
+    assert Frame.query.count() == 0
+    assert VideoObjectCount.query.count() == 0
+    assert CameraObjectBucket.query.count() == 0
@@ -0,0 +1,103 @@
+import hashlib
+import io
+import os
+import time
+
+import pytest
+
+import uploads
+from db_models import db, UploadSession, Video
+from uploads import UploadManager, UploadOffsetMismatch
+
+DATA = os.urandom(2500)
+
+def sha(data):
+    return hashlib.sha256(data).hexdigest()
+
+@pytest.fixture
+def manager(app):
+    app.config.update(UPLOAD_CHUNK_SIZE=1000, UPLOAD_EARLY_ANALYSIS=False)
+    return UploadManager(app)
+
+def put(manager, session, offset, data, checksum=None):
+    return manager.write_chunk(session, offset, io.BytesIO(data), checksum or sha(data))
+
+def wait_for_state(session, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        db.session.refresh(session)
+        if session.status not in ('uploading', 'analyzing'):
+            return session.status
+        time.sleep(0.02)
+    return session.status
+
+def test_chunks_advance_the_offset(manager):
+    session = manager.create(None, "clip.mp4", len(DATA), sha256=sha(DATA))
+    assert put(manager, session, 0, DATA[:1000]) == 1000
+    assert put(manager, session, 1000, DATA[1000:2000]) == 2000
+    assert manager.status(session)["offset"] == 2000
+    with open(manager.part_path(session.id), 'rb') as f:
+        assert f.read() == DATA[:2000]
+
+def test_wrong_offset_reports_where_to_resume(manager):
+    session = manager.create(None, "clip.mp4", len(DATA))
+    put(manager, session, 0, DATA[:1000])
+    with pytest.raises(UploadOffsetMismatch) as conflict:
+        put(manager, session, 0, DATA[:1000])
+    assert conflict.value.offset == 1000
+    with pytest.raises(UploadOffsetMismatch):
+        put(manager, session, 2000, DATA[2000:])
+    assert manager.stats()["offset_conflicts"] == 2
+
+def test_rejected_chunks_keep_nothing(manager):
+    session = manager.create(None, "clip.mp4", len(DATA))
+    put(manager, session, 0, DATA[:1000])
+    with pytest.raises(ValueError, match="checksum"):
+        put(manager, session, 1000, DATA[1000:2000], checksum=sha(b"other"))
+    with pytest.raises(ValueError, match="larger"):
+        put(manager, session, 1000, DATA[1000:2001])
+    with pytest.raises(ValueError, match="Empty"):
+        put(manager, session, 1000, b"")
+    db.session.refresh(session)
+    assert session.received == 1000
+    assert os.path.getsize(manager.part_path(session.id)) == 1000
+
+def test_resume_after_restart_completes_with_the_whole_file_hash(app, manager, monkeypatch):
+    analysed = []
+    monkeypatch.setattr(uploads, "run_analysis", lambda video, params, profile: analysed.append(video.id) or True)
+    session = manager.create(None, "clip.mp4", len(DATA), sha256=sha(DATA))
+    put(manager, session, 0, DATA[:1000])
+    # A new process knows only the session row and the .part file
+    restarted = UploadManager(app)
+    session = db.session.get(UploadSession, session.id)
+    assert restarted.status(session)["offset"] == 1000
+    put(restarted, session, 1000, DATA[1000:2000])
+    put(restarted, session, 2000, DATA[2000:])
+    restarted.complete(session)
+    assert wait_for_state(session) == 'done'
+    video = db.session.get(Video, session.video_id)
+    assert video.content_hash == sha(DATA)
+    assert analysed == [video.id]
+    with open(os.path.join(app.config['VIDEOS_FOLDER'], video.filename), 'rb') as f:
+        assert f.read() == DATA
+
+def test_complete_rejects_short_or_corrupt_uploads(manager):
+    session = manager.create(None, "clip.mp4", len(DATA), sha256=sha(b"something else"))
+    put(manager, session, 0, DATA[:1000])
+    with pytest.raises(ValueError, match="1000 of 2500"):
+        manager.complete(session)
+    put(manager, session, 1000, DATA[1000:2000])
+    put(manager, session, 2000, DATA[2000:])
+    with pytest.raises(ValueError, match="checksum"):
+        manager.complete(session)
+    db.session.refresh(session)
+    assert session.status == 'failed'
+    assert not os.path.exists(manager.part_path(session.id))
+    with pytest.raises(ValueError, match="failed"):
+        put(manager, session, 2500, b"x")
+
+def test_create_validates_the_request(manager):
+    with pytest.raises(ValueError):
+        manager.create(None, "clip.mp4", 0)
+    with pytest.raises(ValueError):
+        manager.create(None, "clip.mp4", 10, sha256="not-a-digest")
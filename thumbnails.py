@@ -0,0 +1,151 @@
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import cv2
+import numpy as np
+from flask import Response, request
+
+PLACEHOLDER_PATH = "static/images/camera-offline.jpg"
+
+class ThumbnailService:
+    """Keeps one downscaled JPEG per camera and serves it with HTTP validators.
+
+    A live camera's thumbnail is re-encoded at most once per interval, and
+    only if the analyzer has published a newer frame since. Idle cameras use
+    their most recent saved frame, cached by path and mtime, and the offline
+    placeholder is built once per camera. Every entry carries an ETag and a
+    Last-Modified time so an unchanged thumbnail is answered with a 304.
+    """
+
+    def __init__(self, app=None):
+        self.width = 320
+        self.interval = 5.0
+        self.quality = 80
+        self._lock = threading.Lock()
+        self._entries = {}   # (kind, camera_index) -> entry dict
+        self._building = {}  # key -> Event set when its build in flight finishes
+        self.metrics = {"encodes": 0, "hits": 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.width = app.config['THUMBNAIL_WIDTH']
+        self.interval = app.config['THUMBNAIL_INTERVAL_SECONDS']
+        self.quality = app.config['THUMBNAIL_JPEG_QUALITY']
+        app.extensions['thumbnails'] = self
+
+    def _encode(self, frame):
+        height, width = frame.shape[:2]
+        if width > self.width:
+            size = (self.width, max(1, int(height * self.width / width)))
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ret:
+            return None
+        with self._lock:
+            self.metrics["encodes"] += 1
+        return buffer.tobytes()
+
+    @staticmethod
+    def _entry(jpeg, source, modified):
+        return {
+            "jpeg": jpeg,
+            "etag": hashlib.sha1(jpeg).hexdigest(),
+            "last_modified": datetime.fromtimestamp(int(modified), timezone.utc),
+            "source": source,
+            "generated_at": time.time(),
+        }
+
+    def _cached(self, key, source, build, max_age=None):
+        """Return the entry for key, rebuilding it only when source changed (and max_age has passed).
+
+        The lock only guards the lookup and the insert; build() runs outside
+        it, so cameras are encoded in parallel. Concurrent requests for the
+        same key wait for the one build in flight and share its result.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (
+                entry["source"] == source
+                or (max_age is not None and time.time() - entry["generated_at"] < max_age)
+            ):
+                self.metrics["hits"] += 1
+                return entry
+            in_flight = self._building.get(key)
+            if in_flight is None:
+                in_flight = self._building[key] = threading.Event()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            in_flight.wait()
+            with self._lock:
+                return self._entries.get(key, entry)
+        built = None
+        try:
+            built = build()
+            if built is not None:
+                jpeg, modified = built
+                entry = self._entry(jpeg, source, modified)
+        finally:
+            with self._lock:
+                if built is not None:
+                    self._entries[key] = entry
+                del self._building[key]
+            in_flight.set()
+        return entry
+
+    def live(self, camera_index, instance):
+        """Thumbnail of the analyzer's current frame, or None if it has no frame yet"""
+        seq, frame_time, frame = instance.get_frame_info()
+        if frame is None:
+            return None
+
+        def build():
+            jpeg = self._encode(frame)
+            if not instance.frame_still_valid(seq):
+                return None  # overwritten in the frame ring mid-encode; keep the previous entry
+            return (jpeg, frame_time or time.time()) if jpeg else None
+        return self._cached(('live', camera_index), (id(instance), seq), build, max_age=self.interval)
+
+    def saved(self, camera_index, image_path):
+        """Thumbnail of a saved frame file, or None if it cannot be read"""
+        try:
+            mtime = os.path.getmtime(image_path)
+        except OSError:
+            return None
+
+        def build():
+            frame = cv2.imread(image_path)
+            if frame is None:
+                return None
+            jpeg = self._encode(frame)
+            return (jpeg, mtime) if jpeg else None
+        return self._cached(('saved', camera_index), (image_path, mtime), build)
+
+    def placeholder(self, camera_index):
+        """Offline placeholder, read or drawn once per camera"""
+        def build():
+            if os.path.exists(PLACEHOLDER_PATH):
+                with open(PLACEHOLDER_PATH, 'rb') as f:
+                    return f.read(), os.path.getmtime(PLACEHOLDER_PATH)
+            black_img = np.zeros((480, 640, 3), dtype=np.uint8)
+            text = f"Camera {camera_index} Offline"
+            cv2.putText(black_img, text, (80, 240), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+            ret, buffer = cv2.imencode('.jpg', black_img)
+            return (buffer.tobytes(), time.time()) if ret else None
+        return self._cached(('offline', camera_index), 'placeholder', build)
+
+def thumbnail_response(entry):
+    """JPEG response for a cached entry; answers 304 when the client's validators still match"""
+    response = Response(entry["jpeg"], mimetype='image/jpeg')
+    response.set_etag(entry["etag"])
+    response.last_modified = entry["last_modified"]
+    # Let browsers keep the image but revalidate it on every use
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+thumbnail_service = ThumbnailService()
@@ -0,0 +1,676 @@
+import hashlib
+import logging
+import os
+import struct
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import cv2
+from flask import current_app
+
+from analysis_cache import analysis_cache
+from analyzer import VideoAnalyzer
+from db_models import db, Video, Frame, DetectedObject, UploadSession
+from image_writer import image_writer
+from rollups import record_frame_detections
+from storage import storage_manager
+from storage_profiles import upload_profile
+
+logger = logging.getLogger("uploads")
+
+COPY_BUFFER_SIZE = 1024 * 1024
+PART_FOLDER = ".uploads"  # Inside VIDEOS_FOLDER; unfinished uploads, swept by retention once stale
+FRAGMENTS_PER_BATCH = 8  # Fragments decoded and analysed together while an upload is arriving
+
+def save_upload(stream, path):
+    """Stream an upload to path, hashing it on the way; returns (sha256 hex digest, size)"""
+    digest = hashlib.sha256()
+    size = 0
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'wb') as f:
+        while True:
+            chunk = stream.read(COPY_BUFFER_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            f.write(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+def find_duplicate(content_hash, videos_folder, exclude_id=None):
+    """An earlier upload with the same content whose file is still on disk, or None"""
+    query = Video.query.filter(Video.content_hash == content_hash)
+    if exclude_id is not None:
+        query = query.filter(Video.id != exclude_id)
+    for video in query.order_by(Video.id):
+        if os.path.isfile(os.path.join(videos_folder, video.filename)):
+            return video
+    return None
+
+def upload_filename(original_name):
+    """Name an uploaded video is stored under in VIDEOS_FOLDER"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"{timestamp}_{os.path.splitext(os.path.basename(original_name))[0]}.mp4"
+
+def register_upload(path, filename, user_id, content_hash, file_size, video=None):
+    """Store the uploaded file at path as filename in VIDEOS_FOLDER and record its Video.
+
+    Content already on disk under another upload is kept once: the new copy
+    is removed, the video points at the existing file and that file's mtime
+    is renewed so retention keeps it as long as a fresh upload. video
+    updates an existing row (one created while the upload was still
+    arriving) instead of adding one. Must run inside an app context.
+    """
+    videos_folder = current_app.config['VIDEOS_FOLDER']
+    duplicate = find_duplicate(content_hash, videos_folder, exclude_id=video.id if video is not None else None)
+    if duplicate is not None:
+        # Same bytes already on disk: keep one copy and count it once
+        duplicate_path = os.path.join(videos_folder, duplicate.filename)
+        if os.path.abspath(path) != os.path.abspath(duplicate_path):  # same name within the same second
+            os.remove(path)
+        os.utime(duplicate_path)
+        filename, file_size = duplicate.filename, 0
+    else:
+        final_path = os.path.join(videos_folder, filename)
+        if os.path.abspath(path) != os.path.abspath(final_path):
+            os.replace(path, final_path)
+    if video is None:
+        video = Video(user_id=user_id)
+        db.session.add(video)
+    video.filename = filename
+    video.file_size = file_size
+    video.content_hash = content_hash
+    db.session.commit()
+    storage_manager.record_upload(video.file_size)
+    return video
+
+def analysis_params(config, storage_profile):
+    """Every setting that changes an upload's analysis, as used for the analysis cache"""
+    video_config = config['ANALYSIS_CONFIG']["video"]
+    return {
+        "model": config['YOLO_MODEL_PATH'],
+        "confidence": video_config["confidence"],
+        "include_classes": sorted(video_config["include_classes"]),
+        "frame_interval": video_config["frame_interval"],
+        "min_objects": video_config["min_objects"],
+        "storage_profile": storage_profile.to_dict(),
+    }
+
+def link_cached_analysis(video, params):
+    """Point video at an earlier analysis of the same content and settings; False if there is none"""
+    cached = analysis_cache.lookup(video.content_hash, params)
+    if cached is None:
+        return False
+    video.results_video_id = cached.video_id
+    video.analysis_result = db.session.get(Video, cached.video_id).analysis_result
+    db.session.commit()
+    return True
+
+def save_analysis_result(video, analysis_folder):
+    """Copy the analysis summary written by VideoAnalyzer onto the video"""
+    summary_path = os.path.join(analysis_folder, "activity_summary.txt")
+    if os.path.exists(summary_path):
+        with open(summary_path, 'r') as f:
+            video.analysis_result = f.read().strip()
+        db.session.commit()
+
+def store_activity_frames(video, frames_folder, activity_details, storage_profile):
+    """Add Frame and DetectedObject rows for analysed frames saved in frames_folder"""
+    for filename, frame_data in activity_details.items():
+        try:
+            frame_number = int(filename.split('_')[1].split('.')[0])
+        except (IndexError, ValueError):
+            frame_number = 0
+        image_path = os.path.join(frames_folder, filename)
+        file_size = os.path.getsize(image_path) if os.path.exists(image_path) else 0
+        thumbnail_path = storage_profile.thumbnail_path(image_path)
+        if thumbnail_path and os.path.exists(thumbnail_path):
+            file_size += os.path.getsize(thumbnail_path)
+        else:
+            thumbnail_path = None
+        frame = Frame(
+            frame_number=frame_number,
+            image_path=image_path,
+            thumbnail_path=thumbnail_path,
+            video_id=video.id,
+            object_count=sum(len(confidences) for confidences in frame_data.values()),
+            file_size=file_size
+        )
+        db.session.add(frame)
+        db.session.flush()
+        for obj_name, confidences in frame_data.items():
+            for confidence in confidences:
+                obj = DetectedObject(
+                    object_name=obj_name,
+                    object_type=DetectedObject.get_type_code(obj_name),
+                    probability=confidence,
+                    frame_id=frame.id
+                )
+                db.session.add(obj)
+        record_frame_detections(
+            video.id,
+            {obj_name: len(confidences) for obj_name, confidences in frame_data.items()}
+        )
+        db.session.commit()
+        storage_manager.record_frame(video.id, file_size)
+
+def run_analysis(video, params, storage_profile):
+    """Analyse a registered upload into its frames and summary; returns False if the analysis failed"""
+    analyzer = VideoAnalyzer(
+        video_path=os.path.join(current_app.config['VIDEOS_FOLDER'], video.filename),
+        output_folder=current_app.config['OUTPUT_FOLDER'],
+        yolo_model_path=params["model"],
+        storage_profile=storage_profile
+    )
+    result = analyzer.analyze_video(
+        frame_interval=params["frame_interval"],
+        min_objects=params["min_objects"],
+        confidence=params["confidence"],
+        include_classes=params["include_classes"],
+    )
+    if not (result and len(result) == 2):
+        return False
+    analysis_folder, activity_details = result
+    save_analysis_result(video, analysis_folder)
+    store_activity_frames(video, os.path.join(analysis_folder, "activity_frames"), activity_details, storage_profile)
+    analysis_cache.store(video.content_hash, params, video.id)
+    return True
+
+# --- Fragmented MP4 ---
+
+def _boxes(f, start, end):
+    """Yield (type, start, end, header size) for the complete ISO-BMFF boxes in [start, end)"""
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        header = f.read(16)
+        size, box_type = struct.unpack('>I4s', header[:8])
+        header_size = 8
+        if size == 1:
+            if len(header) < 16:
+                return
+            size = struct.unpack('>Q', header[8:16])[0]
+            header_size = 16
+        elif size == 0:
+            return  # runs to the end of the file, so never known to be complete while uploading
+        if size < header_size or pos + size > end:
+            return
+        yield box_type, pos, pos + size, header_size
+        pos += size
+
+def fragment_layout(path, size):
+    """Where the complete fragments of a fragmented MP4 are within its first size bytes.
+
+    Returns (init_end, [(start, end), ...]): the init segment (ftyp + moov)
+    is bytes [0, init_end) and each complete moof + mdat pair one range.
+    init_end is None while the moov has not fully arrived. Returns None for
+    anything that is not a fragmented MP4 (samples outside fragments, no
+    mvex in the moov, not ISO-BMFF at all), which is only decodable whole.
+    """
+    init_end = None
+    fragments = []
+    moof_start = None
+    with open(path, 'rb') as f:
+        for box_type, start, end, header_size in _boxes(f, 0, size):
+            if start == 0 and box_type != b'ftyp':
+                return None
+            if box_type == b'moov':
+                if not any(child == b'mvex' for child, *_ in _boxes(f, start + header_size, end)):
+                    return None
+                init_end = end
+            elif box_type == b'moof':
+                if init_end is None:
+                    return None
+                moof_start = start
+            elif box_type == b'mdat':
+                if moof_start is None:
+                    return None
+                fragments.append((moof_start, end))
+                moof_start = None
+    return init_end, fragments
+
+class UploadOffsetMismatch(ValueError):
+    """A chunk was sent for an offset other than where the upload stands"""
+
+    def __init__(self, offset):
+        super().__init__(f"Upload is at offset {offset}")
+        self.offset = offset
+
+class _UploadAnalysis:
+    """Analyses a fragmented MP4 upload fragment by fragment while the rest arrives.
+
+    Each batch of newly completed fragments is written after the init segment
+    into a small snapshot file, decoded, sampled every frame_interval frames
+    (counted across the whole video) and run through the detector; frames
+    with activity are stored straight away, so results show up while the
+    upload is still going. Fragments have to start on a keyframe, as with
+    ffmpeg's -movflags frag_keyframe. The content hash is only known once the
+    upload completes, so an upload whose declared sha256 already has a cached
+    analysis is never analysed early; one that declared no hash is, even if
+    it turns out to be a duplicate.
+    """
+
+    def __init__(self, manager, session, params, storage_profile):
+        self.manager = manager
+        self.app = manager.app
+        self.upload_id = session.id
+        self.path = manager.part_path(session.id)
+        self.params = params
+        self.storage_profile = storage_profile
+        self.received = session.received
+        self.complete = False
+        self.cancelled = False
+        self.content_hash = None
+        self.started = time.time()
+        self.fragments_done = 0
+        self.frames_decoded = 0
+        self.frames_analyzed = 0
+        self.frames_with_activity = 0
+        self.first_result_seconds = None
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=f"upload-{session.id[:8]}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def advance(self, received, content_hash=None):
+        """More bytes are on disk; content_hash marks the upload as complete"""
+        with self._cond:
+            self.received = received
+            if content_hash is not None:
+                self.complete = True
+                self.content_hash = content_hash
+            self._cond.notify()
+
+    def cancel(self):
+        with self._cond:
+            self.cancelled = True
+            self._cond.notify()
+
+    def progress(self):
+        return {
+            "early": True,
+            "fragments": self.fragments_done,
+            "frames_analyzed": self.frames_analyzed,
+            "frames_with_activity": self.frames_with_activity,
+            "first_result_seconds": self.first_result_seconds,
+        }
+
+    def _run(self):
+        with self.app.app_context():
+            try:
+                self._analyze()
+            except Exception as e:
+                logger.exception(f"Early analysis of upload {self.upload_id} failed: {e}")
+                self.manager._fail(self.upload_id, f"Analysis failed: {e}")
+            finally:
+                self.manager._analysis_done(self.upload_id)
+                db.session.remove()
+
+    def _analyze(self):
+        session = db.session.get(UploadSession, self.upload_id)
+        video = Video(filename=session.filename, user_id=session.user_id)
+        db.session.add(video)
+        db.session.commit()
+        session.video_id = video.id
+        db.session.commit()
+        analyzer = VideoAnalyzer(
+            video_path=self.path,
+            output_folder=self.app.config['OUTPUT_FOLDER'],
+            yolo_model_path=self.params["model"],
+            confidence=self.params["confidence"],
+            include_classes=self.params["include_classes"],
+            storage_profile=self.storage_profile
+        )
+        run = analyzer.begin_activity()
+        if run is None:
+            raise RuntimeError("could not load the detection model")
+        while True:
+            with self._cond:
+                received, complete, cancelled = self.received, self.complete, self.cancelled
+            if cancelled:
+                return
+            init_end, fragments = fragment_layout(self.path, received) or (None, [])
+            pending = fragments[self.fragments_done:self.fragments_done + FRAGMENTS_PER_BATCH]
+            if pending:
+                frames = self._decode(init_end, pending)
+                self.fragments_done += len(pending)
+                found = analyzer.detect_activity_batch(run, frames, self.params["min_objects"])
+                self.frames_analyzed += len(frames)
+                if found:
+                    image_writer.flush(run["writes"])
+                    store_activity_frames(video, run["frames_folder"], found, self.storage_profile)
+                    self.frames_with_activity += len(found)
+                    if self.first_result_seconds is None:
+                        self.first_result_seconds = round(time.time() - self.started, 3)
+                continue
+            if complete:
+                break
+            with self._cond:
+                if self.received == received and not self.complete and not self.cancelled:
+                    self._cond.wait()
+        result = analyzer.finish_activity(run)
+        session = db.session.get(UploadSession, self.upload_id)
+        video = register_upload(self.path, session.filename, session.user_id, self.content_hash,
+                                session.total_size, video=video)
+        if not (result and len(result) == 2):
+            raise RuntimeError("Video analysis failed")
+        save_analysis_result(video, result[0])
+        analysis_cache.store(video.content_hash, self.params, video.id)
+        self.manager._set_status(self.upload_id, 'done')
+        logger.info(f"Upload {self.upload_id} analysed as it arrived: {self.fragments_done} fragments, "
+                    f"first result after {self.first_result_seconds}s")
+
+    def _decode(self, init_end, fragments):
+        """Decode the init segment plus fragments, returning every frame_interval-th frame of the video"""
+        snapshot = f"{self.path}.snap.mp4"
+        with open(self.path, 'rb') as src, open(snapshot, 'wb') as dst:
+            dst.write(src.read(init_end))
+            for start, end in fragments:
+                src.seek(start)
+                remaining = end - start
+                while remaining:
+                    data = src.read(min(COPY_BUFFER_SIZE, remaining))
+                    if not data:
+                        break
+                    dst.write(data)
+                    remaining -= len(data)
+        frames = []
+        cap = cv2.VideoCapture(snapshot)
+        try:
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if self.frames_decoded % self.params["frame_interval"] == 0:
+                    frames.append(frame)
+                self.frames_decoded += 1
+        finally:
+            cap.release()
+            os.remove(snapshot)
+        return frames
+
+class UploadManager:
+    """Chunked, resumable video uploads whose analysis can start before the last chunk.
+
+    A client creates a session, then PUTs chunks at the offset the server
+    reports, each with its SHA-256. Chunks are synced to the .part file
+    before the offset moves, so after a dropped connection or a restart the
+    client resumes from the session's offset. A running hash of the whole
+    file is kept per session so completing it does not read the file again.
+
+    Fragmented MP4 uploads are analysed as their fragments arrive (see
+    _UploadAnalysis); anything else is analysed once complete, through the
+    analysis cache like a plain /analyze upload. Either way analysis runs
+    in the background and the session reports its progress.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.chunk_size = 8 * 1024 * 1024
+        self.early_analysis = True
+        self._lock = threading.Lock()
+        self._session_locks = {}
+        self._hashers = {}  # upload_id -> (running sha256, bytes hashed)
+        self._analyses = {}  # upload_id -> _UploadAnalysis for fragmented uploads
+        self._whole_file = set()  # upload_ids known not to be fragmented MP4
+        self.metrics = {"sessions": 0, "chunks": 0, "bytes": 0, "checksum_failures": 0,
+                        "offset_conflicts": 0, "completed": 0, "failed": 0, "early_analyses": 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.chunk_size = app.config['UPLOAD_CHUNK_SIZE']
+        self.early_analysis = app.config['UPLOAD_EARLY_ANALYSIS']
+        app.extensions['upload_manager'] = self
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.metrics[key] += amount
+
+    def part_path(self, upload_id):
+        return os.path.join(self.app.config['VIDEOS_FOLDER'], PART_FOLDER, f"{upload_id}.part")
+
+    def _session_lock(self, upload_id):
+        with self._lock:
+            return self._session_locks.setdefault(upload_id, threading.Lock())
+
+    def create(self, user_id, original_name, total_size, sha256=None, storage_profile=None):
+        """Open an upload session. Must run inside an app context."""
+        if total_size <= 0:
+            raise ValueError("Upload size must be positive")
+        if sha256 is not None and (len(sha256) != 64 or any(c not in '0123456789abcdef' for c in sha256.lower())):
+            raise ValueError("sha256 must be a hex SHA-256 digest")
+        upload_profile(self.app.config, storage_profile)  # reject unknown profiles up front
+        session = UploadSession(
+            id=uuid.uuid4().hex,
+            user_id=user_id,
+            filename=upload_filename(original_name),
+            total_size=total_size,
+            received=0,
+            sha256=sha256.lower() if sha256 else None,
+            storage_profile=storage_profile,
+            status='uploading',
+            updated_at=datetime.now()
+        )
+        db.session.add(session)
+        db.session.commit()
+        os.makedirs(os.path.dirname(self.part_path(session.id)), exist_ok=True)
+        open(self.part_path(session.id), 'wb').close()
+        self._count("sessions")
+        return session
+
+    def _file_hash(self, upload_id, path, offset):
+        """Running SHA-256 of the first offset bytes, from memory or by re-reading them after a restart"""
+        cached = self._hashers.get(upload_id)
+        if cached is not None and cached[1] == offset:
+            return cached[0].copy()
+        digest = hashlib.sha256()
+        remaining = offset
+        with open(path, 'rb') as f:
+            while remaining:
+                data = f.read(min(COPY_BUFFER_SIZE, remaining))
+                if not data:
+                    raise ValueError(f"Upload file is shorter than its offset {offset}")
+                digest.update(data)
+                remaining -= len(data)
+        return digest
+
+    def write_chunk(self, session, offset, stream, chunk_sha256):
+        """Write one chunk at offset and return the new offset.
+
+        Raises UploadOffsetMismatch if offset is not where the upload stands
+        and ValueError for a chunk that is too large or fails its checksum;
+        either way nothing is kept and the offset does not move.
+        """
+        with self._session_lock(session.id):
+            db.session.refresh(session)
+            if session.status != 'uploading':
+                raise ValueError(f"Upload is {session.status}")
+            if offset != session.received:
+                self._count("offset_conflicts")
+                raise UploadOffsetMismatch(session.received)
+            path = self.part_path(session.id)
+            limit = min(self.chunk_size, session.total_size - offset)
+            file_hash = self._file_hash(session.id, path, offset)
+            chunk_hash = hashlib.sha256()
+            size = 0
+            with open(path, 'r+b') as f:
+                f.seek(offset)
+                try:
+                    while True:
+                        data = stream.read(min(COPY_BUFFER_SIZE, limit - size + 1))
+                        if not data:
+                            break
+                        size += len(data)
+                        if size > limit:
+                            raise ValueError(f"Chunk is larger than the {limit} bytes allowed at offset {offset}")
+                        chunk_hash.update(data)
+                        file_hash.update(data)
+                        f.write(data)
+                    if size == 0:
+                        raise ValueError("Empty chunk")
+                    if chunk_hash.hexdigest() != (chunk_sha256 or '').lower():
+                        self._count("checksum_failures")
+                        raise ValueError("Chunk checksum mismatch")
+                    f.flush()
+                    os.fsync(f.fileno())
+                except BaseException:
+                    f.truncate(offset)
+                    raise
+            session.received = offset + size
+            session.updated_at = datetime.now()
+            db.session.commit()
+            self._hashers[session.id] = (file_hash, session.received)
+            self._count("chunks")
+            self._count("bytes", size)
+        self._feed_analysis(session)
+        return session.received
+
+    def _feed_analysis(self, session):
+        """Hand new bytes to the session's early analysis, starting it once a fragment is complete"""
+        analysis = self._analyses.get(session.id)
+        if analysis is not None:
+            analysis.advance(session.received)
+            return
+        if not self.early_analysis or session.id in self._whole_file:
+            return
+        layout = fragment_layout(self.part_path(session.id), session.received)
+        if layout is None:
+            self._whole_file.add(session.id)
+            return
+        init_end, fragments = layout
+        if init_end is None or not fragments:
+            return
+        params = self._params(session)
+        if analysis_cache.contains(session.sha256, params):
+            # Already analysed: completion checks the hash and links the cached results instead
+            self._whole_file.add(session.id)
+            return
+        analysis = _UploadAnalysis(self, session, params, upload_profile(self.app.config, session.storage_profile))
+        with self._lock:
+            if session.id in self._analyses:
+                return
+            self._analyses[session.id] = analysis
+        self._count("early_analyses")
+        analysis.start()
+
+    def _params(self, session):
+        return analysis_params(self.app.config, upload_profile(self.app.config, session.storage_profile))
+
+    def complete(self, session):
+        """Check the whole upload and hand it to analysis. Completing again just reports the session."""
+        with self._session_lock(session.id):
+            db.session.refresh(session)
+            if session.status != 'uploading':
+                return session
+            if session.received != session.total_size:
+                raise ValueError(f"Upload has {session.received} of {session.total_size} bytes")
+            path = self.part_path(session.id)
+            content_hash = self._file_hash(session.id, path, session.received).hexdigest()
+            self._hashers.pop(session.id, None)
+            if session.sha256 and session.sha256 != content_hash:
+                self.discard(session, status='failed', error="File checksum mismatch")
+                raise ValueError("File checksum mismatch")
+            session.status = 'analyzing'
+            session.updated_at = datetime.now()
+            db.session.commit()
+        self._count("completed")
+        analysis = self._analyses.get(session.id)
+        if analysis is not None:
+            analysis.advance(session.received, content_hash=content_hash)
+        else:
+            threading.Thread(target=self._analyze_whole, args=(session.id, content_hash),
+                             name=f"upload-{session.id[:8]}", daemon=True).start()
+        return session
+
+    def _analyze_whole(self, upload_id, content_hash):
+        """Analyse a completed upload that could not be analysed while arriving"""
+        with self.app.app_context():
+            try:
+                session = db.session.get(UploadSession, upload_id)
+                storage_profile = upload_profile(self.app.config, session.storage_profile)
+                video = register_upload(self.part_path(upload_id), session.filename, session.user_id,
+                                        content_hash, session.total_size)
+                session.video_id = video.id
+                db.session.commit()
+                params = analysis_params(self.app.config, storage_profile)
+                if not link_cached_analysis(video, params) and not run_analysis(video, params, storage_profile):
+                    raise RuntimeError("Video analysis failed")
+                self._set_status(upload_id, 'done')
+            except Exception as e:
+                logger.exception(f"Analysis of upload {upload_id} failed: {e}")
+                self._fail(upload_id, str(e))
+            finally:
+                self._whole_file.discard(upload_id)
+                db.session.remove()
+
+    def _set_status(self, upload_id, status, error=None):
+        session = db.session.get(UploadSession, upload_id)
+        if session is None:
+            return
+        session.status = status
+        session.error = error
+        session.updated_at = datetime.now()
+        db.session.commit()
+
+    def _fail(self, upload_id, message):
+        db.session.rollback()
+        self._count("failed")
+        self._set_status(upload_id, 'failed', message)
+
+    def _analysis_done(self, upload_id):
+        with self._lock:
+            self._analyses.pop(upload_id, None)
+
+    def discard(self, session, status=None, error=None):
+        """Stop a session's analysis and remove its .part file; deletes the row unless given a status to keep"""
+        analysis = self._analyses.get(session.id)
+        if analysis is not None:
+            analysis.cancel()
+        try:
+            os.remove(self.part_path(session.id))
+        except FileNotFoundError:
+            pass
+        self._hashers.pop(session.id, None)
+        self._whole_file.discard(session.id)
+        with self._lock:
+            self._session_locks.pop(session.id, None)
+        if status is None:
+            db.session.delete(session)
+        else:
+            session.status = status
+            session.error = error
+            session.updated_at = datetime.now()
+        db.session.commit()
+
+    def purge(self, cutoff):
+        """Drop sessions last touched before cutoff, with the .part files of unfinished ones"""
+        stale = UploadSession.query.filter(UploadSession.updated_at < cutoff).all()
+        for session in stale:
+            self.discard(session)
+        return len(stale)
+
+    def status(self, session):
+        analysis = self._analyses.get(session.id)
+        return {
+            "upload_id": session.id,
+            "state": session.status,
+            "offset": session.received,
+            "size": session.total_size,
+            "chunk_size": self.chunk_size,
+            "video_id": session.video_id,
+            "error": session.error,
+            "analysis": analysis.progress() if analysis is not None else None,
+        }
+
+    def stats(self):
+        with self._lock:
+            metrics = dict(self.metrics)
+            metrics["active_early_analyses"] = len(self._analyses)
+        return metrics
+
+upload_manager = UploadManager()
@@ -5,13 +5,30 @@ from flask import (
 from flask_login import (
     current_user, login_user, logout_user, login_required
 )
-from db_models import db, Video, User, Frame, DetectedObject
+from sqlalchemy import literal
+from db_models import db, Video, User, Frame, DetectedObject, Clip, UploadSession
+from rollups import get_video_object_counts, get_camera_timeline
+from retention import retention_engine
+from storage import storage_manager
+from search import search_detections
+from streaming import ClientStream, get_mosaic, broadcaster_stats, mjpeg_part, placeholder_jpeg
+from thumbnails import thumbnail_service, thumbnail_response
+from overlays import overlay_renderer, overlay_response
+from analysis_cache import analysis_cache
+from uploads import (
+    save_upload, upload_filename, register_upload, analysis_params, link_cached_analysis, run_analysis,
+    upload_manager, UploadOffsetMismatch
+)
+from storage_profiles import upload_profile
+from frame_shards import iter_frame_files
+from events import event_bus, format_sse
 from forms import LoginForm, RegistrationForm
 import os
 import json
 import time
 import cv2
-from datetime import datetime
+from itertools import islice
+from datetime import datetime, timedelta
 from analyzer import VideoAnalyzer, RealtimeAnalyzer
 import threading
 import traceback
@@ -21,14 +38,30 @@ from flask import stream_with_context
 
 # Import analyzer state and logic from analyzer_state.py (NOT app.py)
 from analyzer_state import (
-    analyzer_threads, analyzer_instances, analyzer_running,
-    analyzer_lock, camera_last_access, start_analyzer_thread, stop_analyzer_thread,
-    check_inactive_cameras, start_all_camera_analyzers,
-    stop_all_analyzers, allow_analyzers_start
+    analyzer_threads, analyzer_instances, analyzer_running, analyzer_startups,
+    analyzer_lock, camera_last_access, start_analyzer_thread, stop_analyzer_thread, ensure_analyzer_started,
+    check_inactive_cameras, start_all_camera_analyzers, camera_status_snapshot,
+    stop_all_analyzers, allow_analyzers_start, camera_state, get_camera_history
 )
 
 main_bp = Blueprint('main', __name__)
 
+def _flag(value):
+    """Query-string boolean: 1/true/yes/on"""
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+def _can_view(video):
+    """True if the current user may see video: shared, theirs, or the results behind one of theirs"""
+    if video is None:
+        return False
+    if video.user_id is None or video.user_id == current_user.id:
+        return True
+    return Video.query.filter_by(results_video_id=video.id, user_id=current_user.id).first() is not None
+
+def _thumbnail_url(frame, fallback):
+    """URL of a frame's sidecar thumbnail, or fallback when it was saved without one"""
+    return f"/api/frame-image/{frame.id}?size=thumb" if frame.thumbnail_path else fallback
+
 @main_bp.route('/')
 def index():
     return render_template('index.html')
@@ -75,63 +108,28 @@ def analyze_video():
             if 'video' in request.files:
                 file = request.files['video']
                 if file.filename != '':
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    filename = f"{timestamp}_{os.path.splitext(file.filename)[0]}.mp4"
-                    os.makedirs(current_app.config['VIDEOS_FOLDER'], exist_ok=True)
+                    try:
+                        storage_profile = upload_profile(current_app.config, request.form.get('storage_profile'))
+                    except ValueError as e:
+                        return jsonify({"status": "error", "message": str(e)}), 400
+                    filename = upload_filename(file.filename)
                     video_path = os.path.join(current_app.config['VIDEOS_FOLDER'], filename)
-                    file.save(video_path)
-                    video = Video(
-                        filename=filename,
-                        user_id=current_user.id
-                    )
-                    db.session.add(video)
-                    db.session.commit()
-                    analyzer = VideoAnalyzer(
-                        video_path=video_path, 
-                        output_folder=current_app.config['OUTPUT_FOLDER'],
-                        yolo_model_path=current_app.config['YOLO_MODEL_PATH']
-                    )
-                    analysis_config = current_app.config['ANALYSIS_CONFIG']
-                    result = analyzer.analyze_video(
-                        frame_interval=analysis_config["video"]["frame_interval"],
-                        min_objects=analysis_config["video"]["min_objects"],
-                        confidence=analysis_config["video"]["confidence"],
-                        include_classes=analysis_config["video"]["include_classes"],
-                    )
-                    if result and len(result) == 2:
-                        analysis_folder, activity_details = result
-                        summary_path = os.path.join(analysis_folder, "activity_summary.txt")
-                        if os.path.exists(summary_path):
-                            with open(summary_path, 'r') as f:
-                                video.analysis_result = f.read().strip()
-                                db.session.commit()
-                        for filename, frame_data in activity_details.items():
-                            try:
-                                frame_number = int(filename.split('_')[1].split('.')[0])
-                            except (IndexError, ValueError):
-                                frame_number = 0
-                            frame = Frame(
-                                frame_number=frame_number,
-                                image_path=os.path.join(analysis_folder, "activity_frames", filename),
-                                video_id=video.id,
-                                object_count=sum(len(confidences) for confidences in frame_data.values())
-                            )
-                            db.session.add(frame)
-                            db.session.flush()
-                            for obj_name, confidences in frame_data.items():
-                                for confidence in confidences:
-                                    obj = DetectedObject(
-                                        object_name=obj_name,
-                                        object_type=DetectedObject.get_type_code(obj_name),
-                                        probability=confidence,
-                                        frame_id=frame.id
-                                    )
-                                    db.session.add(obj)
-                            db.session.commit()
+                    content_hash, file_size = save_upload(file.stream, video_path)
+                    video = register_upload(video_path, filename, current_user.id, content_hash, file_size)
+                    params = analysis_params(current_app.config, storage_profile)
+                    if link_cached_analysis(video, params):
+                        return jsonify({
+                            "status": "success",
+                            "message": "Video was analyzed before; linked to the stored results",
+                            "video_id": video.id,
+                            "cached": True
+                        })
+                    if run_analysis(video, params, storage_profile):
                         return jsonify({
                             "status": "success",
                             "message": "Video analyzed and results stored in database",
-                            "video_id": video.id
+                            "video_id": video.id,
+                            "cached": False
                         })
                     else:
                         return jsonify({
@@ -145,7 +143,82 @@ def analyze_video():
             current_app.logger.error(f"Error analyzing video: {e}")
             return jsonify({"status": "error", "message": f"Exception: {str(e)}"}), 500
     else:
-        return render_template('analyze.html')
+        return render_template(
+            'analyze.html',
+            storage_profiles=list(current_app.config['STORAGE_PROFILES']),
+            default_storage_profile=current_app.config['UPLOAD_STORAGE_PROFILE']
+        )
+
+def _upload_session(upload_id):
+    """The current user's upload session, or None"""
+    session = db.session.get(UploadSession, upload_id)
+    if session is None or session.user_id != current_user.id:
+        return None
+    return session
+
+@main_bp.route('/api/uploads', methods=['POST'])
+@login_required
+def create_upload():
+    try:
+        data = request.get_json(silent=True) or {}
+        try:
+            total_size = int(data.get('size', 0))
+            session = upload_manager.create(
+                current_user.id,
+                data.get('filename') or 'upload.mp4',
+                total_size,
+                sha256=data.get('sha256'),
+                storage_profile=data.get('storage_profile')
+            )
+        except (TypeError, ValueError) as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+        return jsonify({"status": "success", **upload_manager.status(session)}), 201
+    except Exception as e:
+        current_app.logger.error(f"Exception in create_upload: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@main_bp.route('/api/uploads/<upload_id>', methods=['GET', 'PUT', 'DELETE'])
+@login_required
+def upload_chunk(upload_id):
+    try:
+        session = _upload_session(upload_id)
+        if session is None:
+            return jsonify({"status": "error", "message": "Upload not found"}), 404
+        if request.method == 'GET':
+            return jsonify({"status": "success", **upload_manager.status(session)})
+        if request.method == 'DELETE':
+            upload_manager.discard(session)
+            return jsonify({"status": "success", "message": "Upload discarded"})
+        offset = request.args.get('offset', type=int)
+        if offset is None:
+            return jsonify({"status": "error", "message": "offset query parameter is required"}), 400
+        try:
+            upload_manager.write_chunk(session, offset, request.stream, request.headers.get('X-Chunk-SHA256'))
+        except UploadOffsetMismatch as e:
+            # The client lost track (e.g. a response never arrived): resume from here
+            return jsonify({"status": "error", "message": str(e), "offset": e.offset}), 409
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e), "offset": session.received}), 400
+        return jsonify({"status": "success", **upload_manager.status(session)})
+    except Exception as e:
+        current_app.logger.error(f"Exception in upload_chunk: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@main_bp.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+@login_required
+def complete_upload(upload_id):
+    try:
+        session = _upload_session(upload_id)
+        if session is None:
+            return jsonify({"status": "error", "message": "Upload not found"}), 404
+        try:
+            upload_manager.complete(session)
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e), **upload_manager.status(session)}), 400
+        return jsonify({"status": "success", **upload_manager.status(session)}), 202
+    except Exception as e:
+        current_app.logger.error(f"Exception in complete_upload: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
 
 @main_bp.route('/videos', methods=['GET'])
 @login_required
@@ -191,23 +264,29 @@ def get_video_analysis(video_id):
         video = Video.query.get(video_id)
         if not video or (video.user_id is not None and video.user_id != current_user.id):
             return jsonify({"status": "error", "message": "Video not found or access denied"}), 404
-        frames = Frame.query.filter_by(video_id=video.id).all()
-        all_objects = {}
+        results_id = video.results_video_id or video.id
+        frames = Frame.query.filter_by(video_id=results_id).all()
+        frame_objects = {}
+        object_rows = db.session.query(
+            DetectedObject.frame_id, DetectedObject.object_name
+        ).join(Frame, Frame.id == DetectedObject.frame_id).filter(
+            Frame.video_id == results_id
+        ).distinct().all()
+        for frame_id, object_name in object_rows:
+            frame_objects.setdefault(frame_id, []).append(object_name)
         frame_data = []
         for frame in frames:
-            objects = DetectedObject.query.filter_by(frame_id=frame.id).all()
-            for obj in objects:
-                if obj.object_name not in all_objects:
-                    all_objects[obj.object_name] = 0
-                all_objects[obj.object_name] += 1
-            object_names = list(set(obj.object_name for obj in objects))
+            image_path = frame.image_path.replace('\\', '/') if frame.image_path else None
             frame_data.append({
                 "frame_number": frame.frame_number,
-                "image_path": frame.image_path.replace('\\', '/') if frame.image_path else None,
-                "objects": object_names
+                "image_path": image_path,
+                "thumbnail": _thumbnail_url(frame, image_path),
+                "objects": frame_objects.get(frame.id, [])
             })
-        object_list = [{"name": name, "count": count} for name, count in all_objects.items()]
-        object_list.sort(key=lambda x: x["count"], reverse=True)
+        object_list = [
+            {"name": entry["name"], "count": entry["count"]}
+            for entry in get_video_object_counts(results_id)
+        ]
         return jsonify({
             "status": "success",
             "summary": video.analysis_result,
@@ -219,6 +298,61 @@ def get_video_analysis(video_id):
         current_app.logger.error(f"Exception in get_video_analysis: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@main_bp.route('/api/analytics/timeline', methods=['GET'])
+@login_required
+def get_detection_timeline():
+    try:
+        camera_index = request.args.get('camera_index', default=0, type=int)
+        granularity = request.args.get('granularity', default='hour')
+        hours = request.args.get('hours', default=24, type=int)
+        since = request.args.get('since')
+        until = request.args.get('until')
+        since = datetime.fromisoformat(since) if since else datetime.now() - timedelta(hours=hours)
+        until = datetime.fromisoformat(until) if until else None
+        classes = [c for c in request.args.get('classes', '').split(',') if c]
+        buckets = get_camera_timeline(camera_index, granularity, since, until, classes or None)
+        return jsonify({
+            "status": "success",
+            "camera_index": camera_index,
+            "granularity": granularity,
+            "buckets": buckets
+        })
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"Exception in get_detection_timeline: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@main_bp.route('/api/search', methods=['GET'])
+@login_required
+def search_frames():
+    try:
+        classes = [c for c in request.args.get('classes', '').split(',') if c]
+        cameras = [int(c) for c in request.args.get('cameras', '').split(',') if c]
+        start = request.args.get('start')
+        end = request.args.get('end')
+        results, next_cursor = search_detections(
+            classes=classes or None,
+            cameras=cameras or None,
+            start=datetime.fromisoformat(start) if start else None,
+            end=datetime.fromisoformat(end) if end else None,
+            min_confidence=request.args.get('min_confidence', default=0.0, type=float),
+            min_count=request.args.get('min_count', default=1, type=int),
+            limit=request.args.get('limit', default=50, type=int),
+            cursor=request.args.get('cursor')
+        )
+        return jsonify({
+            "status": "success",
+            "results": results,
+            "count": len(results),
+            "next_cursor": next_cursor
+        })
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"Exception in search_frames: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
 @main_bp.route('/api/video/<int:video_id>/frames', methods=['GET'])
 @login_required
 def get_video_frames(video_id):
@@ -228,7 +362,7 @@ def get_video_frames(video_id):
         if not video or (video.user_id is not None and video.user_id != current_user.id):
             current_app.logger.warning(f"Video not found or access denied for video ID: {video_id}")
             return jsonify({"status": "error", "message": "Video not found or access denied"}), 404
-        frames = Frame.query.filter_by(video_id=video.id).order_by(Frame.frame_number).all()
+        frames = Frame.query.filter_by(video_id=video.results_video_id or video.id).order_by(Frame.frame_number).all()
         current_app.logger.debug(f"Found {len(frames)} frames for video ID: {video_id}")
         frame_data = []
         for frame in frames:
@@ -241,6 +375,7 @@ def get_video_frames(video_id):
                 "frame_number": frame.frame_number,
                 "timestamp": frame.timestamp,
                 "image_path": image_path,
+                "thumbnail": _thumbnail_url(frame, image_path),
                 "raw_path": raw_path,
                 "objects": object_names,
                 "object_count": len(object_names)
@@ -265,8 +400,7 @@ def get_frame_image(frame_id):
         if not frame:
             current_app.logger.warning(f"Frame not found: {frame_id}")
             return jsonify({"status": "error", "message": "Frame not found"}), 404
-        video = Video.query.get(frame.video_id)
-        if not video or (video.user_id is not None and video.user_id != current_user.id):
+        if not _can_view(Video.query.get(frame.video_id)):
             current_app.logger.warning(f"Access denied for frame ID: {frame_id}")
             return jsonify({"status": "error", "message": "Access denied"}), 403
         if not frame.image_path:
@@ -276,6 +410,15 @@ def get_frame_image(frame_id):
         if not os.path.exists(normalized_path):
             current_app.logger.error(f"Image file not found: {normalized_path}")
             return jsonify({"status": "error", "message": "Image file not found on server"}), 404
+        if request.args.get('size') == 'thumb' and frame.thumbnail_path:
+            thumbnail_path = os.path.normpath(frame.thumbnail_path).replace('\\', '/')
+            if os.path.exists(thumbnail_path):
+                return send_from_directory(os.path.dirname(thumbnail_path), os.path.basename(thumbnail_path))
+        if frame.raw_image and _flag(request.args.get('overlay', '1')):
+            entry = overlay_renderer.render(frame, normalized_path)
+            if entry is None:
+                return jsonify({"status": "error", "message": "Frame image could not be rendered"}), 500
+            return overlay_response(entry)
         try:
             directory = os.path.dirname(normalized_path)
             filename = os.path.basename(normalized_path)
@@ -289,6 +432,65 @@ def get_frame_image(frame_id):
         current_app.logger.error(f"Exception in get_frame_image: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@main_bp.route('/api/clips', methods=['GET'])
+@login_required
+def list_clips():
+    try:
+        query = Clip.query
+        camera_index = request.args.get('camera_index', type=int)
+        if camera_index is not None:
+            query = query.filter(Clip.camera_index == camera_index)
+        since = request.args.get('since')
+        until = request.args.get('until')
+        if since:
+            query = query.filter(Clip.end_time >= datetime.fromisoformat(since))
+        if until:
+            query = query.filter(Clip.start_time < datetime.fromisoformat(until))
+        # classes is stored comma-joined; wrapping both sides in commas matches whole names only
+        wrapped_classes = literal(',').concat(Clip.classes).concat(',')
+        for cls in [c.strip() for c in request.args.get('classes', '').split(',') if c.strip()]:
+            pattern = cls.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            query = query.filter(wrapped_classes.like(f"%,{pattern},%", escape='\\'))
+        limit = min(request.args.get('limit', default=50, type=int), 500)
+        clips = []
+        for clip in query.order_by(Clip.start_time.desc(), Clip.id.desc()).limit(limit):
+            clips.append({
+                "id": clip.id,
+                "camera_index": clip.camera_index,
+                "start_time": clip.start_time.strftime('%Y-%m-%d %H:%M:%S'),
+                "end_time": clip.end_time.strftime('%Y-%m-%d %H:%M:%S'),
+                "duration": round((clip.end_time - clip.start_time).total_seconds(), 1),
+                "classes": clip.classes.split(',') if clip.classes else [],
+                "frame_count": clip.frame_count,
+                "file_size": clip.file_size,
+                "url": f"/api/clips/{clip.id}/video"
+            })
+        return jsonify({"status": "success", "clips": clips, "count": len(clips)})
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"Exception in list_clips: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@main_bp.route('/api/clips/<int:clip_id>/video', methods=['GET'])
+@login_required
+def get_clip_video(clip_id):
+    try:
+        clip = Clip.query.get(clip_id)
+        if not clip:
+            return jsonify({"status": "error", "message": "Clip not found"}), 404
+        video = Video.query.get(clip.video_id)
+        if not video or (video.user_id is not None and video.user_id != current_user.id):
+            return jsonify({"status": "error", "message": "Access denied"}), 403
+        path = os.path.normpath(clip.path)
+        if not os.path.exists(path):
+            return jsonify({"status": "error", "message": "Clip file not found on server"}), 404
+        # send_from_directory answers Range requests, so players can seek without a full download
+        return send_from_directory(os.path.dirname(path), os.path.basename(path), mimetype='video/mp4')
+    except Exception as e:
+        current_app.logger.error(f"Exception in get_clip_video: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
 @main_bp.route('/api/analyzer/status', methods=['GET'])
 @login_required
 def get_analyzer_status():
@@ -306,7 +508,8 @@ def get_analyzer_status():
                     status_data["cameras"][str(cam_idx)] = {
                         "status": "active" if (thread_exists and running) else "inactive",
                         "frame_count": frame_count,
-                        "camera_index": cam_idx
+                        "camera_index": cam_idx,
+                        "camera_state": camera_state(cam_idx)
                     }
             return jsonify(status_data)
         else:
@@ -315,17 +518,38 @@ def get_analyzer_status():
                 running = requested_camera_index in analyzer_running and analyzer_running.get(requested_camera_index)
                 current_instance = analyzer_instances.get(requested_camera_index)
                 frame_count = current_instance.frame_count if current_instance else 0
+                startup = analyzer_startups.get(requested_camera_index)
             status_data = {
                 "status": "active" if (thread_exists and running) else "inactive",
                 "frame_count": frame_count,
-                "camera_index": requested_camera_index
+                "camera_index": requested_camera_index,
+                "camera_state": camera_state(requested_camera_index)
             }
+            if startup is not None:
+                status_data["startup"] = startup.state()
+                if startup.error:
+                    status_data["startup_error"] = startup.error
             current_app.logger.debug(f"Analyzer Status for camera {requested_camera_index}: {status_data}")
             return jsonify(status_data)
     except Exception as e:
         current_app.logger.error(f"Exception in get_analyzer_status: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@main_bp.route('/api/analyzer/<int:camera_index>/history', methods=['GET'])
+@login_required
+def get_camera_state_history(camera_index):
+    try:
+        history = get_camera_history(camera_index)
+        return jsonify({
+            "status": "success",
+            "camera_index": camera_index,
+            "camera_state": history[-1]["state"] if history else None,
+            "history": history
+        })
+    except Exception as e:
+        current_app.logger.error(f"Exception in get_camera_state_history: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
 @main_bp.route('/api/analyzer/frames', methods=['GET'])
 @login_required
 def get_analyzer_frames():
@@ -352,10 +576,13 @@ def get_analyzer_frames():
                             objects = DetectedObject.query.filter_by(frame_id=frame.id).all()
                             object_names = list(set(obj.object_name for obj in objects))
                             image_path = frame.image_path.replace('\\', '/') if frame.image_path else None
+                            if image_path and frame.raw_image:
+                                image_path = f"api/frame-image/{frame.id}"
                             frames.append({
                                 "id": frame.id,
                                 "frame_number": frame.frame_number,
                                 "path": f"/{image_path}" if image_path else None,
+                                "thumbnail": _thumbnail_url(frame, f"/{image_path}" if image_path else None),
                                 "timestamp": frame.timestamp.strftime('%Y-%m-%d %H:%M:%S') if frame.timestamp else None,
                                 "objects": object_names,
                                 "object_count": len(object_names),
@@ -385,18 +612,18 @@ def get_analyzer_frames():
                 }), 404
             limit = int(request.args.get('limit', 30))
             try:
-                for filename in sorted(os.listdir(folder_path), reverse=True)[:limit]:
-                    if filename.endswith('.jpg'):
-                        image_path = os.path.join(folder_path, filename).replace('\\', '/')
-                        timestamp_parts = filename.split('_')[1:3]
-                        timestamp = ' '.join(timestamp_parts) if len(timestamp_parts) >= 2 else None
-                        frames.append({
-                            "filename": filename,
-                            "path": f"/{image_path}",
-                            "timestamp": timestamp,
-                            "full_path": os.path.abspath(os.path.join(folder_path, filename)),
-                            "camera_index": camera_index
-                        })
+                for file_path in islice(iter_frame_files(folder_path), limit):
+                    filename = os.path.basename(file_path)
+                    image_path = file_path.replace('\\', '/')
+                    timestamp_parts = filename.split('_')[1:3]
+                    timestamp = ' '.join(timestamp_parts) if len(timestamp_parts) >= 2 else None
+                    frames.append({
+                        "filename": filename,
+                        "path": f"/{image_path}",
+                        "timestamp": timestamp,
+                        "full_path": os.path.abspath(file_path),
+                        "camera_index": camera_index
+                    })
             except Exception as e:
                 current_app.logger.error(f"Error listing analyzer frames: {str(e)}")
                 return jsonify({
@@ -422,18 +649,18 @@ def get_analyzer_frames():
             limit_per_camera = max(5, int(request.args.get('limit', 30)) // len(available_folders))
             for cam_idx, folder in available_folders:
                 try:
-                    for filename in sorted(os.listdir(folder), reverse=True)[:limit_per_camera]:
-                        if filename.endswith('.jpg'):
-                            image_path = os.path.join(folder, filename).replace('\\', '/')
-                            timestamp_parts = filename.split('_')[1:3]
-                            timestamp = ' '.join(timestamp_parts) if len(timestamp_parts) >= 2 else None
-                            frames.append({
-                                "filename": filename,
-                                "path": f"/{image_path}",
-                                "timestamp": timestamp,
-                                "full_path": os.path.abspath(os.path.join(folder, filename)),
-                                "camera_index": cam_idx
-                            })
+                    for file_path in islice(iter_frame_files(folder), limit_per_camera):
+                        filename = os.path.basename(file_path)
+                        image_path = file_path.replace('\\', '/')
+                        timestamp_parts = filename.split('_')[1:3]
+                        timestamp = ' '.join(timestamp_parts) if len(timestamp_parts) >= 2 else None
+                        frames.append({
+                            "filename": filename,
+                            "path": f"/{image_path}",
+                            "timestamp": timestamp,
+                            "full_path": os.path.abspath(file_path),
+                            "camera_index": cam_idx
+                        })
                 except Exception as e:
                     current_app.logger.error(f"Error listing analyzer frames for camera {cam_idx}: {str(e)}")
         frames.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
@@ -469,42 +696,42 @@ def video_stream():
                              analyzer_threads[requested_camera_index].is_alive() and
                              requested_camera_index in analyzer_instances and
                              analyzer_instances[requested_camera_index] is not None)
+        startup = None
         if not camera_running:
             current_app.logger.warning(f"Stream requested for camera {requested_camera_index}, not running. Starting...")
-            if not start_analyzer_thread(camera_index=requested_camera_index, show_video=False):
+            # Don't hold the worker while the camera opens: stream a placeholder until it is live
+            startup = ensure_analyzer_started(requested_camera_index)
+            if startup is None:
                 current_app.logger.error(f"Failed to start analyzer thread for camera {requested_camera_index}.")
                 return jsonify({"status": "error", "message": f"Analyzer not running for camera {requested_camera_index} and failed to start"}), 503
-            time.sleep(15)
-            with analyzer_lock:
-                camera_running = (requested_camera_index in analyzer_running and 
-                                 analyzer_running.get(requested_camera_index) and
-                                 requested_camera_index in analyzer_instances and
-                                 analyzer_instances.get(requested_camera_index) is not None)
-            if not camera_running:
-                current_app.logger.error(f"Analyzer failed to start for camera {requested_camera_index}.")
-                return jsonify({"status": "error", "message": f"Failed to start analyzer for camera {requested_camera_index}"}), 503
         current_app.logger.info(f"Streaming from camera {requested_camera_index}...")
 
+        # Optional per-client variant: ?width=640&fps=5&quality=70&adaptive=1
+        width = request.args.get('width', type=int)
+        if width is not None:
+            width = min(max(width, 160), 3840)
+        quality = min(max(request.args.get('quality', default=current_app.config['STREAM_JPEG_QUALITY'], type=int), 10), 100)
+        max_fps = request.args.get('fps', type=float)
+        if max_fps is not None:
+            max_fps = min(max(max_fps, 0.2), 60.0)
+        adaptive = request.args.get('adaptive', default=current_app.config['STREAM_ADAPTIVE'], type=_flag)
+        client = ClientStream(requested_camera_index, width=width, jpeg_quality=quality,
+                              max_fps=max_fps, adaptive=adaptive)
+
         @stream_with_context
         def generate_frames():
-            while True:
-                with analyzer_lock:
-                    instance = analyzer_instances.get(requested_camera_index)
-                if instance is not None:
-                    frame = instance.get_current_frame()
-                    if frame is not None:
-                        ret, buffer = cv2.imencode('.jpg', frame)
-                        if not ret:
-                            continue
-                        frame_bytes = buffer.tobytes()
-                        yield (b'--frame\r\n'
-                               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-                    else:
-                        time.sleep(0.05)
-                else:
-                    # Use print or logging here, not current_app.logger
-                    print(f"Analyzer instance for camera {requested_camera_index} is None. Ending stream.")
-                    break
+            if startup is not None:
+                warming_up = mjpeg_part(placeholder_jpeg(f"Camera {requested_camera_index} warming up..."))
+                while not startup.done:
+                    yield warming_up
+                    startup.wait(1.0)
+                if not startup.ok:
+                    yield mjpeg_part(placeholder_jpeg(f"Camera {requested_camera_index} unavailable"))
+                    return
+            for frame_bytes in client.frames():
+                yield mjpeg_part(frame_bytes)
+            # stream_with_context keeps the app context alive for the logger
+            current_app.logger.info(f"Analyzer instance for camera {requested_camera_index} is gone. Ending stream.")
 
         return Response(generate_frames(),
                         mimetype='multipart/x-mixed-replace; boundary=frame')
@@ -512,6 +739,101 @@ def video_stream():
         current_app.logger.error(f"Exception in video_stream: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@main_bp.route('/api/stream/mosaic')
+@login_required
+def mosaic_stream():
+    """One MJPEG stream tiling all (or ?cameras=0,2) cameras, encoded once for every viewer"""
+    try:
+        from analyzer_state import analyzers_globally_stopped
+        if analyzers_globally_stopped:
+            return jsonify({"status": "error", "message": "Analyzers are globally stopped."}), 503
+        cameras_arg = request.args.get('cameras', '')
+        try:
+            cameras = sorted({int(idx) for idx in cameras_arg.split(',') if idx.strip()})
+        except ValueError:
+            return jsonify({"status": "error", "message": "cameras must be a comma-separated list of indices"}), 400
+        config = current_app.config
+        width = min(max(request.args.get('width', default=config['STREAM_MOSAIC_WIDTH'], type=int), 160), 3840)
+        height = min(max(request.args.get('height', default=config['STREAM_MOSAIC_HEIGHT'], type=int), 120), 2160)
+        fps = min(max(request.args.get('fps', default=config['STREAM_MOSAIC_FPS'], type=float), 0.2), 30.0)
+        mosaic = get_mosaic(cameras, width, height, fps, config['STREAM_MOSAIC_JPEG_QUALITY'])
+
+        @stream_with_context
+        def generate_frames():
+            mosaic.subscribe()
+            try:
+                last_seq = 0
+                while True:
+                    item = mosaic.wait_for_jpeg(last_seq, timeout=5.0)
+                    if item is None:
+                        if mosaic.source_closed:
+                            break
+                        continue
+                    last_seq, frame_bytes = item
+                    # Watching the mosaic counts as watching each of its cameras
+                    now = time.time()
+                    for camera_index in mosaic.camera_indices:
+                        camera_last_access[camera_index] = now
+                    yield mjpeg_part(frame_bytes)
+            finally:
+                mosaic.unsubscribe()
+
+        return Response(generate_frames(),
+                        mimetype='multipart/x-mixed-replace; boundary=frame')
+    except Exception as e:
+        current_app.logger.error(f"Exception in mosaic_stream: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@main_bp.route('/api/stream/stats', methods=['GET'])
+@login_required
+def stream_stats():
+    try:
+        return jsonify({"status": "success", "cameras": broadcaster_stats()})
+    except Exception as e:
+        current_app.logger.error(f"Exception in stream_stats: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@main_bp.route('/api/events')
+@login_required
+def event_stream():
+    """Server-Sent Events: camera state changes, camera metrics and newly saved frames"""
+    try:
+        last_event_id = request.headers.get('Last-Event-ID', type=int)
+        if last_event_id is not None and last_event_id > event_bus.last_id:
+            last_event_id = None  # ids restarted with the server
+
+        @stream_with_context
+        def generate_events():
+            event_bus.subscribe()
+            try:
+                after_id = last_event_id
+                if after_id is None:
+                    after_id = event_bus.last_id
+                    yield format_sse(after_id, "snapshot", {"cameras": camera_status_snapshot()})
+                while True:
+                    events = event_bus.wait_for_events(after_id, timeout=15.0)
+                    if events is None:
+                        # Fell behind the event ring: hand the client a fresh baseline
+                        after_id = event_bus.last_id
+                        yield format_sse(after_id, "snapshot", {"cameras": camera_status_snapshot()})
+                        continue
+                    if not events:
+                        yield ": keepalive\n\n"
+                        continue
+                    for event_id, event_type, data in events:
+                        yield format_sse(event_id, event_type, data)
+                    after_id = events[-1][0]
+            finally:
+                event_bus.unsubscribe()
+
+        response = Response(generate_events(), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+    except Exception as e:
+        current_app.logger.error(f"Exception in event_stream: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
 @main_bp.route('/api/analyzer/start-all', methods=['POST'])
 def start_all_analyzers_route():
     try:
@@ -542,6 +864,33 @@ def stop_all_analyzers_route():
         current_app.logger.error(f"Error stopping cameras: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@main_bp.route('/api/storage/retention', methods=['GET', 'POST'])
+@login_required
+def retention_status():
+    try:
+        if request.method == 'POST':
+            retention_engine.trigger()
+            return jsonify({"status": "pending", "message": "Retention pass scheduled"}), 202
+        return jsonify({
+            "status": "success",
+            "retention_days": current_app.config['FILE_RETENTION_DAYS'],
+            "interval_seconds": current_app.config['RETENTION_INTERVAL_SECONDS'],
+            "metrics": retention_engine.get_metrics()
+        })
+    except Exception as e:
+        current_app.logger.error(f"Exception in retention_status: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@main_bp.route('/api/storage/usage', methods=['GET'])
+@login_required
+def storage_usage():
+    try:
+        return jsonify({"status": "success", **storage_manager.usage(), "overlays": overlay_renderer.stats(),
+                        "analysis_cache": analysis_cache.stats(), "uploads": upload_manager.stats()})
+    except Exception as e:
+        current_app.logger.error(f"Exception in storage_usage: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
 @main_bp.route('/realtime', methods=['GET'])
 @login_required
 def realtime_view():
@@ -560,8 +909,8 @@ def restart_analyzer():
             camera_index = int(camera_index)
         except (ValueError, TypeError):
             return jsonify({"status": "error", "message": f"Invalid camera index: {camera_index}"}), 400
+        # Returns at once; the new analyzer backs off until the old one has released the device
         stop_analyzer_thread(camera_index)
-        time.sleep(2)
         current_app.logger.info(f"Starting new analyzer thread for camera {camera_index}...")
         started = start_analyzer_thread(camera_index=camera_index, show_video=False)
         if not started:
@@ -645,18 +994,10 @@ def get_camera_thumbnail(camera_index):
         from analyzer_state import analyzers_globally_stopped
         if analyzers_globally_stopped:
             # Always return offline placeholder if globally stopped
-            placeholder_path = "static/images/camera-offline.jpg"
-            if os.path.exists(placeholder_path):
-                return send_from_directory("static/images", "camera-offline.jpg")
-            else:
-                # Generate a black image with "Camera X Offline"
-                black_img = np.zeros((480, 640, 3), dtype=np.uint8)
-                text = f"Camera {camera_index} Offline"
-                cv2.putText(black_img, text, (80, 240), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-                ret, buffer = cv2.imencode('.jpg', black_img)
-                if ret:
-                    return Response(buffer.tobytes(), mimetype='image/jpeg')
-                return jsonify({"status": "error", "message": "Camera offline"}), 503
+            entry = thumbnail_service.placeholder(camera_index)
+            if entry:
+                return thumbnail_response(entry)
+            return jsonify({"status": "error", "message": "Camera offline"}), 503
 
         current_app.logger.debug(f"Thumbnail requested for camera {camera_index}")
         camera_last_access[camera_index] = time.time()
@@ -664,40 +1005,28 @@ def get_camera_thumbnail(camera_index):
         with analyzer_lock:
             instance = analyzer_instances.get(camera_index)
             is_active = instance is not None and camera_index in analyzer_running and analyzer_running[camera_index]
+        entry = None
         if not is_active:
             try:
                 camera_video = Video.query.filter_by(filename=f"camera_{camera_index}_live").first()
                 if camera_video:
                     recent_frame = Frame.query.filter_by(video_id=camera_video.id).order_by(Frame.id.desc()).first()
-                    if recent_frame and recent_frame.image_path and os.path.exists(recent_frame.image_path):
-                        return send_from_directory(
-                            os.path.dirname(recent_frame.image_path), 
-                            os.path.basename(recent_frame.image_path)
-                        )
+                    if recent_frame and recent_frame.image_path:
+                        entry = thumbnail_service.saved(camera_index, recent_frame.image_path)
             except Exception as e:
                 current_app.logger.error(f"Error getting thumbnail from database: {str(e)}")
         elif instance:
             try:
-                frame = instance.get_current_frame()
-                if frame is not None:
-                    ret, buffer = cv2.imencode('.jpg', frame)
-                    if ret:
-                        return Response(buffer.tobytes(), mimetype='image/jpeg')
+                entry = thumbnail_service.live(camera_index, instance)
             except Exception as e:
                 current_app.logger.error(f"Error getting thumbnail from analyzer: {str(e)}")
-        try:
-            placeholder_path = "static/images/camera-offline.jpg"
-            if os.path.exists(placeholder_path):
-                return send_from_directory("static/images", "camera-offline.jpg")
-            else:
-                black_img = np.zeros((480, 640, 3), dtype=np.uint8)
-                text = f"Camera {camera_index} Offline"
-                cv2.putText(black_img, text, (80, 240), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-                ret, buffer = cv2.imencode('.jpg', black_img)
-                if ret:
-                    return Response(buffer.tobytes(), mimetype='image/jpeg')
-        except Exception as e:
-            current_app.logger.error(f"Error creating placeholder image: {str(e)}")
+        if entry is None:
+            try:
+                entry = thumbnail_service.placeholder(camera_index)
+            except Exception as e:
+                current_app.logger.error(f"Error creating placeholder image: {str(e)}")
+        if entry is not None:
+            return thumbnail_response(entry)
         return jsonify({"status": "error", "message": "Camera thumbnail not available"}), 404
     except Exception as e:
         current_app.logger.error(f"Exception in get_camera_thumbnail: {e}")